@@ -0,0 +1,50 @@
+"""
+嵌入吞吐量基准测试。
+
+在本地启动一个模拟 bge-m3 接口的嵌入服务，用不同的 batch_size / max_workers
+组合调用 VectorDB.embed_texts，输出每秒处理的文本数，无需联网即可运行。
+
+用法:
+python benchmarks/embedding_throughput.py --texts 512 --latency 0.05
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from vector_db import VectorDB
+from mock_servers import fake_embedding, start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VectorDB 嵌入吞吐量基准测试')
+    parser.add_argument('--texts', type=int, default=256, help='文本数量')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟请求延迟（秒）')
+    parser.add_argument('--batch-sizes', default='1,8,32,64', help='逗号分隔的 batch_size 列表')
+    parser.add_argument('--workers', default='1,4,8', help='逗号分隔的 max_workers 列表')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    url = f'http://127.0.0.1:{server.server_address[1]}/v1/embeddings'
+    texts = [f'一种基于大语言模型的专利段落 {i}' for i in range(args.texts)]
+
+    for batch_size in [int(x) for x in args.batch_sizes.split(',')]:
+        for workers in [int(x) for x in args.workers.split(',')]:
+            db = VectorDB('bench', batch_size=batch_size, max_workers=workers, use_cache=False)
+            db.api_url = url
+            start = time.perf_counter()
+            embeddings = db.embed_texts(texts)
+            elapsed = time.perf_counter() - start
+            assert embeddings.shape == (len(texts), 1024)
+            assert np.allclose(embeddings[-1], fake_embedding(texts[-1]), atol=1e-6)
+            print(f'batch_size={batch_size:<4} max_workers={workers:<3} '
+                  f'{elapsed:7.3f}s  {len(texts) / elapsed:9.1f} texts/sec')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+索引类型召回率与延迟基准测试。
+
+用带聚类结构的随机向量模拟嵌入分布，对比 flat、ivf、hnsw、ivfpq 的 recall@k 以及 p50/p99 查询延迟；
+也可以用 --bundle 指定已保存的索引包，直接测试真实语料。
+指定 --storage 时改为对比各存储方式（float32/float16/int8/pq）的每向量字节数、召回率损失和精排后的召回率。
+
+用法:
+python benchmarks/index_recall.py --vectors 100000 --queries 200 --k 10
+python benchmarks/index_recall.py --bundle dbs/specification
+python benchmarks/index_recall.py --storage float32,float16,int8,pq --index-type hnsw --rerank 4
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from index_builder import INDEX_TYPES, STORAGE_TYPES, benchmark_index_types, benchmark_storage
+from vector_db import VectorDB
+
+
+def clustered_vectors(n: int, d: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    生成带聚类结构的归一化随机向量。
+
+    参数:
+    n (int): 向量数量。
+    d (int): 维度。
+    clusters (int): 聚类数量。
+    seed (int): 随机种子。
+
+    返回:
+    np.ndarray: 形状为 [n, d] 的向量。
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, d)).astype('float32')
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, d)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='索引类型召回率与延迟基准测试')
+    parser.add_argument('--vectors', type=int, default=50000, help='合成向量数量')
+    parser.add_argument('--dim', type=int, default=1024, help='向量维度')
+    parser.add_argument('--queries', type=int, default=200, help='查询数量')
+    parser.add_argument('--k', type=int, default=10, help='recall@k 中的 k')
+    parser.add_argument('--nprobe', type=int, default=16, help='IVF 类索引的 nprobe')
+    parser.add_argument('--ef-search', type=int, default=64, help='HNSW 索引的 efSearch')
+    parser.add_argument('--types', default=','.join(INDEX_TYPES), help='逗号分隔的索引类型')
+    parser.add_argument('--bundle', help='使用已保存的索引包而非合成向量')
+    parser.add_argument('--storage', help=f'逗号分隔的存储方式，可选 {",".join(STORAGE_TYPES)}，指定时对比存储方式')
+    parser.add_argument('--index-type', default='flat', help='对比存储方式时使用的索引类型')
+    parser.add_argument('--rerank', type=int, default=4, help='精排时取 k * rerank 个候选，为 0 时不测精排')
+    args = parser.parse_args()
+    index_types = args.types.split(',')
+
+    if args.storage:
+        storages = args.storage.split(',')
+        if args.bundle:
+            db = VectorDB('bench', use_cache=False, index_type=args.index_type,
+                          nprobe=args.nprobe, ef_search=args.ef_search)
+            db.load_index(args.bundle)
+            report = db.benchmark_storage(k=args.k, n_queries=args.queries, storages=storages, rerank=args.rerank)
+        else:
+            data = clustered_vectors(args.vectors + args.queries, args.dim)
+            report = benchmark_storage(data[:args.vectors], data[args.vectors:], args.k, args.index_type,
+                                       storages, args.rerank, args.nprobe, args.ef_search)
+        print(f"{'index':<8}{'storage':<10}{'bytes/vec':>10}{'recall@' + str(args.k):>12}"
+              f"{'rerank':>10}{'p50(ms)':>10}{'rerank p50':>12}")
+        for row in report:
+            print(f"{row['index_type']:<8}{row['storage']:<10}{row['bytes_per_vector']:>10.1f}"
+                  f"{row['recall_at_k']:>12.3f}{row.get('rerank_recall_at_k', float('nan')):>10.3f}"
+                  f"{row['p50_ms']:>10.3f}{row.get('rerank_p50_ms', float('nan')):>12.3f}")
+        return
+
+    if args.bundle:
+        db = VectorDB('bench', use_cache=False, nprobe=args.nprobe, ef_search=args.ef_search)
+        db.load_index(args.bundle)
+        report = db.benchmark(k=args.k, n_queries=args.queries, index_types=index_types)
+    else:
+        data = clustered_vectors(args.vectors + args.queries, args.dim)
+        report = benchmark_index_types(data[:args.vectors], data[args.vectors:], args.k,
+                                       index_types, args.nprobe, args.ef_search)
+
+    print(f"{'index':<8}{'build(s)':>10}{'recall@' + str(args.k):>12}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for row in report:
+        print(f"{row['index_type']:<8}{row['build_seconds']:>10.2f}{row['recall_at_k']:>12.3f}"
+              f"{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+本地模拟模型服务：兼容 SiliconFlow 的 /v1/embeddings 和 OpenAI 的 /v1/chat/completions（含流式）接口，
+延迟可配置，用于在不联网、不产生费用的情况下测试和基准测试。
+
+用法:
+python benchmarks/mock_servers.py --port 8900 --embedding-latency 0.05 --chat-latency 0.5 --token-delay 0.01
+然后设置 EMBEDDING_API_URL=http://127.0.0.1:8900/v1/embeddings
+和 OPENROUTER_API_BASE=http://127.0.0.1:8900/v1
+"""
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int = 1024) -> list:
+    """
+    根据文本内容生成确定性的伪嵌入向量。
+
+    参数:
+    text (str): 输入文本。
+    dim (int): 向量维度，默认为 1024。
+
+    返回:
+    list: 归一化后的向量。
+    """
+    seed = int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:4], 'little')
+    vec = np.random.default_rng(seed).standard_normal(dim).astype('float32')
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def fake_completion(messages: list, tokens: int) -> list:
+    """
+    根据对话消息生成确定性的伪专利文档，按片段返回。
+
+    参数:
+    messages (list): 对话消息。
+    tokens (int): 片段数量。
+
+    返回:
+    list: 内容片段，拼接后为带 <标题>/<段落> 标签的文本。
+    """
+    digest = hashlib.md5(json.dumps(messages, ensure_ascii=False).encode('utf-8')).hexdigest()[:8]
+    body = [f'模拟内容{digest}{i}' for i in range(max(tokens - 3, 1))]
+    return ['<标题>技术领域</标题>\n', '<段落>'] + body + ['</段落>']
+
+
+def start_mock_server(embedding_latency: float = 0.0, chat_latency: float = 0.0, token_delay: float = 0.0,
+                      tokens: int = 64, port: int = 0) -> ThreadingHTTPServer:
+    """
+    启动本地模拟模型服务。
+
+    参数:
+    embedding_latency (float): 每个嵌入请求的固定延迟（秒）。
+    chat_latency (float): 对话请求返回首个片段前的延迟（秒），即首字延迟。
+    token_delay (float): 流式输出时相邻片段的间隔（秒）。
+    tokens (int): 每个对话响应的片段数量。
+    port (int): 监听端口，0 表示自动分配。
+
+    返回:
+    ThreadingHTTPServer: 已在后台线程运行的服务。
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if self.path.endswith('/embeddings'):
+                self._embeddings(body)
+            elif self.path.endswith('/chat/completions'):
+                self._chat(body)
+            else:
+                self.send_error(404)
+
+        def _json(self, payload: dict):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _embeddings(self, body: dict):
+            inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+            time.sleep(embedding_latency)
+            self._json({
+                'object': 'list',
+                'model': body.get('model'),
+                'data': [{'object': 'embedding', 'index': i, 'embedding': fake_embedding(t)}
+                         for i, t in enumerate(inputs)],
+            })
+
+        def _chat(self, body: dict):
+            parts = fake_completion(body.get('messages', []), tokens)
+            time.sleep(chat_latency)
+            base = {'id': 'chatcmpl-mock', 'created': int(time.time()), 'model': body.get('model')}
+            if not body.get('stream'):
+                time.sleep(token_delay * len(parts))
+                self._json({**base, 'object': 'chat.completion', 'choices': [{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': ''.join(parts)},
+                }]})
+                return
+            # 不设置 Content-Length，响应结束后关闭连接
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for i, part in enumerate(parts):
+                if i:
+                    time.sleep(token_delay)
+                chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [{
+                    'index': 0, 'delta': {'content': part}, 'finish_reason': None,
+                }]}
+                self.wfile.write(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_stub_server(latency: float, port: int = 0) -> ThreadingHTTPServer:
+    """
+    启动本地嵌入服务，每个请求固定延迟 latency 秒。
+
+    参数:
+    latency (float): 模拟的网络往返延迟（秒）。
+    port (int): 监听端口，0 表示自动分配。
+
+    返回:
+    ThreadingHTTPServer: 已在后台线程运行的服务。
+    """
+    return start_mock_server(embedding_latency=latency, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟模型服务')
+    parser.add_argument('--port', type=int, default=8900, help='监听端口')
+    parser.add_argument('--embedding-latency', type=float, default=0.05, help='嵌入请求延迟（秒）')
+    parser.add_argument('--chat-latency', type=float, default=0.5, help='对话首字延迟（秒）')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='流式片段间隔（秒）')
+    parser.add_argument('--tokens', type=int, default=64, help='每个对话响应的片段数量')
+    args = parser.parse_args()
+    server = start_mock_server(args.embedding_latency, args.chat_latency, args.token_delay, args.tokens, args.port)
+    print(f'模拟服务已启动: http://127.0.0.1:{server.server_address[1]}/v1')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
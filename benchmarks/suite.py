@@ -0,0 +1,333 @@
+"""
+端到端基准测试套件。
+
+生成合成专利语料并启动本地模拟模型服务（嵌入和对话接口，延迟可配置），依次测量：
+split: PDFProcessor.split_pdf 的串行吞吐量，以及 ParallelPDFExtractor 的并行吞吐量；
+index: VectorDB.create_index 的建库耗时（嵌入经模拟服务获取，不使用缓存）；
+search: 不同语料规模和索引类型下的检索延迟（合成向量直接写入索引），以及 BM25 稀疏检索延迟；
+generate: WebUI._generate_draft 的首字延迟和总耗时（含技术文档解析、检索和流式生成）。
+结果写入 JSON 文件，便于比较不同版本或参数。
+
+用法:
+python benchmarks/suite.py --patents 20 --sizes 1000,10000,50000 --output benchmark_results.json
+python benchmarks/suite.py --only split,index --patents 100
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import numpy as np
+import faiss
+import pdfplumber
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from pdf_processor import PDFProcessor
+from parallel_ingest import ParallelPDFExtractor
+from text_chunker import TextChunker
+from text_store import TextStore
+from sparse_index import SparseIndex
+from vector_db import VectorDB
+from reference_library import DEFAULT_LIBRARY
+from index_builder import build_faiss_index
+from mock_servers import start_mock_server
+from synthetic_corpus import generate_corpus, _paragraph
+from index_recall import clustered_vectors
+
+BENCHMARKS = ('split', 'index', 'search', 'generate')
+DB_TYPES = ['摘要', '说 明 书', '权 利 要 求 书']
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    """
+    汇总一组耗时。
+
+    参数:
+    seconds (List[float]): 每次的耗时（秒）。
+
+    返回:
+    Dict[str, float]: 次数以及平均、p50、p95、p99、最大耗时（毫秒）。
+    """
+    ms = np.asarray(seconds, dtype='float64') * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def bench_split(pdf_paths: List[str], workers: int) -> Tuple[Dict, Dict[str, Dict[str, str]]]:
+    """
+    测量 PDF 章节分割的吞吐量，不使用提取缓存。
+
+    返回:
+    Tuple[Dict, Dict[str, Dict[str, str]]]: 测量结果，以及各文件的章节字典（供建库测试使用）。
+    """
+    processor = PDFProcessor(use_cache=False)
+    sections: Dict[str, Dict[str, str]] = {}
+    per_file = []
+    pages = 0
+    start = time.perf_counter()
+    for path in pdf_paths:
+        file_start = time.perf_counter()
+        sections[path] = processor.split_pdf(path)
+        per_file.append(time.perf_counter() - file_start)
+        with pdfplumber.open(path) as pdf:
+            pages += len(pdf.pages)
+    serial_seconds = time.perf_counter() - start
+    complete = sum(all(sections[path].get(name) for name in DB_TYPES) for path in pdf_paths)
+
+    extractor = ParallelPDFExtractor(max_workers=workers, processor=PDFProcessor(use_cache=False))
+    start = time.perf_counter()
+    parallel_files = sum(1 for _ in extractor.iter_split(pdf_paths))
+    parallel_seconds = time.perf_counter() - start
+    result = {
+        'files': len(pdf_paths),
+        'pages': pages,
+        'files_with_all_sections': complete,
+        'serial': {
+            'seconds': serial_seconds,
+            'files_per_sec': len(pdf_paths) / serial_seconds,
+            'pages_per_sec': pages / serial_seconds,
+            'per_file': latency_stats(per_file),
+        },
+        'parallel': {
+            'workers': extractor.max_workers,
+            'files': parallel_files,
+            'seconds': parallel_seconds,
+            'files_per_sec': parallel_files / parallel_seconds,
+            'pages_per_sec': pages / parallel_seconds,
+        },
+    }
+    return result, sections
+
+
+def bench_index(sections: Dict[str, Dict[str, str]], api_url: str, index_types: List[str],
+                batch_size: int, max_workers: int) -> Tuple[List[Dict], Dict[str, VectorDB]]:
+    """
+    测量各知识库、各索引类型的 create_index 耗时，嵌入经模拟服务获取，不使用缓存。
+
+    返回:
+    Tuple[List[Dict], Dict[str, VectorDB]]: 测量结果，以及第一种索引类型建好的各知识库（供生成测试使用）。
+    """
+    chunker = TextChunker()
+    passages = {db_type: [] for db_type in DB_TYPES}
+    for path, file_sections in sections.items():
+        for name, items in chunker.split_sections(file_sections, os.path.basename(path)).items():
+            if name in passages:
+                passages[name].extend(items)
+    results = []
+    dbs: Dict[str, VectorDB] = {}
+    for index_type in index_types:
+        for db_type in DB_TYPES:
+            items = passages[db_type]
+            db = VectorDB(db_type, batch_size=batch_size, max_workers=max_workers, use_cache=False,
+                          index_type=index_type)
+            db.api_url = api_url
+            start = time.perf_counter()
+            db.create_index([item['text'] for item in items],
+                            [{key: item[key] for key in ('source', 'section', 'start', 'end')} for item in items])
+            seconds = time.perf_counter() - start
+            results.append({
+                'db_type': db_type,
+                'index_type': index_type,
+                'passages': len(items),
+                'seconds': seconds,
+                'passages_per_sec': len(items) / seconds if seconds > 0 else 0.0,
+            })
+            dbs.setdefault(db_type, db)
+    return results, dbs
+
+
+def bench_search(sizes: List[int], index_types: List[str], dim: int, queries: int, k: int) -> List[Dict]:
+    """
+    测量不同语料规模和索引类型下的检索延迟。
+
+    合成向量直接写入索引，文本为随机组合的段落；稠密检索走 search_by_vector（与 WebUI 使用已缓存的查询向量一致），
+    稀疏检索走 search_passages(mode='sparse')，均按来源合并结果。
+
+    返回:
+    List[Dict]: 每个 (规模, 索引类型) 的建索引耗时和检索延迟。
+    """
+    results = []
+    for n in sizes:
+        rng = random.Random(n)
+        data = clustered_vectors(n + queries, dim, seed=n)
+        vectors, query_vectors = data[:n], data[n:]
+        ids = np.arange(n, dtype='int64')
+        texts = [_paragraph(rng, 3) for _ in range(n)]
+        store = TextStore()
+        for text_id, text in zip(ids, texts):
+            store.add(int(text_id), text, {'source': f'synthetic_{int(text_id) % max(n // 20, 1):05d}.pdf'})
+        sparse = SparseIndex()
+        sparse.add(ids.tolist(), texts)
+        sparse.compile()
+        query_texts = [_paragraph(rng, 2) for _ in range(queries)]
+
+        for index_type in index_types:
+            db = VectorDB('bench', use_cache=False, index_type=index_type)
+            start = time.perf_counter()
+            db.index = build_faiss_index(index_type, vectors, ids)
+            build_seconds = time.perf_counter() - start
+            db.texts, db.sparse, db.next_index = store, sparse, n
+            seconds = []
+            for query in query_vectors:
+                start = time.perf_counter()
+                db.search_by_vector(query, k, merge_by_source=True)
+                seconds.append(time.perf_counter() - start)
+            results.append({'vectors': n, 'index_type': index_type, 'build_seconds': build_seconds,
+                            'latency': latency_stats(seconds)})
+
+        db = VectorDB('bench', use_cache=False, search_mode='sparse')
+        db.texts, db.sparse, db.next_index = store, sparse, n
+        seconds = []
+        for query in query_texts:
+            start = time.perf_counter()
+            db.search_passages(query, k, merge_by_source=True)
+            seconds.append(time.perf_counter() - start)
+        results.append({'vectors': n, 'index_type': 'sparse', 'latency': latency_stats(seconds)})
+        store.close()
+    return results
+
+
+def bench_generate(docx_paths: List[str], dbs: Dict[str, VectorDB], runs: int, root: str) -> Dict:
+    """
+    测量 WebUI._generate_draft 的首字延迟和总耗时。
+
+    每次使用新的会话；第一轮各技术文档需要解析和嵌入，之后命中技术文档缓存，分别统计。
+    WebUI 以临时目录 root 作为知识库根目录，不会恢复或清理本地 dbs/ 中的入库任务，也不会加载其中的知识库。
+
+    返回:
+    Dict: 各文档类型的首字延迟和总耗时，以及一键生成全部的总耗时。
+    """
+    # web_ui 导入 gradio 较慢，只在需要时导入
+    from web_ui import WebUI
+    ui = WebUI(root)
+    ui.library.attach(DEFAULT_LIBRARY, dbs)
+    ui.use_existing_db = True
+    samples = {doc_type: {'cold': ([], []), 'warm': ([], [])} for _, doc_type in WebUI.DOC_TYPES}
+    for run in range(runs):
+        for path in docx_paths:
+            tech_doc = SimpleNamespace(name=path)
+            for db_type, doc_type in WebUI.DOC_TYPES:
+                phase = 'cold' if run == 0 and db_type == WebUI.DOC_TYPES[0][0] else 'warm'
+                session = ui.new_session()
+                ttft = None
+                start = time.perf_counter()
+                for messages in ui._generate_draft(tech_doc, session, db_type, doc_type):
+                    if ttft is None and messages[-1][1]:
+                        ttft = time.perf_counter() - start
+                total = time.perf_counter() - start
+                if doc_type not in session.patent_generator.current_draft:
+                    raise RuntimeError(f'{doc_type} 生成失败: {messages[-1][1]}')
+                samples[doc_type][phase][0].append(ttft)
+                samples[doc_type][phase][1].append(total)
+
+    all_seconds = []
+    for path in docx_paths:
+        session = ui.new_session()
+        start = time.perf_counter()
+        for _ in ui.generate_all(SimpleNamespace(name=path), session):
+            pass
+        all_seconds.append(time.perf_counter() - start)
+
+    result = {'runs': runs, 'documents': len(docx_paths), 'draft': {}}
+    for doc_type, phases in samples.items():
+        result['draft'][doc_type] = {phase: {'ttft': latency_stats(ttft), 'total': latency_stats(total)}
+                                     for phase, (ttft, total) in phases.items() if ttft}
+    result['generate_all'] = latency_stats(all_seconds)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenPatent 端到端基准测试')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help=f'逗号分隔的测试项，可选 {BENCHMARKS}')
+    parser.add_argument('--corpus', help='语料目录，默认使用临时目录')
+    parser.add_argument('--patents', type=int, default=20, help='合成专利 PDF 数量')
+    parser.add_argument('--disclosures', type=int, default=1, help='合成技术交底书数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--workers', type=int, default=None, help='并行 PDF 提取的进程数，默认为 CPU 核数')
+    parser.add_argument('--embedding-latency', type=float, default=0.02, help='模拟嵌入请求延迟（秒）')
+    parser.add_argument('--chat-latency', type=float, default=0.2, help='模拟对话首字延迟（秒）')
+    parser.add_argument('--token-delay', type=float, default=0.005, help='模拟流式片段间隔（秒）')
+    parser.add_argument('--tokens', type=int, default=64, help='模拟对话响应的片段数量')
+    parser.add_argument('--batch-size', type=int, default=32, help='嵌入请求的 batch_size')
+    parser.add_argument('--embed-workers', type=int, default=4, help='嵌入请求的 max_workers')
+    parser.add_argument('--build-types', default='auto', help='建库测试的索引类型，逗号分隔')
+    parser.add_argument('--sizes', default='1000,10000', help='检索测试的语料规模（向量数），逗号分隔')
+    parser.add_argument('--index-types', default='flat,hnsw,ivf,ivfpq', help='检索测试的索引类型，逗号分隔')
+    parser.add_argument('--dim', type=int, default=1024, help='检索测试的向量维度')
+    parser.add_argument('--queries', type=int, default=100, help='检索测试的查询数量')
+    parser.add_argument('--k', type=int, default=6, help='检索返回的段落数，与 WebUI 默认值一致')
+    parser.add_argument('--generate-runs', type=int, default=3, help='生成测试的轮数')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果 JSON 文件路径')
+    args = parser.parse_args()
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'未知的测试项: {unknown}，可选 {BENCHMARKS}')
+    if 'generate' in selected and 'index' not in selected:
+        parser.error('generate 依赖 index 建好的知识库，请同时选择 index')
+
+    server = start_mock_server(args.embedding_latency, args.chat_latency, args.token_delay, args.tokens)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+    # 生成器在创建时读取这两个环境变量，指向模拟服务
+    os.environ['OPENROUTER_API_BASE'] = base_url
+    os.environ.setdefault('open_router_key', 'mock')
+
+    report = {
+        'meta': {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'faiss': faiss.__version__,
+            'pdfplumber': pdfplumber.__version__,
+        },
+        'args': vars(args),
+        'results': {},
+    }
+    results = report['results']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus = args.corpus or tmp_dir
+        start = time.perf_counter()
+        pdf_paths, docx_paths = generate_corpus(corpus, args.patents if {'split', 'index'} & set(selected) else 0,
+                                                args.disclosures, args.seed)
+        report['meta']['corpus_seconds'] = time.perf_counter() - start
+
+        sections = {}
+        if 'split' in selected or 'index' in selected:
+            print(f'split: {len(pdf_paths)} 个 PDF')
+            results['split'], sections = bench_split(pdf_paths, args.workers)
+        dbs = {}
+        if 'index' in selected:
+            print('index: 建库')
+            results['index'], dbs = bench_index(sections, f'{base_url}/embeddings', args.build_types.split(','),
+                                                args.batch_size, args.embed_workers)
+        if 'search' in selected:
+            print('search: 检索延迟')
+            results['search'] = bench_search([int(n) for n in args.sizes.split(',')], args.index_types.split(','),
+                                             args.dim, args.queries, args.k)
+        if 'generate' in selected:
+            print('generate: 生成延迟')
+            results['generate'] = bench_generate(docx_paths, dbs, args.generate_runs,
+                                                 os.path.join(tmp_dir, 'dbs'))
+
+    server.shutdown()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
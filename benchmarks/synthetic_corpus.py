@@ -0,0 +1,256 @@
+"""
+合成专利语料生成器。
+
+按真实中国发明专利申请文件的版式生成 PDF：首页为著录项目和 "(57)摘要"，之后依次为
+"权 利 要 求 书"、"说 明 书"、"说 明 书 附 图"，每页第一行为章节标题；同时可生成 .docx 技术交底书。
+内容由固定词表随机组合，给定种子时结果确定，可用于 PDF 分割、建库和检索的基准测试。
+
+PDF 使用不嵌入字体的 Type0 字体（Identity-H 编码，字符码即 Unicode 码位）并附带 ToUnicode 映射，
+只需保证文本可被 pdfplumber 正确提取，无需可显示的字形。
+
+用法:
+python benchmarks/synthetic_corpus.py --out bench_corpus --patents 20 --disclosures 3
+"""
+import os
+import zlib
+import random
+import argparse
+from typing import List, Tuple
+
+from docx import Document
+
+SUBJECTS = ['问答系统', '日志分析方法', '知识库系统', '辅助诊断方法', '对话平台', '文本检索方法', '代码生成系统', '数据标注方法']
+MODULES = ['数据采集模块', '预处理模块', '向量化模块', '检索模块', '生成模块', '评估模块', '存储模块', '调度模块']
+OBJECTS = ['问题文本', '源数据文件', '文本块', '知识图谱', '特征向量', '提示词', '候选答案', '日志记录']
+ACTIONS = ['获取', '解析', '切分', '编码', '检索', '排序', '融合', '校验', '更新', '输出']
+QUALIFIERS = ['预训练的大语言模型', '预设的相似度阈值', '多模态转换规则', '向量数据库', '注意力机制', '用户反馈结果']
+EFFECTS = ['提高了检索的准确率', '降低了人工标注成本', '缩短了响应时间', '提升了生成内容的一致性', '减少了计算资源占用']
+SPEC_HEADINGS = ['技术领域', '背景技术', '发明内容', '附图说明', '具体实施方式']
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 70
+FONT_SIZE = 10.5
+LEADING = 16
+CHARS_PER_LINE = 38
+LINES_PER_PAGE = 40
+
+
+def _sentence(rng: random.Random) -> str:
+    """
+    随机组合一个技术方案句子。
+    """
+    return (f'{rng.choice(MODULES)}用于{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}，'
+            f'并根据{rng.choice(QUALIFIERS)}{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}，'
+            f'{rng.choice(EFFECTS)}。')
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return ''.join(_sentence(rng) for _ in range(sentences))
+
+
+def _wrap(text: str, width: int = CHARS_PER_LINE) -> List[str]:
+    """
+    按固定字数折行，模拟专利文件的排版。
+    """
+    return [text[i:i + width] for i in range(0, len(text), width)] or ['']
+
+
+def patent_sections(rng: random.Random, index: int) -> Tuple[str, List[str], List[str], List[str]]:
+    """
+    生成一篇合成专利的各部分文本。
+
+    参数:
+    rng (random.Random): 随机数生成器。
+    index (int): 专利序号，用于生成申请号和名称。
+
+    返回:
+    Tuple[str, List[str], List[str], List[str]]: (发明名称, 摘要段落, 权利要求段落, 说明书段落)。
+    """
+    title = f'一种基于大语言模型的{rng.choice(SUBJECTS)}{index}'
+    abstract = [f'本发明公开了{title}，' + _paragraph(rng, 4)]
+    claims = [f'1.{title}，其特征在于，包括：' + _paragraph(rng, 3)]
+    for n in range(2, rng.randint(6, 10) + 1):
+        claims.append(f'{n}.根据权利要求{rng.randint(1, n - 1)}所述的{title}，其特征在于，' + _paragraph(rng, 2))
+    spec = [title]
+    number = 1
+    for heading in SPEC_HEADINGS:
+        spec.append(heading)
+        for _ in range(rng.randint(3, 8)):
+            spec.append(f'[{number:04d}] ' + _paragraph(rng, rng.randint(2, 5)))
+            number += 1
+    return title, abstract, claims, spec
+
+
+def patent_pages(rng: random.Random, index: int) -> List[List[str]]:
+    """
+    按真实专利的版式把一篇合成专利排成逐页文本行。
+
+    参数:
+    rng (random.Random): 随机数生成器。
+    index (int): 专利序号。
+
+    返回:
+    List[List[str]]: 逐页的文本行。
+    """
+    title, abstract, claims, spec = patent_sections(rng, index)
+    number = f'CN {117900000 + index} A'
+    front = ['(19)国家知识产权局', '(12)发明专利申请', f'(10)申请公布号 {number}',
+             f'(21)申请号 2023{index:08d}.X', '(22)申请日 2023.12.27', '(71)申请人 示例科技有限公司',
+             '(54)发明名称', title, '(57)摘要']
+    for paragraph in abstract:
+        front.extend(_wrap(paragraph))
+    pages = [front[:LINES_PER_PAGE]]
+
+    def section(heading: str, paragraphs: List[str]):
+        lines = [line for paragraph in paragraphs for line in _wrap(paragraph)]
+        body = LINES_PER_PAGE - 2
+        chunks = [lines[i:i + body] for i in range(0, len(lines), body)] or [[]]
+        for i, chunk in enumerate(chunks):
+            pages.append([heading, f'{number} {i + 1}/{len(chunks)} 页'] + chunk)
+
+    section('权 利 要 求 书', claims)
+    section('说 明 书', spec)
+    section('说 明 书 附 图', ['图1'])
+    return pages
+
+
+def _encode(text: str) -> str:
+    """
+    按 Identity-H 编码把文本转为十六进制字符串（每个字符两个字节，即其 Unicode 码位）。
+    """
+    return ''.join(f'{ord(c):04X}' for c in text if ord(c) <= 0xFFFF)
+
+
+def _to_unicode_cmap() -> bytes:
+    """
+    构建把双字节字符码映射为同值 Unicode 码位的 ToUnicode CMap。
+    """
+    ranges = [f'<{hi:02X}00> <{hi:02X}FF> <{hi:02X}00>' for hi in range(256)]
+    blocks = []
+    for i in range(0, len(ranges), 100):  # 每个 bfrange 块最多 100 项
+        chunk = ranges[i:i + 100]
+        blocks.append(f'{len(chunk)} beginbfrange\n' + '\n'.join(chunk) + '\nendbfrange')
+    return ('/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n'
+            '/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+            '1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+            + '\n'.join(blocks) + '\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend').encode('ascii')
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """
+    把逐页文本行写成 PDF。
+
+    参数:
+    path (str): 输出路径。
+    pages (List[List[str]]): 逐页的文本行。
+    """
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(data: bytes, extra: str = '') -> bytes:
+        data = zlib.compress(data)
+        return f'<< /Length {len(data)} /Filter /FlateDecode {extra}>>\nstream\n'.encode('ascii') + data + b'\nendstream'
+
+    catalog = add(b'')
+    pages_id = add(b'')
+    to_unicode = add(stream(_to_unicode_cmap()))
+    descriptor = add(b'<< /Type /FontDescriptor /FontName /SimSun /Flags 6 /FontBBox [0 -141 1000 859] '
+                     b'/ItalicAngle 0 /Ascent 859 /Descent -141 /CapHeight 859 /StemV 80 >>')
+    cid_font = add(f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /SimSun '
+                   f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> '
+                   f'/FontDescriptor {descriptor} 0 R /DW 1000 /W [32 126 500] /CIDToGIDMap /Identity >>'.encode('ascii'))
+    font = add(f'<< /Type /Font /Subtype /Type0 /BaseFont /SimSun /Encoding /Identity-H '
+               f'/DescendantFonts [{cid_font} 0 R] /ToUnicode {to_unicode} 0 R >>'.encode('ascii'))
+    kids = []
+    for lines in pages:
+        ops = ['BT', f'/F1 {FONT_SIZE} Tf']
+        for i, line in enumerate(lines):
+            ops.append(f'1 0 0 1 {MARGIN} {PAGE_HEIGHT - MARGIN - i * LEADING} Tm <{_encode(line)}> Tj')
+        ops.append('ET')
+        content = add(stream('\n'.join(ops).encode('ascii')))
+        kids.append(add(f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                        f'/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>'.encode('ascii')))
+    objects[catalog - 1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode('ascii')
+    objects[pages_id - 1] = (f'<< /Type /Pages /Kids [{" ".join(f"{kid} 0 R" for kid in kids)}] '
+                             f'/Count {len(kids)} >>').encode('ascii')
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('ascii')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def write_disclosure(path: str, rng: random.Random, paragraphs: int = 12):
+    """
+    生成 .docx 技术交底书。
+
+    参数:
+    path (str): 输出路径。
+    rng (random.Random): 随机数生成器。
+    paragraphs (int): 正文段落数。
+    """
+    document = Document()
+    document.add_heading(f'技术交底书：一种基于大语言模型的{rng.choice(SUBJECTS)}', level=1)
+    for i in range(paragraphs):
+        if i % 4 == 0:
+            document.add_heading(rng.choice(SPEC_HEADINGS), level=2)
+        document.add_paragraph(_paragraph(rng, rng.randint(3, 6)))
+    document.save(path)
+
+
+def generate_corpus(out_dir: str, patents: int, disclosures: int = 1, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """
+    生成合成专利 PDF 和技术交底书。
+
+    参数:
+    out_dir (str): 输出目录，PDF 保存在 patents 子目录，交底书保存在 disclosures 子目录。
+    patents (int): 专利数量。
+    disclosures (int): 交底书数量。
+    seed (int): 随机种子。
+
+    返回:
+    Tuple[List[str], List[str]]: PDF 路径列表和交底书路径列表。
+    """
+    rng = random.Random(seed)
+    pdf_dir = os.path.join(out_dir, 'patents')
+    docx_dir = os.path.join(out_dir, 'disclosures')
+    os.makedirs(pdf_dir, exist_ok=True)
+    os.makedirs(docx_dir, exist_ok=True)
+    pdf_paths = []
+    for i in range(patents):
+        path = os.path.join(pdf_dir, f'synthetic_{i:05d}.pdf')
+        write_pdf(path, patent_pages(rng, i))
+        pdf_paths.append(path)
+    docx_paths = []
+    for i in range(disclosures):
+        path = os.path.join(docx_dir, f'disclosure_{i:03d}.docx')
+        write_disclosure(path, rng)
+        docx_paths.append(path)
+    return pdf_paths, docx_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成专利语料生成器')
+    parser.add_argument('--out', default='bench_corpus', help='输出目录')
+    parser.add_argument('--patents', type=int, default=20, help='专利 PDF 数量')
+    parser.add_argument('--disclosures', type=int, default=1, help='技术交底书数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+    pdf_paths, docx_paths = generate_corpus(args.out, args.patents, args.disclosures, args.seed)
+    print(f'已生成 {len(pdf_paths)} 个专利 PDF 和 {len(docx_paths)} 个技术交底书，保存在 {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+import os
+import json
+import zlib
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+CACHE_DIR = os.getenv('OPENPATENT_CACHE_DIR', 'cache')
+
+
+def content_hash(data) -> str:
+    """
+    计算文本或字节内容的 SHA-256 摘要。
+
+    参数:
+    data (str | bytes): 要计算摘要的内容。
+
+    返回:
+    str: 十六进制摘要字符串。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    分块计算文件内容的 SHA-256 摘要。
+
+    参数:
+    path (str): 文件路径。
+    block_size (int): 每次读取的字节数，默认为 1MB。
+
+    返回:
+    str: 十六进制摘要字符串。
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    基于 SQLite 的磁盘键值缓存，按总字节数限制容量，超出时按最近最少使用（LRU）淘汰。
+    """
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        初始化磁盘缓存。
+
+        参数:
+        path (str): SQLite 缓存文件路径。
+        max_bytes (int): 缓存内容的总字节数上限，默认为 512MB。
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取单个缓存项。
+
+        参数:
+        key (str): 缓存键。
+
+        返回:
+        Optional[bytes]: 缓存内容，不存在时返回 None。
+        """
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        批量读取缓存项，并刷新命中项的访问时间。
+
+        参数:
+        keys (List[str]): 缓存键列表。
+
+        返回:
+        List[Optional[bytes]]: 与 keys 顺序一致的缓存内容，未命中的位置为 None。
+        """
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany('UPDATE entries SET last_access = ? WHERE key = ?',
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            results = [found.get(key) for key in keys]
+            hit_count = sum(1 for value in results if value is not None)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return results
+
+    def set(self, key: str, value: bytes):
+        """
+        写入单个缓存项。
+
+        参数:
+        key (str): 缓存键。
+        value (bytes): 缓存内容。
+        """
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, bytes]):
+        """
+        批量写入缓存项，写入后按 LRU 淘汰超出容量的旧项。
+
+        参数:
+        items (Dict[str, bytes]): 键到内容的映射。
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                [(key, sqlite3.Binary(value), len(value), now) for key, value in items.items()]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        删除最久未访问的缓存项，直到总字节数不超过上限。调用方需持有锁。
+        """
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute('SELECT key, size FROM entries ORDER BY last_access'):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany('DELETE FROM entries WHERE key = ?', stale)
+
+    def delete(self, key: str):
+        """
+        删除单个缓存项。
+
+        参数:
+        key (str): 缓存键。
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """
+        清空缓存并重置命中统计。
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM entries')
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计信息。
+
+        返回:
+        Dict[str, int]: 包含 hits、misses、entries 和 bytes 的字典。
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+
+class EmbeddingCache(DiskCache):
+    """
+    嵌入向量缓存，键为模型名加文本的 SHA-256 摘要。
+    """
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'embeddings.sqlite'),
+                 max_bytes: int = 1024 * 1024 * 1024):
+        """
+        初始化嵌入向量缓存。
+
+        参数:
+        path (str): SQLite 缓存文件路径。
+        max_bytes (int): 缓存内容的总字节数上限，默认为 1GB。
+        """
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        生成嵌入缓存键。
+
+        参数:
+        model (str): 嵌入模型名称。
+        text (str): 文本内容。
+
+        返回:
+        str: 缓存键。
+        """
+        return f'{model}:{content_hash(text)}'
+
+    def get_embeddings(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量读取文本的嵌入向量。
+
+        参数:
+        model (str): 嵌入模型名称。
+        texts (List[str]): 文本列表。
+
+        返回:
+        List[Optional[np.ndarray]]: 与 texts 顺序一致的向量，未命中的位置为 None。
+        """
+        values = self.get_many([self.make_key(model, text) for text in texts])
+        return [np.frombuffer(value, dtype='float32') if value is not None else None for value in values]
+
+    def put_embeddings(self, model: str, texts: List[str], embeddings: np.ndarray):
+        """
+        批量写入文本的嵌入向量。
+
+        参数:
+        model (str): 嵌入模型名称。
+        texts (List[str]): 文本列表。
+        embeddings (np.ndarray): 形状为 [len(texts), 维度] 的嵌入向量。
+        """
+        self.set_many({
+            self.make_key(model, text): np.ascontiguousarray(embedding, dtype='float32').tobytes()
+            for text, embedding in zip(texts, embeddings)
+        })
+
+
+class ExtractionCache(DiskCache):
+    """
+    PDF 文本提取缓存，键为提取器版本加 PDF 内容的 SHA-256 摘要，值为压缩后的逐页文本。
+    """
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'extraction.sqlite'),
+                 max_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化 PDF 文本提取缓存。
+
+        参数:
+        path (str): SQLite 缓存文件路径。
+        max_bytes (int): 缓存内容的总字节数上限，默认为 256MB。
+        """
+        super().__init__(path, max_bytes)
+
+    def get_pages(self, version: str, digest: str) -> Optional[List[str]]:
+        """
+        读取 PDF 的逐页文本。
+
+        参数:
+        version (str): 提取器版本。
+        digest (str): PDF 内容摘要。
+
+        返回:
+        Optional[List[str]]: 逐页文本，未命中时返回 None。
+        """
+        value = self.get(f'{version}:{digest}')
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value).decode('utf-8'))
+
+    def put_pages(self, version: str, digest: str, pages: List[str]):
+        """
+        写入 PDF 的逐页文本。
+
+        参数:
+        version (str): 提取器版本。
+        digest (str): PDF 内容摘要。
+        pages (List[str]): 逐页文本。
+        """
+        self.set(f'{version}:{digest}', zlib.compress(json.dumps(pages, ensure_ascii=False).encode('utf-8')))
+
+
+class ResponseCache(DiskCache):
+    """
+    LLM 响应缓存，键为模型名、完整对话消息和采样参数的 SHA-256 摘要，值为压缩后的响应文本。
+    """
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'responses.sqlite'),
+                 max_bytes: int = 128 * 1024 * 1024):
+        """
+        初始化 LLM 响应缓存。
+
+        参数:
+        path (str): SQLite 缓存文件路径。
+        max_bytes (int): 缓存内容的总字节数上限，默认为 128MB。
+        """
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], params: Dict) -> str:
+        """
+        生成响应缓存键。消息和参数以排序键的 JSON 序列化，保证相同请求得到相同的键。
+
+        参数:
+        model (str): 模型名称。
+        messages (List[Dict[str, str]]): 对话消息。
+        params (Dict): 采样参数，如 temperature。
+
+        返回:
+        str: 缓存键。
+        """
+        payload = json.dumps({'model': model, 'messages': messages, 'params': params},
+                             ensure_ascii=False, sort_keys=True)
+        return f'{model}:{content_hash(payload)}'
+
+    def get_response(self, model: str, messages: List[Dict[str, str]], params: Dict) -> Optional[str]:
+        """
+        读取缓存的响应。
+
+        参数:
+        model (str): 模型名称。
+        messages (List[Dict[str, str]]): 对话消息。
+        params (Dict): 采样参数。
+
+        返回:
+        Optional[str]: 响应文本，未命中时返回 None。
+        """
+        value = self.get(self.make_key(model, messages, params))
+        return zlib.decompress(value).decode('utf-8') if value is not None else None
+
+    def put_response(self, model: str, messages: List[Dict[str, str]], params: Dict, content: str):
+        """
+        写入响应。
+
+        参数:
+        model (str): 模型名称。
+        messages (List[Dict[str, str]]): 对话消息。
+        params (Dict): 采样参数。
+        content (str): 响应文本。
+        """
+        self.set(self.make_key(model, messages, params), zlib.compress(content.encode('utf-8')))
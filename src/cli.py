@@ -0,0 +1,279 @@
+"""
+OpenPatent 命令行工具，无需启动 Web UI 即可批量入库参考专利、生成和导出专利文档。
+
+用法:
+python src/cli.py ingest 参考专利 --workers 4
+python src/cli.py ingest 电池专利 --library battery
+python src/cli.py generate 交底书/*.docx --types 说明书,摘要,权利要求书 --workers 4 --out output
+python src/cli.py generate 交底书/*.docx --libraries default,battery
+python src/cli.py export --out output
+
+generate 的结果以 <输出目录>/<技术文档名>/<文档类型>.txt 保存，已存在的结果会被跳过，
+因此中断后重新运行同一命令即可从断点继续；export 把这些结果转换为 .docx。
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+import numpy as np
+from reference_library import ReferenceLibrary, DEFAULT_LIBRARY
+from vector_db import SEARCH_MODES
+from llm_integration import PatentGenerator
+from tech_doc import TechDocumentCache
+from docx_export import save_draft_docx
+from metrics import METRICS
+
+# 文档类型到知识库（章节名）的映射
+DOC_TYPES = {'说明书': '说 明 书', '摘要': '摘要', '权利要求书': '权 利 要 求 书'}
+
+
+class StageTimer:
+    """
+    按阶段累计耗时的计时器，可在多个线程中同时使用，结束时输出吞吐量和各阶段耗时汇总。
+    """
+    def __init__(self):
+        """
+        初始化计时器，并记录总计时的起点。
+        """
+        self.start = time.perf_counter()
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        统计一个阶段的耗时。
+
+        参数:
+        name (str): 阶段名称。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """
+        记录一次阶段耗时。
+
+        参数:
+        name (str): 阶段名称。
+        seconds (float): 耗时（秒）。
+        """
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def summary(self, completed: int, unit: str) -> str:
+        """
+        生成耗时汇总。
+
+        参数:
+        completed (int): 完成的任务数。
+        unit (str): 任务单位，如 "篇"。
+
+        返回:
+        str: 多行汇总文本。
+        """
+        elapsed = time.perf_counter() - self.start
+        rate = completed / elapsed * 60 if elapsed > 0 else 0.0
+        lines = [f'完成 {completed} {unit}，总耗时 {elapsed:.1f}s，吞吐 {rate:.2f} {unit}/分钟']
+        lines.append(f"{'阶段':<10}{'次数':>6}{'累计(s)':>10}{'平均(s)':>10}{'p50(s)':>10}{'最大(s)':>10}")
+        for name, values in self.samples.items():
+            lines.append(f'{name:<10}{len(values):>6}{sum(values):>10.2f}{np.mean(values):>10.2f}'
+                         f'{np.percentile(values, 50):>10.2f}{max(values):>10.2f}')
+        return '\n'.join(lines)
+
+
+def draft_path(out_dir: str, docx_path: str, doc_type: str) -> str:
+    """
+    获取技术文档某一类型结果的保存路径。
+
+    参数:
+    out_dir (str): 输出目录。
+    docx_path (str): 技术文档路径。
+    doc_type (str): 文档类型。
+
+    返回:
+    str: 结果文件路径。
+    """
+    stem = os.path.splitext(os.path.basename(docx_path))[0]
+    return os.path.join(out_dir, stem, f'{doc_type}.txt')
+
+
+def write_atomic(path: str, content: str):
+    """
+    先写临时文件再替换，保证结果文件要么完整、要么不存在，以便中断后续跑。
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def cmd_ingest(args) -> int:
+    """
+    将目录中的参考专利 PDF 与指定知识库同步。
+    """
+    timer = StageTimer()
+    ingestor = ReferenceLibrary(args.db_dir, ingest_workers=args.workers).ingestor(args.library)
+    with timer.stage('入库'):
+        summary = ingestor.ingest_folder(args.directory)
+    stats = ingestor.extractor.last_stats
+    if stats:
+        timer.record('PDF提取', stats['seconds'])
+    print(f"新增 {len(summary['added'])}，更新 {len(summary['updated'])}，删除 {len(summary['removed'])}，"
+          f"跳过 {len(summary['skipped'])}")
+    if stats:
+        print(f"PDF 提取 {stats['pages']} 页，{stats['pages_per_sec']:.1f} 页/秒，{stats['cached_files']} 个文件命中提取缓存")
+    print(timer.summary(len(summary['added']) + len(summary['updated']), '篇'))
+    return 0
+
+
+def cmd_generate(args) -> int:
+    """
+    批量为技术文档生成指定类型的专利文档，已有结果的任务会被跳过。
+    """
+    doc_types = [doc_type.strip() for doc_type in args.types.split(',') if doc_type.strip()]
+    unknown = [doc_type for doc_type in doc_types if doc_type not in DOC_TYPES]
+    if unknown:
+        print(f'未知的文档类型: {unknown}，可选 {list(DOC_TYPES)}', file=sys.stderr)
+        return 2
+    paths = [path for pattern in args.docx for path in sorted(glob.glob(pattern)) or [pattern]]
+    tasks: List[Tuple[str, str]] = []
+    skipped = 0
+    for path in paths:
+        for doc_type in doc_types:
+            if not args.force and os.path.exists(draft_path(args.out, path, doc_type)):
+                skipped += 1
+            else:
+                tasks.append((path, doc_type))
+    print(f'共 {len(paths)} 个技术文档，{len(tasks)} 个任务待生成，{skipped} 个已完成跳过')
+    if not tasks:
+        return 0
+
+    timer = StageTimer()
+    library = ReferenceLibrary(args.db_dir)
+    libraries = [name.strip() for name in args.libraries.split(',') if name.strip()] if args.libraries else None
+    with timer.stage('加载知识库'):
+        try:
+            library.load(libraries)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    tech_docs = TechDocumentCache(None if args.search_mode == 'sparse' else library.embed_texts,
+                                  max_entries=max(16, len(paths)))
+
+    def run(path: str, doc_type: str):
+        with timer.stage('解析与嵌入'):
+            doc = tech_docs.load(path)
+        with timer.stage('检索'):
+            context = library.search(DOC_TYPES[doc_type], doc.text, args.top_k, libraries, merge_by_source=True,
+                                     mode=args.search_mode, embedding=doc.embedding)
+        generator = PatentGenerator(use_response_cache=args.response_cache)
+        with timer.stage('生成'):
+            content = generator.generate_draft(doc.text, context, doc_type)
+        if doc_type not in generator.current_draft:
+            raise RuntimeError(content)
+        write_atomic(draft_path(args.out, path, doc_type), content)
+
+    completed = failed = 0
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(run, path, doc_type): (path, doc_type) for path, doc_type in tasks}
+        for future in as_completed(futures):
+            path, doc_type = futures[future]
+            try:
+                future.result()
+                completed += 1
+                print(f'[{completed + failed}/{len(tasks)}] {os.path.basename(path)} {doc_type} 完成')
+            except Exception as e:
+                failed += 1
+                logging.error(f'{path} {doc_type} 生成失败: {e}')
+    except KeyboardInterrupt:
+        print('已中断，未开始的任务已取消；重新运行同一命令即可继续', file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(timer.summary(completed, '篇'))
+        return 130
+    executor.shutdown()
+    print(timer.summary(completed, '篇'))
+    if failed:
+        print(f'{failed} 个任务失败，重新运行同一命令可重试', file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_export(args) -> int:
+    """
+    将 generate 的结果转换为 .docx，已导出且结果未更新的文件会被跳过。
+    """
+    timer = StageTimer()
+    exported = 0
+    for path in sorted(glob.glob(os.path.join(args.out, '*', '*.txt'))):
+        target = os.path.splitext(path)[0] + '.docx'
+        if not args.force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        with timer.stage('导出'):
+            save_draft_docx(content, target)
+        exported += 1
+    print(timer.summary(exported, '篇'))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    构建命令行参数解析器。
+    """
+    parser = argparse.ArgumentParser(description='OpenPatent 命令行工具')
+    parser.add_argument('--db-dir', default='dbs', help='知识库目录，默认为 dbs')
+    parser.add_argument('--log-level', default=os.getenv('OPENPATENT_LOG_LEVEL', 'INFO'),
+                        help='日志级别，DEBUG 时输出查询和检索结果等调试内容，默认为 INFO')
+    parser.add_argument('--metrics-file', help='结束时把各阶段指标以 Prometheus 文本格式写入该文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='将目录中的参考专利 PDF 增量入库')
+    ingest.add_argument('directory', help='参考专利目录')
+    ingest.add_argument('--workers', type=int, default=None, help='PDF 提取进程数，默认为 CPU 核数')
+    ingest.add_argument('--library', default=DEFAULT_LIBRARY,
+                        help='存入的知识库名称，不存在时新建，默认为 default（即知识库目录本身）')
+    ingest.set_defaults(func=cmd_ingest)
+
+    generate = subparsers.add_parser('generate', help='批量生成专利文档')
+    generate.add_argument('docx', nargs='+', help='技术文档路径，支持通配符')
+    generate.add_argument('--types', default=','.join(DOC_TYPES), help='逗号分隔的文档类型')
+    generate.add_argument('--out', default='output', help='输出目录，默认为 output')
+    generate.add_argument('--workers', type=int, default=4, help='同时进行的生成任务数，默认为 4')
+    generate.add_argument('--top-k', type=int, default=6, help='每个文档检索的段落数，默认为 6')
+    generate.add_argument('--search-mode', choices=SEARCH_MODES, default='dense', help='检索方式')
+    generate.add_argument('--libraries', help='逗号分隔的检索知识库，默认检索全部知识库')
+    generate.add_argument('--response-cache', action='store_true', help='启用 LLM 响应缓存')
+    generate.add_argument('--force', action='store_true', help='重新生成已有结果')
+    generate.set_defaults(func=cmd_generate)
+
+    export = subparsers.add_parser('export', help='将生成结果导出为 .docx')
+    export.add_argument('--out', default='output', help='generate 的输出目录，默认为 output')
+    export.add_argument('--force', action='store_true', help='重新导出全部结果')
+    export.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        return args.func(args)
+    finally:
+        if args.metrics_file:
+            write_atomic(os.path.abspath(args.metrics_file), METRICS.render())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from docx import Document
+from docx.shared import Pt
+from docx.enum.text import WD_LINE_SPACING
+from docx.oxml.ns import qn
+
+
+def save_draft_docx(content: str, filename: str):
+    """
+    将带 <标题>/<段落> 标签的专利文档保存为 .docx 文件，正文和标题均使用宋体五号。
+
+    参数:
+    content (str): 生成的专利文档内容。
+    filename (str): 保存的文件路径。
+    """
+    # 创建新文档并设置全局样式
+    doc = Document()
+    doc.styles['Normal'].font.name = '宋体'
+    doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+    # 确保 Heading 1 样式的字体为宋体
+    heading_style = doc.styles['Heading 1']
+    heading_style.font.name = '宋体'
+    heading_style._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+    heading_style.font.size = Pt(10.5)  # 宋体五号
+    heading_style.font.bold = True
+    heading_style.paragraph_format.space_before = Pt(6)
+    heading_style.paragraph_format.space_after = Pt(6)
+    heading_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
+
+    # 创建一个新的段落样式用于正文
+    body_style = doc.styles['Normal']
+    body_style.font.name = '宋体'
+    body_style._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+    body_style.font.size = Pt(10.5)  # 宋体五号
+    body_style.paragraph_format.space_before = Pt(0)  # 正文段落前无缩进
+    body_style.paragraph_format.space_after = Pt(0)   # 正文段落后无缩进
+    body_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
+    body_style.paragraph_format.first_line_indent = Pt(0)  # 无缩进
+    # 解析XML标签并应用格式
+    paragraphs = content.split('\n')
+    for para in paragraphs:
+        if para.startswith('<标题>'):
+            title = para[4:-5].strip()  # 提取<标题>内容</标题>
+            doc.add_paragraph(title, style='Heading 1')
+        elif para.startswith('<段落>'):
+            text = para[4:-5].strip()  # 提取<段落>内容</段落>
+            doc.add_paragraph(text)
+
+    doc.save(filename)
@@ -0,0 +1,210 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+TAGS = {'标题': 'H', '段落': 'P'}
+_BLOCK_PATTERN = re.compile(r'<(标题|段落)>(.*?)</\1>', re.S)
+# 汉字也属于 \w，不能用 \b 判断 ID 的边界；只匹配大写的 P/H，避免把意见中的 "p2"、"h1" 等普通文字当作块 ID
+_PARAGRAPH_REF = re.compile(r'(?<![A-Za-z0-9])([PH])(\d+)(?!\d)')
+_ORDINAL_REF = re.compile(r'第\s*(\d+)\s*段')
+_CLAIM_REF = re.compile(r'权利要求\s*(\d+)')
+_CLAIM_NUMBER = re.compile(r'^\s*(\d+)\s*[.．、]')
+
+
+class DraftBlock:
+    """
+    草稿中的一个标题或段落。
+    """
+    def __init__(self, block_id: str, kind: str, text: str, raw: Optional[str] = None, gap: str = '\n'):
+        """
+        初始化草稿块。
+
+        参数:
+        block_id (str): 稳定 ID，标题为 H1、H2…，段落为 P1、P2…，修订后保持不变。
+        kind (str): "标题" 或 "段落"。
+        text (str): 块的内容（不含标签）。
+        raw (str): 块在原文中的完整文本（含标签），未提供时按标准格式生成。
+        gap (str): 块之后到下一个块之前的原文，用于原样拼接。
+        """
+        self.id = block_id
+        self.kind = kind
+        self.text = text
+        self.raw = raw if raw is not None else f'<{kind}>{text}</{kind}>'
+        self.gap = gap
+
+    def __repr__(self) -> str:
+        return f'DraftBlock({self.id}, {self.text[:20]!r})'
+
+
+class Draft:
+    """
+    结构化的专利文档草稿：按顺序排列的标题和段落，每个块有稳定 ID。
+
+    局部修订只替换目标块，其余块的原文（含标签和块间空白）原样保留，render 的结果与未修改部分逐字一致。
+    """
+    def __init__(self, blocks: List[DraftBlock], preamble: str = ''):
+        """
+        初始化草稿。
+
+        参数:
+        blocks (List[DraftBlock]): 按顺序排列的块。
+        preamble (str): 第一个块之前的原文。
+        """
+        self.blocks = blocks
+        self.preamble = preamble
+        self._next = {prefix: 1 + max([int(block.id[1:]) for block in blocks if block.id[0] == prefix] or [0])
+                      for prefix in TAGS.values()}
+
+    def new_id(self, kind: str) -> str:
+        """
+        为新增的块分配不与已有块重复的 ID。
+        """
+        prefix = TAGS[kind]
+        block_id = f'{prefix}{self._next[prefix]}'
+        self._next[prefix] += 1
+        return block_id
+
+    def index(self, block_id: str) -> int:
+        """
+        获取块的位置，找不到时返回 -1。
+        """
+        for i, block in enumerate(self.blocks):
+            if block.id == block_id:
+                return i
+        return -1
+
+    def render(self) -> str:
+        """
+        拼接为带 <标题>/<段落> 标签的文本。
+        """
+        return self.preamble + ''.join(block.raw + block.gap for block in self.blocks)
+
+    def annotate(self) -> str:
+        """
+        拼接为在每个块前标出 ID（如 [P3]）的文本，用于在界面上显示，用户可以在修改意见中引用这些 ID。
+        """
+        return self.preamble + ''.join(f'[{block.id}] {block.raw}{block.gap}' for block in self.blocks)
+
+    def outline(self, width: int = 40) -> str:
+        """
+        生成带 ID 的提纲，每个块一行，段落只保留开头 width 个字符，用于让模型定位修改位置。
+        """
+        lines = []
+        for block in self.blocks:
+            text = block.text.strip().replace('\n', ' ')
+            lines.append(f'[{block.id}] {text[:width]}{"……" if len(text) > width else ""}')
+        return '\n'.join(lines)
+
+    def spans(self, block_ids: List[str]) -> List[Tuple[int, int]]:
+        """
+        把目标块按位置合并为连续区间，相邻的目标块在同一次调用中修订，不同区间之间互不依赖。
+
+        参数:
+        block_ids (List[str]): 目标块 ID。
+
+        返回:
+        List[Tuple[int, int]]: 按位置排列的 [起, 止) 区间。
+        """
+        positions = sorted({i for i in map(self.index, block_ids) if i >= 0})
+        spans: List[Tuple[int, int]] = []
+        for i in positions:
+            if spans and spans[-1][1] == i:
+                spans[-1] = (spans[-1][0], i + 1)
+            else:
+                spans.append((i, i + 1))
+        return spans
+
+    def replace(self, start: int, end: int, text: str):
+        """
+        用修订结果替换 [start, end) 区间内的块。
+
+        修订结果中的块依次沿用原区间的 ID，多出的块分配新 ID；结果没有标签时整体作为一个块，类型同区间第一个块。
+        最后一个新块沿用原区间末尾的块间空白，使后续内容的位置不变。
+
+        参数:
+        start (int): 区间起点。
+        end (int): 区间终点。
+        text (str): 修订后的带标签文本。
+        """
+        old = self.blocks[start:end]
+        parsed = [(kind, content) for kind, content in _BLOCK_PATTERN.findall(text)]
+        # 原文本身没有标签时（见 parse_draft），不带标签的修订结果也按原格式保存
+        untagged = not parsed and old[0].raw == old[0].text
+        if not parsed:
+            parsed = [(old[0].kind, text.strip())]
+        reuse = {kind: [block.id for block in old if block.kind == kind] for kind in TAGS}
+        blocks = []
+        for kind, content in parsed:
+            block_id = reuse[kind].pop(0) if reuse[kind] else self.new_id(kind)
+            blocks.append(DraftBlock(block_id, kind, content, raw=content if untagged else None))
+        blocks[-1].gap = old[-1].gap
+        self.blocks[start:end] = blocks
+
+    def find_targets(self, feedback: str) -> List[str]:
+        """
+        从修改意见中找出明确指向的块。
+
+        支持的写法：块 ID（大写的 "P3"、"H2"），段落序号（"第3段"），权利要求编号（"权利要求2"，匹配以 "2." 开头的段落），
+        以及标题原文（如 "背景技术"，指向该标题下的全部段落）。
+
+        参数:
+        feedback (str): 修改意见。
+
+        返回:
+        List[str]: 目标块 ID，未找到明确指向时为空列表。
+        """
+        ids = {block.id for block in self.blocks}
+        targets = []
+        for prefix, number in _PARAGRAPH_REF.findall(feedback):
+            targets.append(f'{prefix}{number}')
+        paragraphs = [block for block in self.blocks if block.kind == '段落']
+        for number in _ORDINAL_REF.findall(feedback):
+            if 0 < int(number) <= len(paragraphs):
+                targets.append(paragraphs[int(number) - 1].id)
+        claims: Dict[str, str] = {}
+        for block in paragraphs:
+            match = _CLAIM_NUMBER.match(block.text)
+            if match:
+                claims.setdefault(match.group(1), block.id)
+        for number in _CLAIM_REF.findall(feedback):
+            if number in claims:
+                targets.append(claims[number])
+        for i, block in enumerate(self.blocks):
+            if block.kind == '标题' and len(block.text.strip()) >= 2 and block.text.strip() in feedback:
+                for following in self.blocks[i + 1:]:
+                    if following.kind == '标题':
+                        break
+                    targets.append(following.id)
+        return [block_id for block_id in dict.fromkeys(targets) if block_id in ids]
+
+
+def parse_draft(text: str) -> Draft:
+    """
+    把带 <标题>/<段落> 标签的文本解析为结构化草稿，按出现顺序分配 ID。
+
+    没有任何标签时（模型未按格式输出），按非空行切分为段落。
+
+    参数:
+    text (str): 草稿文本。
+
+    返回:
+    Draft: 结构化草稿，render() 与输入逐字一致。
+    """
+    matches = list(_BLOCK_PATTERN.finditer(text))
+    blocks = []
+    if not matches:
+        lines = list(re.finditer(r'[^\n]*\S[^\n]*', text))
+        if not lines:
+            return Draft([], text)
+        for i, match in enumerate(lines):
+            end = lines[i + 1].start() if i + 1 < len(lines) else len(text)
+            blocks.append(DraftBlock(f'P{i + 1}', '段落', match.group(), raw=match.group(), gap=text[match.end():end]))
+        return Draft(blocks, text[:lines[0].start()])
+    counters = {prefix: 0 for prefix in TAGS.values()}
+    for i, match in enumerate(matches):
+        kind = match.group(1)
+        prefix = TAGS[kind]
+        counters[prefix] += 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        blocks.append(DraftBlock(f'{prefix}{counters[prefix]}', kind, match.group(2), raw=match.group(),
+                                 gap=text[match.end():end]))
+    return Draft(blocks, text[:matches[0].start()])
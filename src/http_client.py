@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 遇到这些状态码时按指数退避重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 默认超时：(连接, 读取) 秒
+DEFAULT_TIMEOUT = (10.0, 120.0)
+# 每个接口（协议+主机+端口）同时在途的请求数上限
+EMBEDDING_CONCURRENCY = int(os.getenv('OPENPATENT_EMBEDDING_CONCURRENCY', '8'))
+LLM_CONCURRENCY = int(os.getenv('OPENPATENT_LLM_CONNECTIONS', '8'))
+
+
+class HTTPClient:
+    """
+    共享的 HTTP 客户端：复用 keep-alive 连接池，按调用设置超时，对 429/5xx 和连接错误按指数退避重试，
+    并限制每个接口同时在途的请求数。
+    """
+    def __init__(self, max_retries: int = 5, backoff_factor: float = 0.5,
+                 max_per_endpoint: int = EMBEDDING_CONCURRENCY,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT):
+        """
+        初始化 HTTP 客户端。
+
+        参数:
+        max_retries (int): 最大重试次数，默认为 5。
+        backoff_factor (float): 指数退避的基数（秒），第 n 次重试前等待约 backoff_factor * 2^(n-1) 秒，默认为 0.5。
+        max_per_endpoint (int): 每个接口同时在途的请求数上限，同时作为连接池大小，默认为 8。
+        timeout (Tuple[float, float]): 默认的 (连接, 读取) 超时秒数。
+        """
+        self.timeout = timeout
+        self.max_per_endpoint = max_per_endpoint
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=None,  # 嵌入请求是幂等的，POST 也重试
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_per_endpoint, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, url: str) -> threading.BoundedSemaphore:
+        """
+        获取接口对应的并发信号量，同一协议、主机和端口的请求共用一个信号量，首次请求时创建。
+
+        参数:
+        url (str): 请求地址。
+
+        返回:
+        threading.BoundedSemaphore: 限制该接口并发请求数的信号量，上限为 max_per_endpoint。
+        """
+        parts = urlsplit(url)
+        endpoint = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            if endpoint not in self._limits:
+                self._limits[endpoint] = threading.BoundedSemaphore(self.max_per_endpoint)
+            return self._limits[endpoint]
+
+    def post_json(self, url: str, payload: Dict, headers: Optional[Dict[str, str]] = None,
+                  timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """
+        发送 JSON POST 请求并返回解析后的 JSON 响应。
+
+        参数:
+        url (str): 请求地址。
+        payload (Dict): 请求体。
+        headers (Dict[str, str]): 请求头。
+        timeout (Tuple[float, float]): (连接, 读取) 超时秒数，默认为 self.timeout。
+
+        返回:
+        Dict: 响应 JSON。
+
+        异常:
+        requests.exceptions.RequestException: 重试用尽后仍然失败，或返回了非 2xx 状态码。
+        """
+        with self._limit(url):
+            response = self.session.post(url, json=payload, headers=headers, timeout=timeout or self.timeout)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            logging.error(f'Response content: {response.text[:1000]}')
+            raise
+        return response.json()
+
+
+_http_client: Optional[HTTPClient] = None
+_openai_http_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """
+    获取进程内共享的 HTTP 客户端，用于嵌入等 JSON 接口。
+
+    返回:
+    HTTPClient: 共享客户端。
+    """
+    global _http_client
+    with _client_lock:
+        if _http_client is None:
+            _http_client = HTTPClient()
+        return _http_client
+
+
+def get_openai_http_client():
+    """
+    获取进程内共享的 OpenAI SDK HTTP 客户端。
+
+    所有 PatentGenerator 共用同一个连接池，连接数上限即对 LLM 接口的并发上限，超出的请求等待空闲连接。
+
+    返回:
+    httpx.Client: 共享客户端。
+    """
+    global _openai_http_client
+    with _client_lock:
+        if _openai_http_client is None:
+            _openai_http_client = openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=LLM_CONCURRENCY, max_keepalive_connections=LLM_CONCURRENCY),
+            )
+        return _openai_http_client
+
+
+def openai_timeout(read: float = 600.0, connect: float = 10.0):
+    """
+    构建 OpenAI 请求超时：流式生成可能持续数分钟，读取超时按单次读取计算；等待空闲连接的时间不设上限。
+
+    参数:
+    read (float): 读取超时秒数，默认为 600。
+    connect (float): 连接超时秒数，默认为 10。
+
+    返回:
+    openai.Timeout: 超时设置。
+    """
+    return openai.Timeout(read, connect=connect, pool=None)
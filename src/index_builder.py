@@ -0,0 +1,333 @@
+import time
+import math
+import logging
+from typing import Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'ivfpq')
+# 向量在索引中的存储方式：原始 float32、float16/int8 标量量化、乘积量化
+STORAGE_TYPES = ('float32', 'float16', 'int8', 'pq')
+# 自动选择索引类型的规模阈值
+FLAT_MAX_VECTORS = 20000
+IVF_MAX_VECTORS = 1000000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+PQ_MIN_VECTORS = 256
+
+
+def choose_index_type(n: int) -> str:
+    """
+    根据向量数量自动选择索引类型。
+
+    小于 FLAT_MAX_VECTORS 时使用精确的 flat；不超过 IVF_MAX_VECTORS 时使用 ivf；更大时使用 ivfpq 压缩存储。
+
+    参数:
+    n (int): 向量数量。
+
+    返回:
+    str: 索引类型。
+    """
+    if n < FLAT_MAX_VECTORS:
+        return 'flat'
+    if n <= IVF_MAX_VECTORS:
+        return 'ivf'
+    return 'ivfpq'
+
+
+def _nlist(n: int) -> int:
+    """
+    IVF 的聚类中心数：约 4*sqrt(n)，且保证每个中心至少有 39 个训练样本。
+    """
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m(d: int) -> int:
+    """
+    PQ 的子量化器数量：取能整除维度、且每段不少于 16 维的最大值。
+    """
+    for m in (64, 32, 16, 8, 4, 2):
+        if d % m == 0 and d // m >= 16:
+            return m
+    return 1
+
+
+def _storage_code(storage: str, d: int) -> str:
+    """
+    存储方式对应的 index_factory 编码。
+    """
+    return {'float32': 'Flat', 'float16': 'SQfp16', 'int8': 'SQ8', 'pq': f'PQ{_pq_m(d)}'}[storage]
+
+
+def normalize_storage(index_type: str, storage: str):
+    """
+    统一索引类型与存储方式的组合：ivfpq 即使用乘积量化存储的 ivf，ivf 选择 pq 存储时等同于 ivfpq。
+
+    参数:
+    index_type (str): 索引类型。
+    storage (str): 存储方式，STORAGE_TYPES 中的一种。
+
+    返回:
+    Tuple[str, str]: 统一后的 (索引类型, 存储方式)。
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f'未知的存储方式: {storage}，可选 {STORAGE_TYPES}')
+    if index_type == 'ivfpq' or (index_type == 'ivf' and storage == 'pq'):
+        return 'ivfpq', 'pq'
+    return index_type, storage
+
+
+def index_kind(index) -> str:
+    """
+    判断 FAISS 索引的类型。
+
+    参数:
+    index: FAISS 索引。
+
+    返回:
+    str: INDEX_TYPES 中的一种。
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(inner, faiss.IndexIVF):
+        return 'ivf'
+    return 'flat'
+
+
+def index_storage(index) -> str:
+    """
+    判断 FAISS 索引中向量的存储方式。
+
+    参数:
+    index: FAISS 索引。
+
+    返回:
+    str: STORAGE_TYPES 中的一种。
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return 'pq'
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'float16' if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'int8'
+    return 'float32'
+
+
+def mmap_flags(index_type: str) -> int:
+    """
+    以只读内存映射方式读取索引时使用的 faiss.read_index 标志。
+
+    ivf 类索引映射倒排表；flat 和 hnsw 映射向量编码（需要 faiss 1.8 以上，更早的版本退化为普通读取）。
+    映射的页属于操作系统页缓存，多个进程加载同一个索引文件时共享同一份物理内存。
+
+    参数:
+    index_type (str): 索引类型。
+
+    返回:
+    int: IO 标志。
+    """
+    if index_type in ('ivf', 'ivfpq'):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def index_bytes(index) -> int:
+    """
+    索引序列化后的字节数，近似于完整加载到内存时的占用。
+    """
+    return int(faiss.serialize_index(index).size)
+
+
+def exact_rerank(query: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int):
+    """
+    用原始向量重新计算候选的精确 L2 距离并取前 k 个，弥补量化带来的排序误差。
+
+    参数:
+    query (np.ndarray): 形状为 [d] 的查询向量。
+    ids (np.ndarray): 候选 ID。
+    vectors (np.ndarray): 与 ids 对应的原始向量，形状为 [len(ids), d]。
+    k (int): 返回的数量。
+
+    返回:
+    Tuple[np.ndarray, np.ndarray]: 按距离升序排列的 (ID, 距离)。
+    """
+    distances = ((np.asarray(vectors, dtype='float32') - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind='stable')[:k]
+    return np.asarray(ids)[order], distances[order]
+
+
+def supports_remove(index) -> bool:
+    """
+    判断索引是否支持按 ID 原地删除（HNSW 不支持，需要重建）。
+    """
+    return index_kind(index) != 'hnsw'
+
+
+def build_faiss_index(index_type: str, vectors: np.ndarray, ids: np.ndarray, storage: str = 'float32'):
+    """
+    创建、训练并填充指定类型的 FAISS 索引。
+
+    flat 和 hnsw 外包 IndexIDMap2 以支持自定义 ID；ivf 和 ivfpq 本身支持自定义 ID，
+    并使用哈希表直接映射以支持按 ID 删除和重建向量。
+    向量数量不足以训练时退化为 flat；不足以训练 pq 时改用 float32 存储。
+
+    参数:
+    index_type (str): 索引类型，INDEX_TYPES 中的一种。
+    vectors (np.ndarray): 形状为 [n, d] 的向量。
+    ids (np.ndarray): 长度为 n 的 int64 ID。
+    storage (str): 向量存储方式，STORAGE_TYPES 中的一种，默认为 float32；
+    float16 每维 2 字节、int8 每维 1 字节，pq 每个向量只占 _pq_m(d) 字节。
+
+    返回:
+    填充好的 FAISS 索引。
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f'未知的索引类型: {index_type}，可选 {INDEX_TYPES}')
+    index_type, storage = normalize_storage(index_type, storage)
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    ids = np.asarray(ids, dtype='int64')
+    n, d = vectors.shape
+    if index_type == 'ivfpq' and n < PQ_MIN_VECTORS:
+        logging.warning(f'向量数量 {n} 不足以训练 ivfpq，改用 flat 索引')
+        index_type, storage = 'flat', 'float32'
+    if (storage == 'pq' and n < PQ_MIN_VECTORS) or (storage == 'int8' and n == 0):
+        logging.warning(f'向量数量 {n} 不足以训练 {storage} 量化器，改用 float32 存储')
+        storage = 'float32'
+
+    nlist = 1
+    code = _storage_code(storage, d)
+    if index_type == 'flat':
+        index = faiss.index_factory(d, f'IDMap2,{code}')
+    elif index_type == 'hnsw':
+        index = faiss.index_factory(d, f'IDMap2,HNSW{HNSW_M}' + ('' if storage == 'float32' else f'_{code}'))
+        faiss.downcast_index(index.index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = _nlist(n)
+        index = faiss.index_factory(d, f'IVF{nlist},{code}')
+    if not index.is_trained:
+        sample_size = min(n, max(nlist, PQ_MIN_VECTORS) * 256)
+        sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)] if sample_size < n else vectors
+        index.train(sample)
+    if index_type in ('ivf', 'ivfpq'):
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    if n:
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    设置查询时参数：IVF 类索引的 nprobe，HNSW 索引的 efSearch。
+
+    参数:
+    index: FAISS 索引。
+    nprobe (int): IVF 查询时探测的聚类数。
+    ef_search (int): HNSW 查询时的候选队列长度。
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe
+    if ef_search is not None and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+def benchmark_index_types(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                          index_types: Sequence[str] = INDEX_TYPES,
+                          nprobe: int = 16, ef_search: int = 64) -> List[Dict]:
+    """
+    对比各索引类型相对 flat 精确检索的召回率和查询延迟。
+
+    参数:
+    vectors (np.ndarray): 形状为 [n, d] 的库向量。
+    queries (np.ndarray): 形状为 [q, d] 的查询向量。
+    k (int): 每次检索返回的数量，默认为 10。
+    index_types (Sequence[str]): 要测试的索引类型。
+    nprobe (int): IVF 类索引的 nprobe。
+    ef_search (int): HNSW 索引的 efSearch。
+
+    返回:
+    List[Dict]: 每种索引类型一项，包含 index_type、build_seconds、k、recall_at_k、p50_ms、p99_ms。
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    ids = np.arange(len(vectors), dtype='int64')
+    ground_truth = build_faiss_index('flat', vectors, ids).search(queries, k)[1]
+    report = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_faiss_index(index_type, vectors, ids)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, nprobe, ef_search)
+        latencies = []
+        hits = 0
+        for query, truth in zip(queries, ground_truth):
+            start = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(set(found[0][found[0] >= 0]) & set(truth[truth >= 0]))
+        report.append({
+            'index_type': index_kind(index),
+            'build_seconds': build_seconds,
+            'k': k,
+            'recall_at_k': hits / max(1, int((ground_truth >= 0).sum())),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+        })
+    return report
+
+
+def benchmark_storage(vectors: np.ndarray, queries: np.ndarray, k: int = 10, index_type: str = 'flat',
+                      storages: Sequence[str] = STORAGE_TYPES, rerank: int = 4,
+                      nprobe: int = 16, ef_search: int = 64) -> List[Dict]:
+    """
+    对比各存储方式的每向量字节数，以及相对 flat 精确检索的召回率损失和精排后的召回率。
+
+    参数:
+    vectors (np.ndarray): 形状为 [n, d] 的库向量。
+    queries (np.ndarray): 形状为 [q, d] 的查询向量。
+    k (int): 每次检索返回的数量，默认为 10。
+    index_type (str): 索引类型，默认为 flat。
+    storages (Sequence[str]): 要测试的存储方式。
+    rerank (int): 精排时从压缩索引取 k * rerank 个候选，默认为 4，为 0 时不测精排。
+    nprobe (int): IVF 类索引的 nprobe。
+    ef_search (int): HNSW 索引的 efSearch。
+
+    返回:
+    List[Dict]: 每种存储方式一项，包含 index_type、storage、bytes_per_vector、build_seconds、k、
+    recall_at_k、p50_ms，以及 rerank 大于 0 时的 rerank_recall_at_k、rerank_p50_ms。
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    ids = np.arange(len(vectors), dtype='int64')
+    ground_truth = build_faiss_index('flat', vectors, ids).search(queries, k)[1]
+    total = max(1, int((ground_truth >= 0).sum()))
+    report = []
+    for storage in storages:
+        start = time.perf_counter()
+        index = build_faiss_index(index_type, vectors, ids, storage)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, nprobe, ef_search)
+        row = {'index_type': index_kind(index), 'storage': index_storage(index),
+               'bytes_per_vector': index_bytes(index) / max(1, index.ntotal),
+               'build_seconds': build_seconds, 'k': k}
+        for depth, label in ((1, ''), (rerank, 'rerank_')):
+            if depth < 1 or (label and row['storage'] == 'float32'):
+                continue
+            latencies = []
+            hits = 0
+            for query, truth in zip(queries, ground_truth):
+                start = time.perf_counter()
+                _, found = index.search(query[None, :], k * depth)
+                found = found[0][found[0] >= 0]
+                if label:
+                    found = exact_rerank(query, found, vectors[found], k)[0]
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(set(found[:k]) & set(truth[truth >= 0]))
+            row[f'{label}recall_at_k'] = hits / total
+            row[f'{label}p50_ms'] = float(np.percentile(latencies, 50))
+        report.append(row)
+    return report
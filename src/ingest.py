@@ -0,0 +1,306 @@
+import os
+import json
+import glob
+import time
+import logging
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional
+from cache import file_hash
+from pdf_processor import PDFProcessor
+from text_chunker import TextChunker
+from vector_db import VectorDB
+from parallel_ingest import ParallelPDFExtractor
+
+# 入库时每处理这么多文件或经过这么多秒保存一次检查点
+CHECKPOINT_FILES = 20
+CHECKPOINT_SECONDS = 120.0
+
+
+class IngestManifest:
+    """
+    已处理参考专利的清单，键为 PDF 内容的 SHA-256 摘要，记录来源文件名和各知识库中的段落数。
+
+    uncommitted 记录正在写入索引包的来源文件：保存检查点时先登记这些来源再写索引包，
+    若中途中断，下次入库时据此清除索引包中残留的、未登记的向量。
+    """
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """
+        初始化清单，文件存在时读取已有内容。
+
+        参数:
+        path (str): 清单文件路径（JSON）。
+        """
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.uncommitted: List[str] = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.uncommitted = data.get('uncommitted', [])
+
+    def find_source(self, source: str) -> Optional[str]:
+        """
+        查找来源文件名对应的内容摘要。
+
+        参数:
+        source (str): 来源文件名。
+
+        返回:
+        Optional[str]: 内容摘要，不存在时返回 None。
+        """
+        for digest, entry in self.files.items():
+            if entry['source'] == source:
+                return digest
+        return None
+
+    def add(self, digest: str, source: str, passages: Dict[str, int]):
+        """
+        登记一个已处理的文件。
+
+        参数:
+        digest (str): 文件内容摘要。
+        source (str): 来源文件名。
+        passages (Dict[str, int]): 各知识库中写入的段落数。
+        """
+        self.files[digest] = {'source': source, 'passages': passages, 'ingested_at': time.time()}
+
+    def remove(self, digest: str):
+        """
+        注销一个文件。
+
+        参数:
+        digest (str): 文件内容摘要。
+        """
+        self.files.pop(digest, None)
+
+    def save(self, uncommitted: Optional[Iterable[str]] = None):
+        """
+        写入清单文件。先写临时文件再替换，避免中途失败损坏清单。
+
+        参数:
+        uncommitted (Iterable[str]): 即将写入索引包的来源文件名。这些来源的条目暂不写入，
+        并登记在 uncommitted 中，索引包保存完成后应再次调用 save() 提交。
+        """
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        uncommitted = sorted(set(uncommitted or ()))
+        files = {digest: entry for digest, entry in self.files.items() if entry['source'] not in uncommitted}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'files': files, 'uncommitted': uncommitted},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.uncommitted = uncommitted
+
+
+class PatentIngestor:
+    """
+    参考专利增量入库类，只处理新增或内容变化的 PDF，并删除已移除文件的向量。
+    """
+    def __init__(self, db_paths: Dict[str, str], manifest_path: str,
+                 processor: Optional[PDFProcessor] = None, chunker: Optional[TextChunker] = None,
+                 max_workers: Optional[int] = None, checkpoint_files: int = CHECKPOINT_FILES,
+                 checkpoint_seconds: float = CHECKPOINT_SECONDS):
+        """
+        初始化入库器。
+
+        参数:
+        db_paths (Dict[str, str]): 章节名到索引包路径的映射。
+        manifest_path (str): 清单文件路径。
+        processor (PDFProcessor): PDF 处理器，默认新建。
+        chunker (TextChunker): 文本切分器，默认新建。
+        max_workers (int): PDF 提取进程数，默认为 CPU 核数，为 1 时串行提取。
+        checkpoint_files (int): 每处理多少个文件保存一次检查点，默认为 CHECKPOINT_FILES。
+        checkpoint_seconds (float): 距上次检查点超过多少秒时保存检查点，默认为 CHECKPOINT_SECONDS。
+        """
+        self.db_paths = db_paths
+        self.manifest = IngestManifest(manifest_path)
+        self.processor = processor or PDFProcessor()
+        self.chunker = chunker or TextChunker()
+        self.extractor = ParallelPDFExtractor(max_workers, processor=self.processor)
+        self.dbs: Dict[str, VectorDB] = {}
+        self.checkpoint_files = checkpoint_files
+        self.checkpoint_seconds = checkpoint_seconds
+        self._touched = set()  # 上次检查点之后写入或删除过向量的来源文件
+
+    def load(self) -> Dict[str, VectorDB]:
+        """
+        加载各知识库，索引不存在时新建空库。
+
+        返回:
+        Dict[str, VectorDB]: 章节名到向量数据库的映射。
+        """
+        if not self.dbs:
+            for db_type, path in self.db_paths.items():
+                db = VectorDB(db_type)
+                if os.path.exists(path):
+                    db.load_index(path)
+                self.dbs[db_type] = db
+        return self.dbs
+
+    def checkpoint(self, optimize: bool = False):
+        """
+        保存检查点：把各知识库的索引包和清单写入磁盘。
+
+        入库过程中的检查点只把上次保存之后的新增和删除作为增量段追加到索引包（见 VectorDB.save_delta），
+        写入量和持锁时间与这批文件成正比；optimize 为 True 时（入库结束）重建索引并合并为完整的索引包。
+
+        先在清单中登记本批来源、再写索引包、最后提交清单，任何一步中断都不会让清单记录未保存的向量；
+        中断后残留在索引包中的本批向量会在下次入库时清除，对应文件重新处理（嵌入和 PDF 提取通常命中缓存）。
+
+        参数:
+        optimize (bool): 是否重建索引并合并增量段，默认为 False（只在入库结束时进行）。
+        """
+        if self._touched:
+            self.manifest.save(uncommitted=self._touched)
+        for db_type, db in self.dbs.items():
+            if optimize:
+                db.optimize()
+                db.save_index(self.db_paths[db_type])
+            else:
+                db.save_delta(self.db_paths[db_type])
+        self.manifest.save()
+        self._touched = set()
+
+    def _recover(self):
+        """
+        清除上次检查点中断时残留的向量，这些来源的文件会被当作新文件重新处理。
+        """
+        for source in self.manifest.uncommitted:
+            logging.warning(f'{source} 上次入库未完成提交，清除残留向量后重新处理')
+            for db in self.dbs.values():
+                db.remove_source(source)
+            self._touched.add(source)
+        self.manifest.uncommitted = []
+
+    def ingest_files(self, paths: List[str], remove_missing: bool = False,
+                     progress: Optional[Callable[[Dict], None]] = None, lock=None) -> Dict[str, List[str]]:
+        """
+        增量处理一组 PDF 文件，处理过程中定期保存检查点。
+
+        中断后用同样的参数再次调用即可继续：已提交的文件按清单跳过，只处理剩余的文件。
+
+        参数:
+        paths (List[str]): PDF 文件路径列表。
+        remove_missing (bool): 是否删除清单中存在但不在 paths 中的文件，默认为 False。
+        progress (Callable[[Dict], None]): 进度回调，每处理完一个文件和每次保存检查点后调用，
+        参数包含 files_total、files_done、pages（含命中提取缓存的页）、vectors、vectors_per_sec、eta_seconds、
+        current、checkpoints，以及本次入库的嵌入缓存命中数 cache_hits 和未命中数 cache_misses（各章节合计）。
+        lock: 修改索引时持有的锁（如 Web UI 中检索与入库共用的锁）；PDF 提取和嵌入请求在锁外进行，
+        入库过程中仍可检索已写入的内容。
+
+        返回:
+        Dict[str, List[str]]: 处理结果，包含 added、updated、removed、skipped 四个文件名列表。
+        """
+        guard = lock or nullcontext()
+        with guard:
+            dbs = self.load()
+            self._recover()
+        summary = {'added': [], 'updated': [], 'removed': [], 'skipped': []}
+        digests = {path: file_hash(path) for path in paths}
+
+        with guard:
+            if remove_missing:
+                sources = {os.path.basename(path) for path in paths}
+                for digest, entry in list(self.manifest.files.items()):
+                    if digest not in digests.values() and entry['source'] not in sources:
+                        for db in dbs.values():
+                            db.remove_source(entry['source'])
+                        self.manifest.remove(digest)
+                        self._touched.add(entry['source'])
+                        summary['removed'].append(entry['source'])
+
+            to_process = []
+            for path, digest in digests.items():
+                source = os.path.basename(path)
+                if digest in self.manifest.files:
+                    summary['skipped'].append(source)
+                    continue
+                old_digest = self.manifest.find_source(source)
+                if old_digest is not None:
+                    # 同名文件内容发生变化，先删除旧向量
+                    for db in dbs.values():
+                        db.remove_source(source)
+                    self.manifest.remove(old_digest)
+                    self._touched.add(source)
+                    summary['updated'].append(source)
+                else:
+                    summary['added'].append(source)
+                to_process.append(path)
+
+        state = {'files_total': len(to_process), 'files_done': 0, 'pages': 0, 'vectors': 0,
+                 'vectors_per_sec': 0.0, 'eta_seconds': None, 'current': None, 'checkpoints': 0,
+                 'cache_hits': 0, 'cache_misses': 0}
+        start = last_checkpoint = time.perf_counter()
+        pending_files = 0
+        # 各章节的向量数据库可能共用一个嵌入缓存，按实例去重后统计本次入库前后的差值
+        caches = list({id(db.cache): db.cache for db in dbs.values() if db.cache is not None}.values())
+        base_hits, base_misses = sum(c.hits for c in caches), sum(c.misses for c in caches)
+
+        def report():
+            elapsed = time.perf_counter() - start
+            done = state['files_done']
+            stats = self.extractor.last_stats
+            state['pages'] = int(stats.get('pages', 0) + stats.get('cached_pages', 0))
+            state['vectors_per_sec'] = state['vectors'] / elapsed if elapsed > 0 else 0.0
+            state['cache_hits'] = sum(c.hits for c in caches) - base_hits
+            state['cache_misses'] = sum(c.misses for c in caches) - base_misses
+            state['eta_seconds'] = elapsed / done * (state['files_total'] - done) if done else None
+            if progress is not None:
+                progress(dict(state))
+
+        # 并行提取，每个文件提取完成后立即切分、嵌入并写入索引
+        for path, sections in self.extractor.iter_split(to_process, digests):
+            source = os.path.basename(path)
+            batches = {}
+            for db_type, db in dbs.items():
+                passages = self.chunker.split(sections.get(db_type), source, db_type)
+                if not passages:
+                    logging.warning(f'{source} 中未找到章节 {db_type}')
+                # 嵌入请求在锁外进行，不阻塞检索
+                texts = [p['text'] for p in passages]
+                batches[db_type] = (texts, passages, db.embed_texts(texts) if texts else None)
+            with guard:
+                for db_type, (texts, passages, embeddings) in batches.items():
+                    dbs[db_type].add(texts, passages, embeddings)
+                self.manifest.add(digests[path], source, {db_type: len(batch[0]) for db_type, batch in batches.items()})
+                self._touched.add(source)
+                pending_files += 1
+                if (pending_files >= self.checkpoint_files
+                        or time.perf_counter() - last_checkpoint >= self.checkpoint_seconds):
+                    self.checkpoint()
+                    state['checkpoints'] += 1
+                    pending_files = 0
+                    last_checkpoint = time.perf_counter()
+                    logging.info(f"检查点已保存：{state['files_done'] + 1}/{state['files_total']} 个文件")
+            state['files_done'] += 1
+            state['vectors'] += sum(len(batch[0]) for batch in batches.values())
+            state['current'] = source
+            report()
+        if to_process:
+            stats = self.extractor.last_stats
+            logging.info(f"PDF 提取完成：{stats['files']} 个文件（{stats['cached_files']} 个命中缓存），"
+                         f"{stats['pages']} 页，{stats['pages_per_sec']:.1f} 页/秒")
+
+        if summary['added'] or summary['updated'] or summary['removed'] or self._touched:
+            with guard:
+                self.checkpoint(optimize=True)
+            state['checkpoints'] += 1
+            report()
+        return summary
+
+    def ingest_folder(self, directory: str) -> Dict[str, List[str]]:
+        """
+        将目录中的 PDF 与知识库同步：处理新增或变化的文件，删除已移除文件的向量。
+
+        参数:
+        directory (str): 参考专利目录。
+
+        返回:
+        Dict[str, List[str]]: 处理结果，同 ingest_files。
+        """
+        paths = sorted(glob.glob(os.path.join(directory, '*.pdf')))
+        return self.ingest_files(paths, remove_missing=True)
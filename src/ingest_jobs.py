@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+from typing import Dict, List, Optional
+from reference_library import ReferenceLibrary
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+# 运行中的任务最多每隔这么多秒把进度写入 job.json
+SAVE_INTERVAL = 1.0
+# 已结束的任务记录保留的天数，过期后连同复制的 PDF 一起删除
+JOB_RETENTION_DAYS = float(os.getenv('OPENPATENT_JOB_RETENTION_DAYS', '7'))
+# 失败的任务在服务重启时自动重试，累计执行次数达到上限后不再重试
+MAX_ATTEMPTS = 3
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """
+    把秒数格式化为 "1 小时 2 分"、"3 分 4 秒" 或 "5 秒"，未知时返回 "估算中"。
+    """
+    if seconds is None:
+        return '估算中'
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f'{seconds // 3600} 小时 {seconds % 3600 // 60} 分'
+    if seconds >= 60:
+        return f'{seconds // 60} 分 {seconds % 60} 秒'
+    return f'{seconds} 秒'
+
+
+class IngestJob:
+    """
+    一个后台入库任务：把一组参考专利 PDF 写入指定知识库。
+
+    任务的文件列表、状态和进度保存在 <任务目录>/job.json 中，上传的 PDF 复制到 <任务目录>/files/，
+    因此进程重启后可以从最后一个检查点继续。
+    """
+    def __init__(self, job_id: str, library: str, paths: List[str], directory: str, state: str = 'queued',
+                 progress: Optional[Dict] = None, summary: Optional[Dict] = None, error: Optional[str] = None,
+                 created_at: Optional[float] = None, finished_at: Optional[float] = None, attempts: int = 0):
+        """
+        初始化入库任务。
+
+        参数:
+        job_id (str): 任务 ID。
+        library (str): 目标知识库名称。
+        paths (List[str]): 待处理的 PDF 路径（任务目录中的副本）。
+        directory (str): 任务目录。
+        state (str): 任务状态，JOB_STATES 中的一种。
+        progress (Dict): 最近一次进度，见 PatentIngestor.ingest_files。
+        summary (Dict): 完成后的处理结果。
+        error (str): 失败原因。
+        created_at (float): 创建时间戳。
+        finished_at (float): 结束时间戳。
+        attempts (int): 已执行的次数。
+        """
+        self.id = job_id
+        self.library = library
+        self.paths = paths
+        self.directory = directory
+        self.state = state
+        self.progress = progress or {}
+        self.summary = summary
+        self.error = error
+        self.created_at = created_at or time.time()
+        self.finished_at = finished_at
+        self.attempts = attempts
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('done', 'failed')
+
+    @property
+    def retryable(self) -> bool:
+        """
+        失败且未达到重试上限，服务重启时会重新执行。
+        """
+        return self.state == 'failed' and self.attempts < MAX_ATTEMPTS
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'library': self.library,
+            'paths': [os.path.relpath(path, self.directory) for path in self.paths],
+            'state': self.state,
+            'progress': self.progress,
+            'summary': self.summary,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'attempts': self.attempts,
+        }
+
+    def save(self):
+        """
+        写入 job.json。先写临时文件再替换，避免中途失败损坏任务记录。
+        """
+        path = os.path.join(self.directory, 'job.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+    @classmethod
+    def load(cls, directory: str) -> 'IngestJob':
+        """
+        从任务目录读取任务。
+
+        参数:
+        directory (str): 任务目录。
+
+        返回:
+        IngestJob: 入库任务。
+        """
+        with open(os.path.join(directory, 'job.json'), encoding='utf-8') as f:
+            data = json.load(f)
+        paths = [os.path.join(directory, path) for path in data.pop('paths')]
+        return cls(data.pop('id'), data.pop('library'), paths, directory, **data)
+
+    def describe(self) -> str:
+        """
+        生成面向用户的任务状态说明。
+        """
+        p = self.progress
+        if self.state == 'queued':
+            return f'入库任务 {self.id} 排队中：{len(self.paths)} 个文件待存入知识库 {self.library}'
+        if self.state == 'failed':
+            retry = '重启服务时会自动重试' if self.retryable else '重新上传同一批文件即可继续'
+            return f"入库任务 {self.id} 失败：{self.error}。已保存检查点的文件不会重复处理，{retry}"
+        if self.state == 'done':
+            s = self.summary or {}
+            cache = ''
+            if p.get('vectors') and 'cache_hits' in p:
+                cache = f"（嵌入缓存命中 {p['cache_hits']} 次，未命中 {p['cache_misses']} 次）"
+            return (f"参考专利已存入知识库 {self.library}！新增 {len(s.get('added', []))} 个，"
+                    f"更新 {len(s.get('updated', []))} 个，跳过未变化的 {len(s.get('skipped', []))} 个。"
+                    f"解析 {p.get('pages', 0)} 页，写入 {p.get('vectors', 0)} 条向量{cache}，"
+                    f"用时 {format_duration((self.finished_at or time.time()) - self.created_at)}。")
+        if not p:
+            return f'入库任务 {self.id} 正在准备：{len(self.paths)} 个文件，知识库 {self.library}'
+        return (f"正在入库到知识库 {self.library}：文件 {p['files_done']}/{p['files_total']}，"
+                f"已解析 {p['pages']} 页，{p['vectors']} 条向量（{p['vectors_per_sec']:.1f} 条/秒），"
+                f"预计剩余 {format_duration(p['eta_seconds'])}，已保存检查点 {p['checkpoints']} 次"
+                + (f"，当前 {p['current']}" if p.get('current') else ''))
+
+
+class IngestJobManager:
+    """
+    后台入库任务队列。任务在一个后台线程中依次执行，不占用 Web 界面的请求处理线程；
+    修改索引时持有 lock，PDF 提取和嵌入请求在锁外进行，入库过程中仍可检索已写入的内容。
+
+    任务记录保存在 <知识库根目录>/jobs/<任务 ID>/ 中，resume 会重新排队上次未完成的任务和可重试的失败任务，
+    已提交检查点的文件按入库清单跳过。已结束的任务记录保留 retention_days 天后由 prune 删除。
+    """
+    def __init__(self, library: ReferenceLibrary, lock=None,
+                 jobs_dir: Optional[str] = None, retention_days: float = JOB_RETENTION_DAYS):
+        """
+        初始化任务队列。
+
+        参数:
+        library (ReferenceLibrary): 知识库集合。
+        lock: 修改索引时持有的锁，默认为知识库集合的读写锁 library.lock（持有其独占锁）。
+        jobs_dir (str): 任务记录目录，默认为 <知识库根目录>/jobs。
+        retention_days (float): 已结束的任务记录保留的天数，默认读取环境变量 OPENPATENT_JOB_RETENTION_DAYS（7）。
+        """
+        self.library = library
+        self.lock = lock or library.lock
+        self.jobs_dir = jobs_dir or os.path.join(library.root, 'jobs')
+        self.retention_days = retention_days
+        self.jobs: Dict[str, IngestJob] = {}
+        self._queue: 'queue.Queue[IngestJob]' = queue.Queue()
+        self._changed = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, library_name: str, paths: List[str]) -> IngestJob:
+        """
+        提交入库任务。PDF 先复制到任务目录，上传的临时文件被清理后仍可恢复。
+
+        参数:
+        library_name (str): 目标知识库名称，不存在时新建。
+        paths (List[str]): PDF 文件路径。
+
+        返回:
+        IngestJob: 已排队的任务。
+
+        异常:
+        ValueError: 知识库名称不合法。
+        """
+        self.library.directory(library_name)
+        job_id = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        directory = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(os.path.join(directory, 'files'))
+        staged = []
+        for path in paths:
+            target = os.path.join(directory, 'files', os.path.basename(path))
+            shutil.copy2(path, target)
+            staged.append(target)
+        job = IngestJob(job_id, library_name, staged, directory)
+        job.save()
+        self._enqueue(job)
+        return job
+
+    def resume(self) -> List[IngestJob]:
+        """
+        重新排队上次进程退出时尚未完成的任务，以及未达到重试上限的失败任务，然后清理过期的任务记录。
+
+        返回:
+        List[IngestJob]: 重新排队的任务，按创建时间排序。
+        """
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        jobs = []
+        for entry in os.listdir(self.jobs_dir):
+            directory = os.path.join(self.jobs_dir, entry)
+            if entry in self.jobs or not os.path.exists(os.path.join(directory, 'job.json')):
+                continue
+            job = IngestJob.load(directory)
+            if not job.finished or job.retryable:
+                action = '重试失败' if job.finished else '恢复未完成'
+                job.state, job.error, job.finished_at = 'queued', None, None
+                jobs.append(job)
+                logging.info(f'{action}的入库任务 {job.id}：{len(job.paths)} 个文件，知识库 {job.library}')
+        for job in sorted(jobs, key=lambda job: job.created_at):
+            self._enqueue(job)
+        self.prune()
+        return jobs
+
+    def prune(self) -> List[str]:
+        """
+        删除结束超过 retention_days 天的任务目录（含复制的 PDF），以及提交时中断、没有 job.json 的目录。
+
+        返回:
+        List[str]: 删除的任务 ID。
+        """
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        cutoff = time.time() - self.retention_days * 86400
+        removed = []
+        for entry in os.listdir(self.jobs_dir):
+            directory = os.path.join(self.jobs_dir, entry)
+            job = self.jobs.get(entry)
+            if job is None and os.path.exists(os.path.join(directory, 'job.json')):
+                job = IngestJob.load(directory)
+            if job is None:
+                expired = os.path.getmtime(directory) < cutoff
+            else:
+                expired = job.finished and (job.finished_at or job.created_at) < cutoff
+            if expired:
+                shutil.rmtree(directory, ignore_errors=True)
+                self.jobs.pop(entry, None)
+                removed.append(entry)
+        if removed:
+            logging.info(f'已删除 {len(removed)} 个过期的入库任务记录')
+        return removed
+
+    def active(self) -> List[IngestJob]:
+        """
+        获取排队中和运行中的任务。
+        """
+        return [job for job in self.jobs.values() if not job.finished]
+
+    def wait(self, job: IngestJob, timeout: Optional[float] = None) -> bool:
+        """
+        等待任务进度更新或结束。
+
+        参数:
+        job (IngestJob): 任务。
+        timeout (float): 最长等待秒数。
+
+        返回:
+        bool: 任务是否已结束。
+        """
+        with self._changed:
+            if not job.finished:
+                self._changed.wait(timeout)
+        return job.finished
+
+    def _enqueue(self, job: IngestJob):
+        self.jobs[job.id] = job
+        self._queue.put(job)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name='ingest-jobs', daemon=True)
+            self._thread.start()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IngestJob):
+        """
+        执行一个任务，进度写入 job.json 并通知等待者。
+        """
+        job.state = 'running'
+        job.attempts += 1
+        job.save()
+        self._notify()
+        last_save = 0.0
+
+        def on_progress(progress: Dict):
+            nonlocal last_save
+            checkpointed = progress['checkpoints'] != job.progress.get('checkpoints')
+            job.progress = progress
+            # 保存检查点后总是写入，其余进度按 SAVE_INTERVAL 节流
+            if checkpointed or time.time() - last_save >= SAVE_INTERVAL:
+                job.save()
+                last_save = time.time()
+            self._notify()
+
+        try:
+            paths = [path for path in job.paths if os.path.exists(path)]
+            if len(paths) < len(job.paths):
+                logging.warning(f'入库任务 {job.id} 中有 {len(job.paths) - len(paths)} 个文件已不存在，跳过')
+            ingestor = self.library.ingestor(job.library)
+            job.summary = ingestor.ingest_files(paths, progress=on_progress, lock=self.lock)
+            state = 'done'
+            shutil.rmtree(os.path.join(job.directory, 'files'), ignore_errors=True)
+        except Exception as e:
+            logging.exception(f'入库任务 {job.id} 失败')
+            state = 'failed'
+            job.error = str(e)
+        job.finished_at = time.time()
+        # 先写入结束状态再通知，wait 返回时 job.json 已是最终状态
+        with self._changed:
+            job.state = state
+            job.save()
+            self._changed.notify_all()
+        self.prune()
@@ -1,41 +1,398 @@
 import os
+import re
+import time
 import requests
-from typing import Dict, Optional, Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Generator
 from dotenv import load_dotenv
 import logging
 from openai import OpenAI
+from prompt_builder import PromptBuilder, count_tokens
+from cache import ResponseCache
+from http_client import get_openai_http_client, openai_timeout
+from metrics import METRICS
+from draft_model import Draft, parse_draft
 load_dotenv()
 
 class PatentGenerator:
     """
     专利生成器类，用于生成和修订专利文档。
     """
-    def __init__(self):
+    def __init__(self, token_budgets: Optional[Dict[str, int]] = None,
+                 use_response_cache: bool = False, response_cache: Optional[ResponseCache] = None,
+                 revise_workers: int = 4):
         """
         初始化专利生成器。
+
+        参数:
+        token_budgets (Dict[str, int]): 提示词各部分（context、query、draft、feedback）的 token 预算，
+        默认见 prompt_builder.DEFAULT_BUDGETS。
+        use_response_cache (bool): 是否启用 LLM 响应缓存，默认为 False。相同模型、消息和采样参数的请求直接返回缓存结果。
+        response_cache (ResponseCache): 响应缓存，默认使用 cache/responses.sqlite。
+        revise_workers (int): 局部修订时同时修订的段落区间数，默认为 4。
         """
-        self.api_base = "https://openrouter.ai/api/v1"
+        # 可通过 OPENROUTER_API_BASE 指向其他兼容 OpenAI 的服务（如 benchmarks/mock_servers.py）
+        self.api_base = os.getenv('OPENROUTER_API_BASE', "https://openrouter.ai/api/v1")
         self.api_key = os.getenv('open_router_key')
-        self.client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+        # 所有生成器共用一个连接池；SDK 对 429/5xx 和连接错误按指数退避重试
+        self.client = OpenAI(api_key=self.api_key, base_url=self.api_base,
+                             http_client=get_openai_http_client(), timeout=openai_timeout(), max_retries=5)
+        self.model = "qwen/qwq-32b"
         self.current_draft: Dict[str, str] = {}
         self.query: str = ""
         self.context: str = ""
+        # 各文档类型生成初稿时使用的 (query, context)，多个文档并发生成时修订仍使用各自的输入
+        self.draft_inputs: Dict[str, Tuple[str, str]] = {}
+        self.last_ttft: Optional[float] = None  # 最近一次流式请求的首字延迟（秒）
+        self.prompt_builder = PromptBuilder(token_budgets)
+        self.response_cache = (response_cache or ResponseCache()) if use_response_cache else None
+        # 各文档类型的结构化草稿，局部修订时保持段落 ID 稳定
+        self.drafts: Dict[str, Draft] = {}
+        self.revise_workers = revise_workers
+        self.last_revised: List[str] = []  # 最近一次修订重新生成的块 ID，整篇修订时为空
 
-    def generate_draft(self, query: str, context: str, doc_type: str) -> str:
+    def generate_draft(self, query: str, context: str, doc_type: str, bypass_cache: bool = False) -> str:
         """
         根据给定的查询、上下文和文档类型生成专利文档初稿。
 
         参数:
         query (str): 相关专利内容，用于生成文档。
-        context (str): 参考技术文档，用于模仿风格和格式。
+        context (str | List[Dict]): 参考技术文档，用于模仿风格和格式；可以是检索结果列表，超出预算时按相关度选择段落。
         doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        bypass_cache (bool): 是否跳过响应缓存读取（结果仍会写入缓存），默认为 False。
 
         返回:
         str: 生成的专利文档初稿内容。
         """
+        messages = self._build_generate_messages(query, context, doc_type)
+
+        try:
+            # 调用 OpenAI API 生成文档
+            content = self._complete(messages, 0.5, doc_type, '生成', bypass_cache)
+            self.current_draft[doc_type] = content
+            return content
+        except Exception as e:
+            error_msg = f'生成{doc_type}失败: {str(e)}'
+            logging.error(error_msg)
+            return error_msg
+
+    def generate_draft_stream(self, query: str, context: str, doc_type: str,
+                              bypass_cache: bool = False) -> Generator[str, None, None]:
+        """
+        以流式方式生成专利文档初稿，逐段返回新生成的内容。
+
+        生成结束后完整内容保存在 current_draft[doc_type] 中，首个内容片段的到达时间记录在 last_ttft 中。
+
+        参数:
+        query (str): 相关专利内容，用于生成文档。
+        context (str | List[Dict]): 参考技术文档，用于模仿风格和格式；可以是检索结果列表，超出预算时按相关度选择段落。
+        doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        bypass_cache (bool): 是否跳过响应缓存读取，默认为 False。
+
+        返回:
+        Generator[str, None, None]: 逐段生成的内容。
+        """
+        messages = self._build_generate_messages(query, context, doc_type)
+        yield from self._stream_completion(messages, 0.5, doc_type, '生成', bypass_cache)
+
+    def revise_draft(self, feedback: str, doc_type: str, bypass_cache: bool = False,
+                     incremental: bool = True, locate: bool = False) -> str:
+        """
+        根据用户反馈修订专利文档初稿。
+
+        修改意见只涉及部分段落时（见 find_revision_targets），只重新生成这些段落，其余内容原样保留；
+        否则整篇修订。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        bypass_cache (bool): 是否跳过响应缓存读取（结果仍会写入缓存），默认为 False。
+        incremental (bool): 是否允许局部修订，默认为 True。
+        locate (bool): 意见没有明确指向时是否先调用模型定位修改位置，默认为 False（整篇修订）。
+
+        返回:
+        str: 修订后的专利文档内容。
+        """
+        if doc_type not in self.current_draft:
+            return '请先生成初稿'
+        # 只在局部修订成功后由 revise_paragraphs 设置，失败或整篇修订时保持为空
+        self.last_revised = []
+        targets = self.find_revision_targets(feedback, doc_type, use_llm=locate) if incremental else []
+        if targets:
+            try:
+                return self.revise_paragraphs(feedback, doc_type, targets, bypass_cache)
+            except Exception as e:
+                error_msg = f'修订{doc_type}失败: {str(e)}'
+                logging.error(error_msg)
+                return error_msg
+        messages = self._build_revise_messages(feedback, doc_type)
+
+        try:
+            # 调用 OpenAI API 修订文档
+            content = self._complete(messages, 0.6, doc_type, '修订', bypass_cache)
+            self.current_draft[doc_type] = content
+            return content
+        except Exception as e:
+            error_msg = f'修订{doc_type}失败: {str(e)}'
+            logging.error(error_msg)
+            return error_msg
+
+    def revise_draft_stream(self, feedback: str, doc_type: str, bypass_cache: bool = False,
+                            incremental: bool = True, locate: bool = False) -> Generator[str, None, None]:
+        """
+        以流式方式根据用户反馈修订专利文档，逐段返回新生成的内容。
+
+        局部修订时各段落并发生成，完成后一次性返回拼接好的全文；整篇修订时逐段流式返回。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        bypass_cache (bool): 是否跳过响应缓存读取，默认为 False。
+        incremental (bool): 是否允许局部修订，默认为 True。
+        locate (bool): 意见没有明确指向时是否先调用模型定位修改位置，默认为 False（整篇修订）。
+
+        返回:
+        Generator[str, None, None]: 逐段生成的内容。
+        """
+        if doc_type not in self.current_draft:
+            yield '请先生成初稿'
+            return
+        self.last_revised = []
+        targets = self.find_revision_targets(feedback, doc_type, use_llm=locate) if incremental else []
+        if targets:
+            try:
+                yield self.revise_paragraphs(feedback, doc_type, targets, bypass_cache)
+            except Exception as e:
+                error_msg = f'修订{doc_type}失败: {str(e)}'
+                logging.error(error_msg)
+                yield error_msg
+            return
+        messages = self._build_revise_messages(feedback, doc_type)
+        yield from self._stream_completion(messages, 0.6, doc_type, '修订', bypass_cache)
+
+    def draft_model(self, doc_type: str) -> Draft:
+        """
+        获取当前草稿的结构化模型。
+
+        草稿未被外部修改时沿用已有模型，段落 ID 在多次局部修订之间保持稳定；否则重新解析。
+
+        参数:
+        doc_type (str): 文档类型。
+
+        返回:
+        Draft: 结构化草稿。
+        """
+        draft = self.drafts.get(doc_type)
+        if draft is None or draft.render() != self.current_draft[doc_type]:
+            draft = self.drafts[doc_type] = parse_draft(self.current_draft[doc_type])
+        return draft
+
+    def find_revision_targets(self, feedback: str, doc_type: str, use_llm: bool = False) -> List[str]:
+        """
+        确定修改意见指向的段落。
+
+        先查找意见中明确提到的块 ID、段落序号、权利要求编号或标题（见 Draft.find_targets）；
+        没有时若 use_llm 为 True，再让模型根据带 ID 的提纲定位。定位多一次推理模型往返，
+        "语言更正式" 之类的整体意见用不上，因此默认关闭。目标超过全文一半或模型认为需要整体修改时返回空列表，即整篇修订。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型。
+        use_llm (bool): 没有明确指向时是否调用模型定位，默认为 False。
+
+        返回:
+        List[str]: 目标块 ID，为空表示整篇修订。
+        """
+        draft = self.draft_model(doc_type)
+        if len(draft.blocks) < 2:
+            return []
+        targets = draft.find_targets(feedback)
+        if not targets and use_llm:
+            try:
+                answer = self._complete(self._build_locate_messages(feedback, doc_type, draft), 0.0, doc_type, '定位')
+            except Exception as e:
+                logging.warning(f'定位{doc_type}修改位置失败，改为整篇修订: {str(e)}')
+                return []
+            ids = {block.id for block in draft.blocks}
+            targets = [block_id for block_id in dict.fromkeys(re.findall(r'[PH]\d+', answer or '')) if block_id in ids]
+        if len(targets) * 2 > len(draft.blocks):
+            return []
+        return targets
+
+    def revise_paragraphs(self, feedback: str, doc_type: str, block_ids: List[str],
+                          bypass_cache: bool = False) -> str:
+        """
+        只重新生成指定的段落，其余内容原样拼接。
+
+        目标块按位置合并为连续区间，每个区间一次调用，不同区间并发修订；任一区间失败时草稿保持不变。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型。
+        block_ids (List[str]): 目标块 ID。
+        bypass_cache (bool): 是否跳过响应缓存读取，默认为 False。
+
+        返回:
+        str: 修订后的全文。
+
+        异常:
+        Exception: 任一区间的模型调用失败。
+        """
+        start = time.perf_counter()
+        draft = self.draft_model(doc_type)
+        spans = draft.spans(block_ids)
+        revised_ids = [block.id for first, last in spans for block in draft.blocks[first:last]]
+
+        def revise(span: Tuple[int, int]) -> str:
+            messages = self._build_paragraph_messages(feedback, doc_type, draft, *span)
+            return self._complete(messages, 0.6, doc_type, '局部修订', bypass_cache)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.revise_workers, len(spans)))) as executor:
+            results = list(executor.map(revise, spans))
+        # 从后往前替换，前面区间的位置不受影响
+        for (first, last), text in reversed(list(zip(spans, results))):
+            draft.replace(first, last, text)
+        self.current_draft[doc_type] = draft.render()
+        self.last_revised = revised_ids
+        logging.info(f'局部修订{doc_type}完成，重新生成 {",".join(revised_ids)}（{len(spans)} 个区间），'
+                     f'总耗时: {time.perf_counter() - start:.2f}s')
+        return self.current_draft[doc_type]
+
+    def response_cache_stats(self) -> Dict[str, int]:
+        """
+        获取响应缓存的统计信息。
+
+        返回:
+        Dict[str, int]: 包含 hits、misses、entries 和 bytes 的字典，未启用缓存时为空。
+        """
+        return self.response_cache.stats() if self.response_cache is not None else {}
+
+    def _cached_response(self, messages: List[Dict[str, str]], temperature: float,
+                         bypass_cache: bool) -> Optional[str]:
+        """
+        查询响应缓存，未启用缓存或要求跳过缓存时返回 None。
+        """
+        if self.response_cache is None or bypass_cache:
+            return None
+        return self.response_cache.get_response(self.model, messages, {'temperature': temperature})
+
+    def _store_response(self, messages: List[Dict[str, str]], temperature: float, content: str):
+        """
+        将成功的响应写入响应缓存。
+        """
+        if self.response_cache is not None and content:
+            self.response_cache.put_response(self.model, messages, {'temperature': temperature}, content)
+
+    def _complete(self, messages: List[Dict[str, str]], temperature: float,
+                  doc_type: str, action: str, bypass_cache: bool = False) -> str:
+        """
+        调用非流式接口获取完整响应，优先读取响应缓存。
+
+        参数:
+        messages (List[Dict[str, str]]): 对话消息。
+        temperature (float): 采样温度。
+        doc_type (str): 文档类型，用于指标标签。
+        action (str): 操作名称（"生成" 或 "修订"），用于指标标签。
+        bypass_cache (bool): 是否跳过缓存读取。
+
+        返回:
+        str: 响应文本。
+        """
+        content = self._cached_response(messages, temperature, bypass_cache)
+        if content is not None:
+            METRICS.inc('openpatent_llm_cache_hits_total', action=action, doc_type=doc_type)
+            return content
+        try:
+            with METRICS.timer('openpatent_llm_request_seconds', action=action, doc_type=doc_type, stream='false'):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=False,
+                )
+        except Exception:
+            METRICS.inc('openpatent_llm_errors_total', action=action, doc_type=doc_type)
+            raise
+        content = response.choices[0].message.content
+        self._store_response(messages, temperature, content)
+        return content
+
+    def _stream_completion(self, messages: List[Dict[str, str]], temperature: float,
+                           doc_type: str, action: str, bypass_cache: bool = False) -> Generator[str, None, None]:
+        """
+        调用流式接口并逐段返回内容，结束后写入 current_draft 并记录首字延迟。
+
+        命中响应缓存时一次性返回缓存内容，不再请求接口。
+
+        参数:
+        messages (List[Dict[str, str]]): 对话消息。
+        temperature (float): 采样温度。
+        doc_type (str): 文档类型。
+        action (str): 操作名称（"生成" 或 "修订"），用于日志和错误信息。
+        bypass_cache (bool): 是否跳过响应缓存读取。
+
+        返回:
+        Generator[str, None, None]: 逐段生成的内容。
+        """
+        start = time.perf_counter()
+        cached = self._cached_response(messages, temperature, bypass_cache)
+        if cached is not None:
+            self.last_ttft = time.perf_counter() - start
+            METRICS.inc('openpatent_llm_cache_hits_total', action=action, doc_type=doc_type)
+            logging.info(f'{action}{doc_type}命中响应缓存')
+            self.current_draft[doc_type] = cached
+            yield cached
+            return
+        ttft = None
+        parts = []
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = self.last_ttft = time.perf_counter() - start
+                    METRICS.observe('openpatent_llm_ttft_seconds', ttft, action=action, doc_type=doc_type)
+                    logging.info(f'{action}{doc_type}首字延迟: {ttft:.2f}s')
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            error_msg = f'{action}{doc_type}失败: {str(e)}'
+            METRICS.inc('openpatent_llm_errors_total', action=action, doc_type=doc_type)
+            logging.error(error_msg)
+            yield error_msg
+            return
+        self.current_draft[doc_type] = ''.join(parts)
+        self._store_response(messages, temperature, self.current_draft[doc_type])
+        elapsed = time.perf_counter() - start
+        METRICS.observe('openpatent_llm_request_seconds', elapsed, action=action, doc_type=doc_type, stream='true')
+        logging.info(f'{action}{doc_type}完成，总耗时: {elapsed:.2f}s')
+
+    def _build_generate_messages(self, query: str, context, doc_type: str) -> List[Dict[str, str]]:
+        """
+        构建生成初稿的对话消息，各部分按 token 预算裁剪，并记录裁剪后的输入供修订使用。
+
+        参数:
+        query (str): 相关专利内容。
+        context (str | List[Dict]): 参考技术文档或检索结果列表。
+        doc_type (str): 文档类型。
+
+        返回:
+        List[Dict[str, str]]: 对话消息。
+        """
+        fitted, counts = self.prompt_builder.fit(context=context, query=query)
+        query, context = fitted['query'], fitted['context'] or "无相关专利内容"
         self.query = query
         self.context = context
-
+        self.draft_inputs[doc_type] = (query, context)
         # 构建提示信息
         prompt = f'''你是一个专业的专利申请文档撰写助手。请参考以下技术文档的行文风格和格式，并基于提供的相关专利内容，生成一段高质量的{doc_type}。该内容应直接适用于专利申请书中的对应部分。
 
@@ -59,41 +416,26 @@ class PatentGenerator:
 {query}
 
 请根据以上要求，生成专业的{doc_type}。'''
+        self.prompt_builder.log_counts('生成', doc_type, counts, prompt)
+        return [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": prompt}
+        ]
 
-        try:
-            # 调用 OpenAI API 生成文档
-            response = self.client.chat.completions.create(
-                model="qwen/qwq-32b",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                stream=False,
-            )
-            
-            content = response.choices[0].message.content
-            self.current_draft[doc_type] = content
-            return content
-        except Exception as e:
-            error_msg = f'生成{doc_type}失败: {str(e)}'
-            logging.error(error_msg)
-            return error_msg
-
-    def revise_draft(self, feedback: str, doc_type: str) -> str:
+    def _build_revise_messages(self, feedback: str, doc_type: str) -> List[Dict[str, str]]:
         """
-        根据用户反馈修订专利文档初稿。
+        构建修订文档的对话消息，各部分按 token 预算裁剪。
 
         参数:
         feedback (str): 用户的修改意见。
-        doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        doc_type (str): 文档类型。
 
         返回:
-        str: 修订后的专利文档内容。
+        List[Dict[str, str]]: 对话消息。
         """
-        if doc_type not in self.current_draft:
-            return '请先生成初稿'
-
+        query, context = self.draft_inputs.get(doc_type, (self.query, self.context))
+        fitted, counts = self.prompt_builder.fit(context=context, query=query,
+                                                 draft=self.current_draft[doc_type], feedback=feedback)
         # 构建修订提示信息
         prompt = f'''你是一个专业的专利申请文档撰写助手。请根据用户反馈修改{doc_type}，同时确保修订后的内容仍然符合原始技术文档的风格和格式，并基于相关专利内容。
 
@@ -107,35 +449,97 @@ class PatentGenerator:
    - 如果{doc_type}是**说明书**部分，请确保技术方案的描述详细且具有可实施性。
 
 ### 模仿和参考的原始技术文档（参考风格和格式）：
-{self.context}
+{fitted['context']}
 
 ### 相关专利内容：
-{self.query}
+{fitted['query']}
 
 ### 当前版本：
-{self.current_draft[doc_type]}
+{fitted['draft']}
 
 ### 修改意见：
-{feedback}
+{fitted['feedback']}
 
 请根据以上要求，生成修订后的{doc_type}。'''
+        self.prompt_builder.log_counts('修订', doc_type, counts, prompt)
+        return [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": prompt}
+        ]
 
-        try:
-            # 调用 OpenAI API 修订文档
-            response = self.client.chat.completions.create(
-                model="qwen/qwq-32b",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.6,
-                stream=False,
-            )
-            
-            content = response.choices[0].message.content
-            self.current_draft[doc_type] = content
-            return content
-        except Exception as e:
-            error_msg = f'修订{doc_type}失败: {str(e)}'
-            logging.error(error_msg)
-            return error_msg
+    def _build_locate_messages(self, feedback: str, doc_type: str, draft: Draft) -> List[Dict[str, str]]:
+        """
+        构建定位修改位置的对话消息，只发送带 ID 的提纲而非全文。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型。
+        draft (Draft): 结构化草稿。
+
+        返回:
+        List[Dict[str, str]]: 对话消息。
+        """
+        fitted, counts = self.prompt_builder.fit(feedback=feedback)
+        prompt = f'''下面是一份{doc_type}的提纲，每行以方括号中的 ID 开头，后面是该标题或段落的开头部分。
+请判断【修改意见】需要修改哪些标题或段落，只输出这些 ID，用逗号分隔；如果需要整体修改或无法确定，只输出 ALL。
+
+### 提纲：
+{draft.outline()}
+
+### 修改意见：
+{fitted['feedback']}'''
+        self.prompt_builder.log_counts('定位', doc_type, counts, prompt)
+        return [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _build_paragraph_messages(self, feedback: str, doc_type: str, draft: Draft,
+                                  start: int, end: int) -> List[Dict[str, str]]:
+        """
+        构建修订 [start, end) 区间内段落的对话消息。
+
+        只发送技术文档、区间前后各一个块和所在章节的标题作为上下文，不发送参考专利和全文，
+        提示词和输出长度随修改范围而非全文长度增长。
+
+        参数:
+        feedback (str): 用户的修改意见。
+        doc_type (str): 文档类型。
+        draft (Draft): 结构化草稿。
+        start (int): 区间起点。
+        end (int): 区间终点。
+
+        返回:
+        List[Dict[str, str]]: 对话消息。
+        """
+        query, _ = self.draft_inputs.get(doc_type, (self.query, self.context))
+        heading = next((block.raw for block in reversed(draft.blocks[:start]) if block.kind == '标题'), '')
+        before = draft.blocks[start - 1].raw if start > 0 else ''
+        after = draft.blocks[end].raw if end < len(draft.blocks) else ''
+        parts = (heading if heading != before else '', before, '【待修改部分】', after)
+        surrounding = '\n'.join(part for part in parts if part)
+        target = '\n'.join(block.raw for block in draft.blocks[start:end])
+        fitted, counts = self.prompt_builder.fit(query=query, excerpt=surrounding, feedback=feedback)
+        prompt = f'''你是一个专业的专利申请文档撰写助手。请根据修改意见只修订{doc_type}中的【待修改部分】，其余部分保持不变。
+
+### 要求：
+1. **范围**：只输出修订后的【待修改部分】，不要输出其前后的内容，不要解释。
+2. **格式**：标题用<标题></标题>包裹，段落用<段落></段落>包裹，可以拆分或合并段落。
+3. **衔接**：与【上下文】的术语、行文风格和编号保持一致，内容与【相关专利内容】一致。
+
+### 相关专利内容：
+{fitted['query']}
+
+### 上下文：
+{fitted['excerpt']}
+
+### 待修改部分：
+{target}
+
+### 修改意见：
+{fitted['feedback']}'''
+        self.prompt_builder.log_counts('局部修订', doc_type, {**counts, 'target': count_tokens(target)}, prompt)
+        return [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": prompt}
+        ]
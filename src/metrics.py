@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# 耗时直方图的分桶上界（秒），覆盖毫秒级检索到分钟级的流式生成
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# token 数直方图的分桶上界
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# 已登记的指标及其说明；以 _total 结尾的为计数器，其余为直方图，以 _tokens 结尾的使用 TOKEN_BUCKETS
+METRIC_HELP = {
+    'openpatent_pdf_extract_seconds': '单个 PDF 逐页文本提取耗时（不含命中提取缓存的文件）',
+    'openpatent_pdf_batch_seconds': 'ParallelPDFExtractor 一批 PDF 的提取与分割总耗时',
+    'openpatent_pdf_files_total': '处理的 PDF 文件数，source 为 parsed（解析）或 cache（命中提取缓存）',
+    'openpatent_pdf_pages_total': '解析的 PDF 页数',
+    'openpatent_embedding_request_seconds': '单次嵌入请求（一个批次）的耗时',
+    'openpatent_embedding_texts_total': '请求嵌入的文本数，cache 为 hit 或 miss',
+    'openpatent_embedding_errors_total': '失败的嵌入请求数',
+    'openpatent_search_seconds': '一次检索的耗时（不含获取查询向量），mode 为 dense、sparse 或 hybrid',
+    'openpatent_faiss_search_seconds': 'FAISS 索引检索耗时',
+    'openpatent_library_search_seconds': '在多个知识库中并行检索并归并结果的总耗时，shards 为检索的知识库数',
+    'openpatent_rerank_seconds': '压缩索引候选用原始向量精排的耗时',
+    'openpatent_prompt_tokens': '提示词各部分的 token 数，section 为 total 时为完整提示词',
+    'openpatent_llm_ttft_seconds': '流式请求的首字延迟',
+    'openpatent_llm_request_seconds': 'LLM 请求从发出到响应结束的耗时',
+    'openpatent_llm_cache_hits_total': '命中响应缓存的 LLM 请求数',
+    'openpatent_llm_errors_total': '失败的 LLM 请求数',
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """
+    按 Prometheus 文本格式输出标签，转义反斜杠、双引号和换行。
+    """
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metrics:
+    """
+    进程内的指标注册表，记录计数器和直方图，可按 Prometheus 文本格式或 JSON 导出，线程安全。
+
+    设置环境变量 OPENPATENT_METRICS_LOG=1 时，每次记录还会以一行 JSON 写入 openpatent.metrics 日志。
+    """
+    def __init__(self, log_events: Optional[bool] = None):
+        """
+        初始化指标注册表。
+
+        参数:
+        log_events (bool): 是否把每次记录写成 JSON 日志行，默认读取环境变量 OPENPATENT_METRICS_LOG。
+        """
+        self.log_events = os.getenv('OPENPATENT_METRICS_LOG') == '1' if log_events is None else log_events
+        self.logger = logging.getLogger('openpatent.metrics')
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        # 直方图: 名称 -> 标签 -> [各桶计数, 总和, 次数]
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def buckets(name: str) -> Tuple[float, ...]:
+        """
+        获取直方图的分桶上界。
+        """
+        return TOKEN_BUCKETS if name.endswith('_tokens') else LATENCY_BUCKETS
+
+    def _log(self, kind: str, name: str, value: float, labels: Dict[str, object]):
+        if self.log_events:
+            self.logger.info(json.dumps({'ts': round(time.time(), 3), 'type': kind, 'metric': name,
+                                         'value': value, 'labels': {k: str(v) for k, v in labels.items()}},
+                                        ensure_ascii=False))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """
+        增加计数器。
+
+        参数:
+        name (str): 指标名，以 _total 结尾。
+        value (float): 增量，默认为 1。
+        labels: 标签。
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+        self._log('counter', name, value, labels)
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        向直方图记录一个观测值。
+
+        参数:
+        name (str): 指标名。
+        value (float): 观测值，耗时以秒为单位。
+        labels: 标签。
+        """
+        key = _label_key(labels)
+        bounds = self.buckets(name)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(bounds), 0.0, 0]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+        self._log('histogram', name, value, labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        统计代码块的耗时并记录到直方图，代码块抛出异常时同样记录。
+
+        参数:
+        name (str): 指标名。
+        labels: 标签。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """
+        导出当前所有指标。
+
+        返回:
+        Dict[str, List[Dict]]: 指标名到各标签组合的列表；计数器项包含 labels 和 value，
+        直方图项包含 labels、count、sum 和 buckets（上界到累计次数）。
+        """
+        result: Dict[str, List[Dict]] = {}
+        with self._lock:
+            for name, series in self._counters.items():
+                result[name] = [{'labels': dict(key), 'value': value} for key, value in series.items()]
+            for name, series in self._histograms.items():
+                bounds = self.buckets(name)
+                result[name] = [{'labels': dict(key), 'count': count, 'sum': total,
+                                 'buckets': dict(zip(map(str, bounds), counts))}
+                                for key, (counts, total, count) in series.items()]
+        return result
+
+    def render(self) -> str:
+        """
+        按 Prometheus 文本格式导出当前所有指标。
+
+        返回:
+        str: 指标文本。
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+                for key, value in self._counters[name].items():
+                    lines.append(f'{name}{_format_labels(key)} {value:g}')
+            for name in sorted(self._histograms):
+                bounds = self.buckets(name)
+                lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, (counts, total, count) in self._histograms[name].items():
+                    for bound, bucket_count in zip(bounds, counts):
+                        lines.append(f'{name}_bucket{_format_labels(key, ("le", f"{bound:g}"))} {bucket_count}')
+                    lines.append(f'{name}_bucket{_format_labels(key, ("le", "+Inf"))} {count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {total:.6f}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        清空所有指标。
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# 进程内共享的指标注册表
+METRICS = Metrics()
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', registry: Metrics = METRICS) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动指标服务：/metrics 返回 Prometheus 文本格式，/metrics.json 返回 JSON。
+
+    参数:
+    port (int): 监听端口，0 表示自动分配。
+    host (str): 监听地址，默认只监听本机。
+    registry (Metrics): 指标注册表，默认为 METRICS。
+
+    返回:
+    ThreadingHTTPServer: 已在后台线程运行的服务。
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = registry.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f'指标服务已启动: http://{host}:{server.server_address[1]}/metrics')
+    return server
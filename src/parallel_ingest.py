@@ -0,0 +1,142 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+import pdfplumber
+from cache import file_hash
+from pdf_processor import PDFProcessor
+from metrics import METRICS
+
+
+def extract_pages(file_path: str, start: int, end: int) -> Tuple[str, int, List[str], int]:
+    """
+    提取 PDF 中 [start, end) 范围内各页的文本，在工作进程中执行。
+
+    参数:
+    file_path (str): PDF 文件路径。
+    start (int): 起始页（从 0 开始）。
+    end (int): 结束页（不含）。
+
+    返回:
+    Tuple[str, int, List[str], int]: 文件路径、起始页、各页文本和 PDF 总页数。
+    """
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+        texts = [pdf.pages[i].extract_text() or '' for i in range(start, min(end, page_count))]
+    return file_path, start, texts, page_count
+
+
+class ParallelPDFExtractor:
+    """
+    并行 PDF 提取类，用进程池按文件、并对长文件按页范围并行提取文本。
+
+    每个文件先提交前 pages_per_task 页，得知总页数后再把剩余页拆成多个任务提交；
+    一个文件的全部页面完成后按页序拼接、分割章节，并立即交给调用方。
+    提取结果写入 PDFProcessor 的提取缓存，命中缓存的文件不再解析。
+    """
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 8,
+                 processor: Optional[PDFProcessor] = None):
+        """
+        初始化并行提取器。
+
+        参数:
+        max_workers (int): 进程数，默认为 CPU 核数；为 1 时在当前进程内串行提取。
+        pages_per_task (int): 每个任务提取的页数，默认为 8。
+        processor (PDFProcessor): 用于分割章节的 PDF 处理器，默认新建。
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.processor = processor or PDFProcessor()
+        self.last_stats: Dict[str, float] = {}
+
+    def iter_split(self, paths: List[str], digests: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """
+        并行提取并分割一组 PDF，按完成顺序逐个返回。
+
+        参数:
+        paths (List[str]): PDF 文件路径列表。
+        digests (Dict[str, str]): 文件路径到内容摘要的映射，用于查询提取缓存，缺失时自动计算。
+
+        返回:
+        Iterator[Tuple[str, Dict[str, str]]]: (文件路径, 章节字典)，章节字典同 PDFProcessor.split_pdf。
+        """
+        start_time = time.perf_counter()
+        self.last_stats = {'files': 0, 'pages': 0, 'cached_files': 0, 'cached_pages': 0,
+                           'seconds': 0.0, 'pages_per_sec': 0.0}
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return
+        cache = self.processor.cache
+        digests = dict(digests or {})
+        if cache is not None:
+            for path in paths:
+                digests.setdefault(path, file_hash(path))
+        pages: Dict[str, Dict[int, List[str]]] = {path: {} for path in paths}
+        remaining: Dict[str, int] = {}
+
+        def split(page_texts: List[str]) -> Dict[str, str]:
+            return self.processor.split_pages(page_texts)
+
+        def finish(path: str) -> Tuple[str, Dict[str, str]]:
+            chunks = pages.pop(path)
+            page_texts = [text for start in sorted(chunks) for text in chunks[start]]
+            if cache is not None:
+                cache.put_pages(self.processor.version, digests[path], page_texts)
+            self.last_stats['files'] += 1
+            METRICS.inc('openpatent_pdf_files_total', source='parsed')
+            METRICS.inc('openpatent_pdf_pages_total', len(page_texts))
+            return path, split(page_texts)
+
+        def record(result) -> List[Tuple[int, int]]:
+            """
+            登记一个完成的任务，返回需要追加提交的页范围。
+            """
+            path, start, texts, page_count = result
+            pages[path][start] = texts
+            self.last_stats['pages'] += len(texts)
+            extra = []
+            if start == 0:
+                extra = [(s, min(s + self.pages_per_task, page_count))
+                         for s in range(self.pages_per_task, page_count, self.pages_per_task)]
+                remaining[path] = len(extra)
+            else:
+                remaining[path] -= 1
+            return extra
+
+        try:
+            # 命中提取缓存的文件直接返回，不再解析 PDF
+            if cache is not None:
+                for path in list(paths):
+                    cached = cache.get_pages(self.processor.version, digests[path])
+                    if cached is not None:
+                        paths.remove(path)
+                        pages.pop(path)
+                        self.last_stats['files'] += 1
+                        self.last_stats['cached_files'] += 1
+                        self.last_stats['cached_pages'] += len(cached)
+                        METRICS.inc('openpatent_pdf_files_total', source='cache')
+                        yield path, split(cached)
+            if not paths:
+                return
+            if self.max_workers <= 1:
+                for path in paths:
+                    for start, end in record(extract_pages(path, 0, self.pages_per_task)):
+                        record(extract_pages(path, start, end))
+                    yield finish(path)
+                return
+
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = {executor.submit(extract_pages, path, 0, self.pages_per_task) for path in paths}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = future.result()[0]
+                        for start, end in record(future.result()):
+                            pending.add(executor.submit(extract_pages, path, start, end))
+                        if remaining[path] == 0:
+                            yield finish(path)
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.last_stats['seconds'] = seconds
+            self.last_stats['pages_per_sec'] = self.last_stats['pages'] / seconds if seconds > 0 else 0.0
+            METRICS.observe('openpatent_pdf_batch_seconds', seconds)
@@ -1,12 +1,70 @@
 import re
+from typing import Dict, List, Optional, Tuple
 import pdfplumber
+from cache import ExtractionCache, file_hash
+from metrics import METRICS
+
+def _heading_pattern(sections: List[str]):
+    """
+    将所有章节标题编译成一个组合正则表达式。
+
+    标题必须独占一行，字符之间允许任意空白（"权利要求书" 与 "权 利 要 求 书" 均可匹配），
+    行首允许 "(57)" 这样的著录项目编号。第 i 个章节对应命名分组 s{i}。
+    """
+    parts = []
+    for i, section in enumerate(sections):
+        chars = [re.escape(c) for c in section if not c.isspace()]
+        parts.append(f'(?P<s{i}>' + r'\s*'.join(chars) + ')')
+    return re.compile(r'^[ \t]*(?:\(\d+\))?[ \t]*(?:' + '|'.join(parts) + r')[ \t]*$', re.M)
+
 
 class PDFProcessor:
     """
     PDF 处理器类，用于将 PDF 文件按章节分割成多个部分。
     """
     SECTIONS = ['摘要', '权 利 要 求 书', '说 明 书', '说 明 书 附 图']
-    
+    HEADING_PATTERN = _heading_pattern(SECTIONS)
+    HEADER_RATIO = 0.12  # 扫描章节标题时只提取页面顶部的这一比例区域
+    VERSION = 1  # 文本提取逻辑变化时递增，使提取缓存失效
+
+    def __init__(self, cache: Optional[ExtractionCache] = None, use_cache: bool = True):
+        """
+        初始化 PDF 处理器。
+
+        参数:
+        cache (ExtractionCache): PDF 文本提取缓存，默认使用 cache/extraction.sqlite。
+        use_cache (bool): 是否启用提取缓存，默认为 True。
+        """
+        self.cache = (cache or ExtractionCache()) if use_cache else None
+        self.version = f'{self.VERSION}:{pdfplumber.__version__}'
+
+    def extract_pages(self, file_path, digest: Optional[str] = None) -> List[str]:
+        """
+        提取 PDF 的逐页文本，优先读取提取缓存。
+
+        参数:
+        file_path (str): PDF 文件的路径。
+        digest (str): PDF 内容摘要，未提供时自动计算。
+
+        返回:
+        List[str]: 逐页文本，无文本的页为空字符串。
+        """
+        if self.cache is not None:
+            digest = digest or file_hash(file_path)
+            pages = self.cache.get_pages(self.version, digest)
+            if pages is not None:
+                METRICS.inc('openpatent_pdf_files_total', source='cache')
+                return pages
+        # 使用 pdfplumber 打开 PDF 文件并提取文本
+        with METRICS.timer('openpatent_pdf_extract_seconds'):
+            with pdfplumber.open(file_path) as pdf:
+                pages = [page.extract_text() or '' for page in pdf.pages]
+        METRICS.inc('openpatent_pdf_files_total', source='parsed')
+        METRICS.inc('openpatent_pdf_pages_total', len(pages))
+        if self.cache is not None:
+            self.cache.put_pages(self.version, digest, pages)
+        return pages
+
     def split_pdf(self, file_path):
         """
         将 PDF 文件按章节分割成多个部分，并返回一个字典，键为章节名，值为章节内容。
@@ -17,41 +75,157 @@ class PDFProcessor:
         返回:
         dict: 包含章节名和对应内容的字典。
         """
-        # 使用 pdfplumber 打开 PDF 文件并提取文本
+        return self.split_pages(self.extract_pages(file_path))
+
+    def _find_headings(self, page_texts: List[Optional[str]]) -> List[Tuple[str, int]]:
+        """
+        在逐页文本中按 SECTIONS 的顺序查找各章节标题第一次出现的页码。
+
+        参数:
+        page_texts (List[Optional[str]]): 逐页文本（可以只是页面顶部区域），None 表示跳过该页。
+
+        返回:
+        List[Tuple[str, int]]: 按出现顺序排列的 (章节名, 页码)。
+        """
+        headings = []
+        next_index = 0
+        for page_no, text in enumerate(page_texts):
+            for match in self.HEADING_PATTERN.finditer(text or ''):
+                index = int(match.lastgroup[1:])
+                if index >= next_index:
+                    headings.append((self.SECTIONS[index], page_no))
+                    next_index = index + 1
+        return headings
+
+    def _page_ranges(self, headings: List[Tuple[str, int]], page_count: int) -> Dict[str, Tuple[int, int]]:
+        """
+        根据章节标题所在页计算各章节的页范围 [起始页, 结束页)。
+
+        下一章节与本章节的边界页同时计入两者，因为标题可能位于页面中间（如首页的摘要）。
+        """
+        starts = [('前言', 0)] + headings
+        ranges = {}
+        for i, (section, start) in enumerate(starts):
+            end = starts[i + 1][1] + 1 if i + 1 < len(starts) else page_count
+            ranges[section] = (start, min(end, page_count))
+        return ranges
+
+    def build_section_map(self, file_path) -> Dict[str, Tuple[int, int]]:
+        """
+        扫描一次 PDF，建立章节到页范围的映射。
+
+        命中提取缓存时直接使用缓存的逐页文本；否则只提取每页顶部区域查找标题，
+        在找到第一个章节之前的著录项目页（通常只有首页）提取全文，以便找到页中的 "(57)摘要"。
+
+        参数:
+        file_path (str): PDF 文件的路径。
+
+        返回:
+        Dict[str, Tuple[int, int]]: 章节名（含 "前言"）到页范围 [起始页, 结束页) 的映射。
+        """
+        if self.cache is not None:
+            pages = self.cache.get_pages(self.version, file_hash(file_path))
+            if pages is not None:
+                return self._page_ranges(self._find_headings(pages), len(pages))
         with pdfplumber.open(file_path) as pdf:
-            full_text = []
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    full_text.append(page_text)
-            text = '\n'.join(full_text)
-        
-        # 初始化分割结果
-        sections = {}
-        section_starts = []
-        
-        # 为每个章节标题编译正则表达式
-        patterns = {section: re.compile(rf'{section}') for section in self.SECTIONS}
-        
-        # 查找每个章节标题第一次出现的位置
-        current_pos = 0
-        for section in self.SECTIONS:
-            match = patterns[section].search(text, pos=current_pos)
-            if match:
-                section_starts.append((section, match.start()))
-                current_pos = match.start()
-        
-        # 添加文本开头和结尾作为边界
-        section_starts = [('', 0)] + section_starts + [('', len(text))]
-        
-        # 根据位置分割文本
-        for i in range(len(section_starts) - 1):
-            start_section, start_pos = section_starts[i]
-            _, end_pos = section_starts[i + 1]
-            section_name = '前言' if i == 0 else section_starts[i][0]
-            sections[section_name] = text[start_pos:end_pos].strip()
-        
-        return sections
+            return self._page_ranges(self._scan_headings(pdf), len(pdf.pages))
+
+    def _scan_headings(self, pdf) -> List[Tuple[str, int]]:
+        """
+        在已打开的 PDF 中只提取页面顶部区域查找章节标题。
+        """
+        scanned: List[Optional[str]] = []
+        for page in pdf.pages:
+            if not self._find_headings(scanned):
+                scanned.append(page.extract_text() or '')
+            else:
+                header = page.within_bbox((0, 0, page.width, page.height * self.HEADER_RATIO))
+                scanned.append(header.extract_text() or '')
+        return self._find_headings(scanned)
+
+    def extract_sections(self, file_path, sections: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        只提取指定章节所在的页面，并返回这些章节的内容。
+
+        参数:
+        file_path (str): PDF 文件的路径。
+        sections (List[str]): 需要的章节名，如 ["权 利 要 求 书"]，默认为全部章节。
+
+        返回:
+        Dict[str, str]: 章节名到章节内容的映射，不包含未找到的章节。
+        """
+        if sections is None:
+            return self.split_pdf(file_path)
+        if self.cache is not None:
+            pages = self.cache.get_pages(self.version, file_hash(file_path))
+            if pages is not None:
+                return self.split_pages(pages, sections)
+        with pdfplumber.open(file_path) as pdf:
+            headings = self._scan_headings(pdf)
+            ranges = self._page_ranges(headings, len(pdf.pages))
+            needed = {page_no for section in sections if section in ranges for page_no in range(*ranges[section])}
+            page_texts = [pdf.pages[i].extract_text() or '' if i in needed else None
+                          for i in range(len(pdf.pages))]
+        return self._slice_sections(page_texts, headings, sections)
+
+    def split_pages(self, page_texts: List[str], sections: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        将逐页文本按章节分割，每个章节只拼接其页范围内的文本。
+
+        参数:
+        page_texts (List[str]): 逐页文本。
+        sections (List[str]): 需要的章节名，默认为全部章节（含 "前言"）。
+
+        返回:
+        Dict[str, str]: 章节名到章节内容的映射。
+        """
+        return self._slice_sections(page_texts, self._find_headings(page_texts), sections)
+
+    def _slice_sections(self, page_texts: List[Optional[str]], headings: List[Tuple[str, int]],
+                        sections: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        根据章节标题位置，从各章节页范围内的文本中截取章节内容。
+        """
+        ranges = self._page_ranges(headings, len(page_texts))
+        order = ['前言'] + [section for section, _ in headings]
+        result = {}
+        for i, section in enumerate(order):
+            if sections is not None and section not in sections:
+                continue
+            start_page, end_page = ranges[section]
+            text = '\n'.join(t for t in page_texts[start_page:end_page] if t)
+            start = 0
+            if section != '前言':
+                start = self._heading_start(text, section)
+            end = len(text)
+            if i + 1 < len(order):
+                next_start = self._heading_start(text, order[i + 1], start)
+                if next_start >= 0:
+                    end = next_start
+            result[section] = text[start:end].strip()
+        return result
+
+    def _heading_start(self, text: str, section: str, pos: int = 0) -> int:
+        """
+        查找章节标题在文本中第一次出现的位置，找不到时返回 -1。
+        """
+        group = f's{self.SECTIONS.index(section)}'
+        for match in self.HEADING_PATTERN.finditer(text, pos):
+            if match.lastgroup == group:
+                return match.start(group)
+        return -1
+
+    def split_text(self, text):
+        """
+        将已提取的全文按章节分割。
+
+        参数:
+        text (str): PDF 全文。
+
+        返回:
+        dict: 包含章节名和对应内容的字典。
+        """
+        return self.split_pages([text])
 
 if __name__ == "__main__":
     # 请替换为实际的 PDF 文件路径
@@ -0,0 +1,154 @@
+import re
+import math
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+from metrics import METRICS
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:  # 未安装 tiktoken 或无法下载词表时使用本地估算
+    _ENCODING = None
+
+# 各部分的默认 token 预算：context 为检索到的参考专利，query 为技术文档，draft 为当前版本，feedback 为修改意见，
+# excerpt 为局部修订时待修改段落前后的上下文
+DEFAULT_BUDGETS = {'context': 6000, 'query': 8000, 'draft': 16000, 'feedback': 2000, 'excerpt': 1500}
+TRUNCATION_MARK = '……'
+_TOKEN_PATTERN = re.compile(r'[㐀-鿿豈-﫿]|[A-Za-z0-9_]+|\S')
+
+
+def count_tokens(text: str) -> int:
+    """
+    在本地估算文本的 token 数。
+
+    安装了 tiktoken 时使用 cl100k_base 编码精确计数；否则按每个汉字 1 个 token、
+    连续字母数字每 4 个字符 1 个 token、其余符号各 1 个 token 估算。
+
+    参数:
+    text (str): 文本。
+
+    返回:
+    int: token 数。
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return sum(math.ceil(len(token) / 4) for token in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    截断文本使其不超过 max_tokens，尽量在段落或句子边界截断。
+
+    参数:
+    text (str): 文本。
+    max_tokens (int): token 上限。
+
+    返回:
+    str: 截断后的文本，发生截断时以 "……" 结尾。
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(TRUNCATION_MARK)
+    if budget <= 0:
+        return ''
+    # 二分查找不超过预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    head = text[:low]
+    for boundary in ('\n', '。', '；'):
+        cut = head.rfind(boundary)
+        if cut >= len(head) // 2:
+            head = head[:cut + 1]
+            break
+    return head.rstrip() + TRUNCATION_MARK
+
+
+def select_passages(passages: List[Dict], max_tokens: int) -> Tuple[str, int]:
+    """
+    按相关度（距离从小到大）选择检索到的段落，直到用完 token 预算。
+
+    放不下的段落整体跳过；如果最相关的段落本身就超出预算，则截断后使用。
+
+    参数:
+    passages (List[Dict]): 检索结果，每项包含 text 和 distance。
+    max_tokens (int): token 上限。
+
+    返回:
+    Tuple[str, int]: 以换行连接的段落文本和选中的段落数。
+    """
+    selected = []
+    used = 0
+    for passage in sorted(passages, key=lambda p: p.get('distance', 0.0)):
+        tokens = count_tokens(passage['text']) + 1
+        if used + tokens <= max_tokens:
+            selected.append(passage['text'])
+            used += tokens
+        elif not selected:
+            selected.append(truncate_tokens(passage['text'], max_tokens))
+            used = max_tokens
+    return '\n'.join(selected), len(selected)
+
+
+class PromptBuilder:
+    """
+    提示词构建器，按各部分的 token 预算裁剪参考专利、技术文档、当前版本和修改意见。
+    """
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        """
+        初始化提示词构建器。
+
+        参数:
+        budgets (Dict[str, int]): 各部分的 token 预算，可只覆盖部分键，默认为 DEFAULT_BUDGETS。
+        """
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+
+    def fit(self, **sections: Union[str, List[Dict]]) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """
+        按预算裁剪各部分内容。
+
+        context 可以是字符串或检索结果列表；为列表时按相关度选择段落，其余部分按 token 截断。
+
+        参数:
+        sections: 部分名到内容的映射，部分名为 context、query、draft 或 feedback。
+
+        返回:
+        Tuple[Dict[str, str], Dict[str, int]]: 裁剪后的内容和各部分的 token 数。
+        """
+        fitted: Dict[str, str] = {}
+        counts: Dict[str, int] = {}
+        for name, value in sections.items():
+            budget = self.budgets[name]
+            if isinstance(value, list):
+                text, kept = select_passages(value, budget)
+                if kept < len(value):
+                    logging.info(f'{name} 超出预算 {budget} tokens，保留 {kept}/{len(value)} 个段落')
+            else:
+                text = truncate_tokens(value or '', budget)
+                if len(text) < len(value or ''):
+                    logging.info(f'{name} 超出预算 {budget} tokens，已截断')
+            fitted[name] = text
+            counts[name] = count_tokens(text)
+        return fitted, counts
+
+    def log_counts(self, action: str, doc_type: str, counts: Dict[str, int], prompt: str):
+        """
+        记录一次调用的各部分及提示词总 token 数，同时写入 openpatent_prompt_tokens 指标。
+
+        参数:
+        action (str): 操作名称（"生成" 或 "修订"）。
+        doc_type (str): 文档类型。
+        counts (Dict[str, int]): 各部分的 token 数。
+        prompt (str): 完整提示词。
+        """
+        total = count_tokens(prompt)
+        for name, count in {**counts, 'total': total}.items():
+            METRICS.observe('openpatent_prompt_tokens', count, action=action, doc_type=doc_type, section=name)
+        detail = '，'.join(f'{name}={count}' for name, count in counts.items())
+        logging.info(f'{action}{doc_type}提示词 tokens: {detail}，总计={total}')
@@ -0,0 +1,294 @@
+import os
+import re
+import heapq
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from ingest import PatentIngestor
+from metrics import METRICS
+from text_chunker import merge_passages
+from vector_db import VectorDB
+
+# 章节名（知识库类型）到索引包目录名的映射
+DB_NAMES = {'摘要': 'abstract', '说 明 书': 'specification', '权 利 要 求 书': 'claims'}
+# 默认知识库直接位于根目录下，与早期版本的 dbs/ 布局兼容；其他知识库位于 <根目录>/libraries/<名称>/
+DEFAULT_LIBRARY = 'default'
+LIBRARIES_DIR = 'libraries'
+# 并行检索各分片的线程数
+SEARCH_WORKERS = int(os.getenv('OPENPATENT_SEARCH_WORKERS', '8'))
+_NAME_PATTERN = re.compile(r'[\w\-]+')
+
+
+def db_paths(directory: str) -> Dict[str, str]:
+    """
+    获取一个知识库中各章节索引包的路径。
+
+    参数:
+    directory (str): 知识库目录。
+
+    返回:
+    Dict[str, str]: 章节名到索引包路径的映射。
+    """
+    return {db_type: os.path.join(directory, name) for db_type, name in DB_NAMES.items()}
+
+
+
+class ReadWriteLock:
+    """
+    读写锁：检索持有共享锁，可以同时进行；加载知识库和入库修改索引时持有独占锁。
+
+    直接用 with lock: 获取独占锁，用法与 threading.Lock 相同，可以作为 PatentIngestor.ingest_files 的 lock；
+    with lock.shared(): 获取共享锁。有线程在等待独占锁时，新的共享请求先等待，入库不会被连续的检索阻塞。
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire(self):
+        """
+        获取独占锁，等待正在进行的检索和写入结束。
+        """
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release(self):
+        """
+        释放独占锁。
+        """
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @contextmanager
+    def shared(self):
+        """
+        获取共享锁的上下文管理器，持有期间不会有线程修改索引。
+        """
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+
+def merge_shard_results(shard_results: Dict[str, List[Dict]], k: int) -> List[Dict]:
+    """
+    把各分片按距离升序排列的检索结果归并为全局前 k 个，每项增加 library 字段标明来源知识库。
+
+    参数:
+    shard_results (Dict[str, List[Dict]]): 知识库名称到该分片检索结果的映射。
+    k (int): 返回的数量。
+
+    返回:
+    List[Dict]: 按距离升序排列的前 k 个结果。
+    """
+    tagged = [[{**result, 'library': name} for result in results] for name, results in shard_results.items()]
+    return list(heapq.merge(*tagged, key=lambda result: result['distance']))[:k]
+
+
+class ReferenceLibrary:
+    """
+    参考专利知识库集合。每个知识库（分片）有独立的索引包和入库清单，可以按技术领域或客户分别维护；
+    检索时在线程池中并行查询选中的知识库，再把各分片的前 k 个结果按距离归并为全局前 k 个。
+
+    各知识库使用同一个嵌入模型，dense 模式下的距离可以直接比较；sparse/hybrid 模式的分数在各分片内计算，
+    跨分片合并时只是近似可比。
+    """
+    def __init__(self, root: str = 'dbs', max_workers: int = SEARCH_WORKERS, ingest_workers: Optional[int] = None):
+        """
+        初始化知识库集合。
+
+        参数:
+        root (str): 知识库根目录，默认为 dbs。
+        max_workers (int): 并行检索的线程数，默认读取环境变量 OPENPATENT_SEARCH_WORKERS（8）。
+        ingest_workers (int): 入库时 PDF 提取的进程数，默认为 CPU 核数。
+        """
+        self.root = root
+        self.max_workers = max_workers
+        self.ingest_workers = ingest_workers
+        self._ingestors: Dict[str, PatentIngestor] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._embedder: Optional[VectorDB] = None
+        self._lock = threading.Lock()
+        # 检索持有共享锁，加载知识库和入库写入索引时持有独占锁
+        self.lock = ReadWriteLock()
+
+    def directory(self, name: str) -> str:
+        """
+        获取知识库的目录。
+
+        参数:
+        name (str): 知识库名称，只能包含文字、数字、下划线和连字符。
+
+        返回:
+        str: 知识库目录。
+        """
+        if not _NAME_PATTERN.fullmatch(name or ''):
+            raise ValueError(f'知识库名称只能包含文字、数字、下划线和连字符: {name!r}')
+        if name == DEFAULT_LIBRARY:
+            return self.root
+        return os.path.join(self.root, LIBRARIES_DIR, name)
+
+    def names(self) -> List[str]:
+        """
+        列出磁盘上已有的和已加载的知识库。
+
+        返回:
+        List[str]: 知识库名称，默认知识库在最前。
+        """
+        names = set(self._ingestors)
+        default_files = list(db_paths(self.root).values()) + [os.path.join(self.root, 'manifest.json')]
+        if any(os.path.exists(path) for path in default_files):
+            names.add(DEFAULT_LIBRARY)
+        libraries_dir = os.path.join(self.root, LIBRARIES_DIR)
+        if os.path.isdir(libraries_dir):
+            names.update(entry for entry in os.listdir(libraries_dir)
+                         if os.path.isdir(os.path.join(libraries_dir, entry)) and _NAME_PATTERN.fullmatch(entry))
+        return sorted(names, key=lambda name: (name != DEFAULT_LIBRARY, name))
+
+    def ingestor(self, name: str) -> PatentIngestor:
+        """
+        获取知识库的入库器，不存在时新建（首次入库时创建目录）。
+
+        参数:
+        name (str): 知识库名称。
+
+        返回:
+        PatentIngestor: 入库器，其 dbs 为该知识库的各章节向量数据库。
+        """
+        with self._lock:
+            if name not in self._ingestors:
+                directory = self.directory(name)
+                self._ingestors[name] = PatentIngestor(db_paths(directory), os.path.join(directory, 'manifest.json'),
+                                                       max_workers=self.ingest_workers)
+            return self._ingestors[name]
+
+    def attach(self, name: str, dbs: Dict[str, VectorDB]):
+        """
+        注册已在内存中构建好的知识库，例如基准测试中直接创建的索引。
+
+        参数:
+        name (str): 知识库名称。
+        dbs (Dict[str, VectorDB]): 章节名到向量数据库的映射。
+        """
+        with self.lock:
+            self.ingestor(name).dbs = dict(dbs)
+
+    def load(self, names: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, VectorDB]]:
+        """
+        加载知识库，已加载的直接返回。加载未加载的知识库时调用方需持有 lock 的独占锁，search 会自动处理。
+
+        参数:
+        names (Sequence[str]): 知识库名称，默认为全部已有的知识库。
+
+        返回:
+        Dict[str, Dict[str, VectorDB]]: 知识库名称到各章节向量数据库的映射。
+
+        异常:
+        ValueError: 指定的知识库不存在。
+        """
+        available = self.names()
+        names = available if names is None else list(names)
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValueError(f'未知的知识库: {unknown}，可选 {available}')
+        return {name: self.ingestor(name).load() for name in names}
+
+    def ingest_files(self, name: str, paths: List[str], remove_missing: bool = False) -> Dict[str, List[str]]:
+        """
+        把一组 PDF 增量写入指定知识库，见 PatentIngestor.ingest_files。
+
+        参数:
+        name (str): 知识库名称，不存在时新建。
+        paths (List[str]): PDF 文件路径列表。
+        remove_missing (bool): 是否删除清单中存在但不在 paths 中的文件，默认为 False。
+
+        返回:
+        Dict[str, List[str]]: 处理结果，包含 added、updated、removed、skipped 四个文件名列表。
+        """
+        return self.ingestor(name).ingest_files(paths, remove_missing)
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        获取查询文本的嵌入向量。各知识库使用同一个嵌入模型，查询向量只需计算一次即可检索所有分片。
+
+        优先使用已加载的向量数据库计算，沿用其嵌入接口配置和缓存；尚未加载任何知识库时使用独立的查询实例。
+        """
+        embedder = next((db for ingestor in list(self._ingestors.values()) for db in ingestor.dbs.values()), None)
+        if embedder is None:
+            if self._embedder is None:
+                self._embedder = VectorDB('查询')
+            embedder = self._embedder
+        return embedder.embed_texts(texts)
+
+    def search(self, db_type: str, query: str, k: int = 2, libraries: Optional[Sequence[str]] = None,
+               merge_by_source: bool = False, mode: Optional[str] = None,
+               embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        在选中的知识库中并行检索同一章节，并把各分片的前 k 个段落按距离归并为全局前 k 个。
+
+        只选中一个知识库时直接在当前线程检索；未加载的知识库在检索前持有独占锁加载，检索本身只持有共享锁，
+        多个会话和一键生成的各个文档可以同时检索，只与入库写入索引的步骤互斥。
+
+        参数:
+        db_type (str): 章节名，如 "摘要"、"说 明 书"、"权 利 要 求 书"。
+        query (str): 查询文本。
+        k (int): 返回的段落数量，默认为 2。
+        libraries (Sequence[str]): 要检索的知识库名称，默认为全部已有的知识库。
+        merge_by_source (bool): 是否在归并后把同一来源专利的段落合并为一条结果，默认为 False。
+        mode (str): 检索方式，"dense"、"sparse" 或 "hybrid"，默认为各知识库的 search_mode。
+        embedding (np.ndarray): 已计算好的查询向量，所有分片共用。
+
+        返回:
+        List[Dict]: 检索结果，格式同 VectorDB.search_passages，每项另有 library 字段；
+        合并时不同知识库中同名的专利分别合并。
+
+        异常:
+        ValueError: 指定的知识库不存在。
+        """
+        names = list(libraries) if libraries else self.names()
+        if not all(name in self._ingestors and self._ingestors[name].dbs for name in names):
+            with self.lock:
+                self.load(libraries or None)
+
+        def search_shard(db: VectorDB) -> List[Dict]:
+            return db.search_passages(query, k, mode=mode, embedding=embedding)
+
+        with self.lock.shared():
+            shards = {name: dbs[db_type] for name, dbs in self.load(libraries or None).items()}
+            with METRICS.timer('openpatent_library_search_seconds', db=db_type, shards=len(shards)):
+                if len(shards) <= 1:
+                    shard_results = {name: search_shard(db) for name, db in shards.items()}
+                else:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                            thread_name_prefix='library-search')
+                    futures = {name: self._executor.submit(search_shard, db) for name, db in shards.items()}
+                    shard_results = {name: future.result() for name, future in futures.items()}
+                results = merge_shard_results(shard_results, k)
+        logging.debug('%s 检索了 %d 个知识库: %s', db_type, len(shards), list(shards))
+        if merge_by_source:
+            return merge_passages(results)
+        return results
@@ -0,0 +1,374 @@
+import os
+import re
+import json
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r'[㐀-鿿豈-﫿]+|[A-Za-z0-9_]+')
+
+
+def tokenize(text: str, ngram: int = 2) -> List[str]:
+    """
+    将文本切分为检索词：连续汉字切成字符 n-gram（不足 n 个字时保留整段），连续字母数字作为一个词并转为小写。
+
+    参数:
+    text (str): 文本。
+    ngram (int): 汉字 n-gram 的长度，默认为 2。
+
+    返回:
+    List[str]: 检索词列表（含重复）。
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text or ''):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif len(run) <= ngram:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + ngram] for i in range(len(run) - ngram + 1))
+    return tokens
+
+
+def term_key(term: str) -> int:
+    """
+    把检索词映射为稳定的 64 位整数键，磁盘上的倒排表按键排序，查询时二分查找，不需要加载词表。
+
+    参数:
+    term (str): 检索词。
+
+    返回:
+    int: 有符号 64 位整数键，跨进程一致。
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    用倒数排名融合（RRF）合并多个排序结果，分数为各排序中 1 / (k + 名次) 之和。
+
+    参数:
+    rankings (Iterable[List[int]]): 多个按相关度降序排列的 ID 列表。
+    k (int): 平滑常数，默认为 60。
+
+    返回:
+    List[Tuple[int, float]]: 按融合分数降序排列的 (ID, 分数)。
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class SparseIndex:
+    """
+    进程内的 BM25 稀疏索引，基于汉字 n-gram 的倒排表，查询不需要网络请求。
+
+    倒排表以 CSR 数组保存：按检索词键（见 term_key）排序的键数组、每个键的倒排项区间、倒排项的行号和词频，
+    以及按 ID 排序的文本 ID 和长度。从索引包加载时这些数组以内存映射方式打开，查询只读取命中词的倒排项；
+    新增的文本先保存在内存中的 {词: {文本 ID: 词频}} 中，删除已加载的文本只做标记，下次 save 时合并。
+    入库检查点写出的增量段用 add_segment 追加，与主段一起查询。
+    BM25 的 idf 和平均长度在查询时按全部未删除的文本计算。
+    """
+    DIR_NAME = 'sparse'
+    ARRAYS = ('keys', 'offsets', 'rows', 'tfs', 'doc_ids', 'doc_lens')
+
+    def __init__(self, ngram: int = 2, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化稀疏索引。
+
+        参数:
+        ngram (int): 汉字 n-gram 的长度，默认为 2。
+        k1 (float): BM25 词频饱和参数，默认为 1.2。
+        b (float): BM25 文本长度归一化参数，默认为 0.75。
+        """
+        self.ngram = ngram
+        self.k1 = k1
+        self.b = b
+        # 尚未保存的文本
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lens: Dict[int, int] = {}
+        # 从磁盘加载的 CSR 段，见 _build_segment
+        self._segments: List[Dict[str, np.ndarray]] = []
+        self._deleted: Set[int] = set()
+        # 查询用的缓存：编译后的内存段、各段未删除文本的掩码、(文本数, 平均长度)，增删后失效
+        self._compiled: Optional[Dict[str, np.ndarray]] = None
+        self._live: Optional[List[Optional[np.ndarray]]] = None
+        self._stats: Optional[Tuple[int, float]] = None
+
+    def __len__(self) -> int:
+        return sum(len(segment['doc_ids']) for segment in self._segments) - len(self._deleted) + len(self.doc_lens)
+
+    def _invalidate(self):
+        self._compiled = None
+        self._live = None
+        self._stats = None
+
+    def _stored(self, doc_id: int) -> bool:
+        """
+        判断文本是否在已加载的段中（未删除）。
+        """
+        if doc_id in self._deleted:
+            return False
+        for segment in self._segments:
+            doc_ids = segment['doc_ids']
+            row = int(np.searchsorted(doc_ids, doc_id))
+            if row < len(doc_ids) and doc_ids[row] == doc_id:
+                return True
+        return False
+
+    def add(self, ids: Iterable[int], texts: Iterable[str]):
+        """
+        添加文本。
+
+        参数:
+        ids (Iterable[int]): 文本 ID，与向量索引中的 ID 一致。
+        texts (Iterable[str]): 文本内容。
+        """
+        for doc_id, text in zip(ids, texts):
+            doc_id = int(doc_id)
+            counts = Counter(tokenize(text, self.ngram))
+            self.doc_lens[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+        self._invalidate()
+
+    def remove(self, ids: Iterable[int]):
+        """
+        删除文本。
+
+        参数:
+        ids (Iterable[int]): 要删除的文本 ID。
+        """
+        removed = set()
+        for doc_id in map(int, ids):
+            if doc_id in self.doc_lens:
+                removed.add(doc_id)
+            elif self._stored(doc_id):
+                self._deleted.add(doc_id)
+        self._drop_pending(removed)
+        self._invalidate()
+
+    def _drop_pending(self, ids: Set[int]):
+        """
+        从内存中的倒排表移除文本。
+        """
+        ids = ids & self.doc_lens.keys()
+        if not ids:
+            return
+        if len(ids) == len(self.doc_lens):
+            self.postings, self.doc_lens = {}, {}
+            return
+        for doc_id in ids:
+            del self.doc_lens[doc_id]
+        for term in list(self.postings):
+            entries = self.postings[term]
+            for doc_id in ids & entries.keys():
+                del entries[doc_id]
+            if not entries:
+                del self.postings[term]
+
+    @staticmethod
+    def _build_segment(keys: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                       docs: np.ndarray, lens: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        由逐条倒排项（检索词键、文本 ID、词频）和文本长度表构建 CSR 段。
+
+        返回:
+        Dict[str, np.ndarray]: keys（升序，int64）、offsets（键 i 的倒排项为 [offsets[i], offsets[i + 1])）、
+        rows（倒排项对应的行号，int32）、tfs（词频，int32）、doc_ids（升序，int64）和 doc_lens（int32）。
+        """
+        order = np.argsort(docs, kind='stable')
+        docs, lens = docs[order], lens[order]
+        order = np.lexsort((doc_ids, keys))
+        keys, doc_ids, tfs = keys[order], doc_ids[order], tfs[order]
+        unique, counts = np.unique(keys, return_counts=True)
+        return {
+            'keys': unique.astype('int64'),
+            'offsets': np.concatenate([[0], np.cumsum(counts)]).astype('int64'),
+            'rows': np.searchsorted(docs, doc_ids).astype('int32'),
+            'tfs': tfs.astype('int32'),
+            'doc_ids': docs.astype('int64'),
+            'doc_lens': lens.astype('int32'),
+        }
+
+    def compile(self):
+        """
+        把内存中尚未保存的倒排表编译为 CSR 段。增删文本后首次查询时自动重新编译。
+        """
+        terms = list(self.postings)
+        lengths = np.fromiter((len(self.postings[term]) for term in terms), dtype='int64', count=len(terms))
+        total = int(lengths.sum())
+        keys = np.repeat(np.fromiter(map(term_key, terms), dtype='int64', count=len(terms)), lengths)
+        doc_ids = np.fromiter((doc_id for term in terms for doc_id in self.postings[term]), dtype='int64', count=total)
+        tfs = np.fromiter((tf for term in terms for tf in self.postings[term].values()), dtype='int32', count=total)
+        docs = np.fromiter(self.doc_lens.keys(), dtype='int64', count=len(self.doc_lens))
+        lens = np.fromiter(self.doc_lens.values(), dtype='int32', count=len(self.doc_lens))
+        self._compiled = self._build_segment(keys, doc_ids, tfs, docs, lens)
+
+    def _prepare(self) -> Tuple[List[Dict[str, np.ndarray]], List[Optional[np.ndarray]], int, float]:
+        """
+        获取查询用的各段、各段未删除文本的掩码（没有删除时为 None），以及文本数和平均长度。
+        """
+        if self._compiled is None:
+            self.compile()
+        if self._live is None:
+            deleted = np.fromiter(self._deleted, dtype='int64', count=len(self._deleted))
+            self._live = [~np.isin(segment['doc_ids'], deleted) if len(deleted) else None
+                          for segment in self._segments] + [None]
+        segments = self._segments + [self._compiled]
+        if self._stats is None:
+            total = sum(float(np.sum(segment['doc_lens'], dtype='int64') if live is None else
+                              np.sum(segment['doc_lens'][live], dtype='int64'))
+                        for segment, live in zip(segments, self._live))
+            n = len(self)
+            self._stats = (n, total / n if n else 0.0)
+        return segments, self._live, self._stats[0], self._stats[1]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        检索与查询最相关的文本。
+
+        参数:
+        query (str): 查询文本。
+        k (int): 返回的数量，默认为 10。
+
+        返回:
+        List[Tuple[int, float]]: 按 BM25 分数降序排列的 (文本 ID, 分数)，不含零分结果。
+        """
+        if k <= 0 or len(self) == 0:
+            return []
+        segments, live, n, avg_len = self._prepare()
+        scores = [np.zeros(len(segment['doc_ids']), dtype='float32') for segment in segments]
+        for key in {term_key(term) for term in tokenize(query, self.ngram)}:
+            hits = []
+            for i, segment in enumerate(segments):
+                lo = int(np.searchsorted(segment['keys'], key, 'left'))
+                hi = int(np.searchsorted(segment['keys'], key, 'right'))
+                if lo == hi:
+                    continue
+                start, end = int(segment['offsets'][lo]), int(segment['offsets'][hi])
+                rows = np.asarray(segment['rows'][start:end])
+                tfs = np.asarray(segment['tfs'][start:end], dtype='float32')
+                if live[i] is not None:
+                    mask = live[i][rows]
+                    rows, tfs = rows[mask], tfs[mask]
+                if len(rows):
+                    hits.append((i, rows, tfs))
+            df = sum(len(rows) for _, rows, _ in hits)
+            if df == 0:
+                continue
+            idf = np.float32(np.log(1 + (n - df + 0.5) / (df + 0.5)))
+            for i, rows, tfs in hits:
+                lens = segments[i]['doc_lens'][rows].astype('float32')
+                norm = self.k1 * (1 - self.b + self.b * lens / max(avg_len, 1e-9))
+                scores[i][rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        candidates = []
+        for segment, segment_scores in zip(segments, scores):
+            top_k = min(k, int(np.count_nonzero(segment_scores)))
+            if top_k == 0:
+                continue
+            top = np.argpartition(-segment_scores, top_k - 1)[:top_k]
+            candidates.extend(zip(segment['doc_ids'][top].tolist(), segment_scores[top].tolist()))
+        return sorted(candidates, key=lambda item: item[1], reverse=True)[:k]
+
+    def _merged(self) -> Dict[str, np.ndarray]:
+        """
+        把所有段中未删除的文本合并为一个 CSR 段。
+        """
+        segments, live, _, _ = self._prepare()
+        keys, doc_ids, tfs, docs, lens = [], [], [], [], []
+        for segment, mask in zip(segments, live):
+            lengths = np.diff(segment['offsets'])
+            rows = np.asarray(segment['rows'])
+            posting_keys = np.repeat(np.asarray(segment['keys']), lengths)
+            posting_tfs = np.asarray(segment['tfs'])
+            segment_docs = np.asarray(segment['doc_ids'])
+            segment_lens = np.asarray(segment['doc_lens'])
+            if mask is not None:
+                keep = mask[rows]
+                rows, posting_keys, posting_tfs = rows[keep], posting_keys[keep], posting_tfs[keep]
+                segment_docs, segment_lens = segment_docs[mask], segment_lens[mask]
+            keys.append(posting_keys)
+            doc_ids.append(np.asarray(segment['doc_ids'])[rows])
+            tfs.append(posting_tfs)
+            docs.append(segment_docs)
+            lens.append(segment_lens)
+        return self._build_segment(np.concatenate(keys), np.concatenate(doc_ids), np.concatenate(tfs),
+                                   np.concatenate(docs), np.concatenate(lens))
+
+    def save(self, directory: str, pending_only: bool = False):
+        """
+        将倒排表合并后保存到索引包目录中的 sparse/ 子目录（params.json 及各 CSR 数组的 .npy 文件）。
+
+        参数:
+        directory (str): 索引包目录。
+        pending_only (bool): 是否只写入内存中尚未保存的文本（用于增量段），默认为 False。
+        """
+        target = os.path.join(directory, self.DIR_NAME)
+        os.makedirs(target, exist_ok=True)
+        if pending_only:
+            self.compile()
+            segment = self._compiled
+        else:
+            segment = self._merged()
+        for name in self.ARRAYS:
+            np.save(os.path.join(target, f'{name}.npy'), segment[name])
+        with open(os.path.join(target, 'params.json'), 'w', encoding='utf-8') as f:
+            json.dump({'ngram': self.ngram, 'k1': self.k1, 'b': self.b}, f)
+
+    @classmethod
+    def _open_segment(cls, source: str) -> Dict[str, np.ndarray]:
+        """
+        以内存映射方式打开 sparse/ 目录中的 CSR 数组。
+        """
+        segment = {}
+        for name in cls.ARRAYS:
+            path = os.path.join(source, f'{name}.npy')
+            try:
+                segment[name] = np.load(path, mmap_mode='r')
+            except ValueError:
+                # 部分 numpy 版本无法映射空数组，退化为普通读取
+                segment[name] = np.load(path)
+        return segment
+
+    def add_segment(self, directory: str):
+        """
+        以内存映射方式打开 save(pending_only=True) 写出的增量段，段中的文本不再保存在内存中。
+
+        参数:
+        directory (str): 增量段目录（其中的 sparse/ 子目录）。
+        """
+        segment = self._open_segment(os.path.join(directory, self.DIR_NAME))
+        self._segments.append(segment)
+        self._drop_pending(set(np.asarray(segment['doc_ids']).tolist()))
+        self._invalidate()
+
+    def close(self):
+        """
+        释放内存映射的 CSR 段，尚未保存的文本仍保留在内存中。
+        """
+        self._segments = []
+        self._deleted = set()
+        self._invalidate()
+
+    @classmethod
+    def load(cls, directory: str) -> Optional['SparseIndex']:
+        """
+        从索引包目录打开倒排表，数组以内存映射方式打开，不会读入内存。
+
+        参数:
+        directory (str): 索引包目录。
+
+        返回:
+        Optional[SparseIndex]: 稀疏索引，目录中没有倒排表时返回 None。
+        """
+        source = os.path.join(directory, cls.DIR_NAME)
+        if not os.path.isdir(source):
+            return None
+        with open(os.path.join(source, 'params.json'), encoding='utf-8') as f:
+            index = cls(**json.load(f))
+        index._segments.append(cls._open_segment(source))
+        return index
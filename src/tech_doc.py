@@ -0,0 +1,113 @@
+import re
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from docx import Document
+from cache import file_hash
+
+
+class TechDocument:
+    """
+    已解析的技术文档，包含规范化后的全文和查询向量。
+    """
+    def __init__(self, digest: str, text: str, embedding: np.ndarray):
+        """
+        初始化技术文档。
+
+        参数:
+        digest (str): 文档内容的 SHA-256 摘要。
+        text (str): 规范化后的全文，用作检索查询和生成提示。
+        embedding (np.ndarray): 全文的查询向量，未配置嵌入函数时为 None。
+        """
+        self.digest = digest
+        self.text = text
+        self.embedding = embedding
+
+    def __repr__(self) -> str:
+        return f'TechDocument({self.digest[:12]}, {len(self.text)} 字)'
+
+
+def normalize_paragraphs(paragraphs: List[str]) -> str:
+    """
+    规范化技术文档段落：去掉首尾空白、合并段内连续空白、丢弃空段落。
+
+    参数:
+    paragraphs (List[str]): 原始段落文本。
+
+    返回:
+    str: 以换行连接的段落文本。
+    """
+    lines = (re.sub(r'[ \t　]+', ' ', para).strip() for para in paragraphs)
+    return '\n'.join(line for line in lines if line)
+
+
+class TechDocumentCache:
+    """
+    技术文档缓存，按文件内容摘要保存解析结果和查询向量。
+
+    同一份技术文档在一次会话中只解析和嵌入一次，生成说明书、摘要和权利要求书时共用同一个查询向量。
+    """
+    def __init__(self, embed: Optional[Callable[[List[str]], np.ndarray]], max_entries: int = 16):
+        """
+        初始化技术文档缓存。
+
+        参数:
+        embed (Callable[[List[str]], np.ndarray]): 批量获取嵌入向量的函数，如 VectorDB.embed_texts；
+        为 None 时不计算查询向量（仅使用本地稀疏检索）。
+        max_entries (int): 最多缓存的文档数，超出时淘汰最早加入的文档，默认为 16。
+        """
+        self.embed = embed
+        self.max_entries = max_entries
+        self._docs: Dict[str, TechDocument] = {}
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Lock] = {}
+
+    def load(self, path: str) -> TechDocument:
+        """
+        读取技术文档，命中缓存时直接返回，否则解析、规范化并计算查询向量。
+
+        参数:
+        path (str): .docx 文件路径。
+
+        返回:
+        TechDocument: 解析后的技术文档。
+        """
+        digest = file_hash(path)
+        with self._lock:
+            doc = self._docs.get(digest)
+            if doc is not None:
+                return doc
+            pending = self._pending.setdefault(digest, threading.Lock())
+        # 解析和远程嵌入在全局锁之外进行，同一文档的并发请求在各自的摘要锁上等待，不会重复嵌入
+        with pending:
+            with self._lock:
+                doc = self._docs.get(digest)
+            if doc is not None:
+                return doc
+            try:
+                text = normalize_paragraphs([para.text for para in Document(path).paragraphs])
+                embedding = self.embed([text])[0] if self.embed is not None else None
+                doc = TechDocument(digest, text, embedding)
+                logging.info(f'技术文档已解析并嵌入: {doc}')
+                with self._lock:
+                    if len(self._docs) >= self.max_entries:
+                        self._docs.pop(next(iter(self._docs)))
+                    self._docs[digest] = doc
+                return doc
+            finally:
+                with self._lock:
+                    if self._pending.get(digest) is pending:
+                        del self._pending[digest]
+
+    def get(self, digest: str) -> Optional[TechDocument]:
+        """
+        按内容摘要获取已缓存的技术文档。
+
+        参数:
+        digest (str): 文档内容摘要。
+
+        返回:
+        Optional[TechDocument]: 技术文档，未缓存时返回 None。
+        """
+        return self._docs.get(digest)
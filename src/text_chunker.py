@@ -0,0 +1,126 @@
+import re
+from typing import Dict, List, Optional
+
+# 优先在这些位置切分，避免把句子从中间截断
+BREAK_PATTERN = re.compile(r'[。！？；;.!?\n]')
+
+
+class TextChunker:
+    """
+    文本切分器类，用于将专利章节切分成带有重叠的段落（passage），并记录其在原文中的偏移。
+    """
+    def __init__(self, chunk_size: int = 512, overlap: int = 64, min_chunk_size: int = 32):
+        """
+        初始化文本切分器。
+
+        参数:
+        chunk_size (int): 每个段落的最大字符数，默认为 512。
+        overlap (int): 相邻段落之间重叠的字符数，默认为 64。
+        min_chunk_size (int): 末尾段落的最小字符数，更短时并入前一个段落，默认为 32。
+        """
+        if overlap >= chunk_size:
+            raise ValueError('overlap 必须小于 chunk_size')
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_chunk_size = min_chunk_size
+
+    def _find_end(self, text: str, start: int) -> int:
+        """
+        在 [start, start + chunk_size] 范围的后半段寻找最后一个句子边界作为段落结尾。
+        """
+        end = min(start + self.chunk_size, len(text))
+        if end == len(text):
+            return end
+        window_start = start + self.chunk_size // 2
+        last = None
+        for match in BREAK_PATTERN.finditer(text, window_start, end):
+            last = match.end()
+        return last if last is not None else end
+
+    def split(self, text: str, source: Optional[str] = None, section: Optional[str] = None) -> List[Dict]:
+        """
+        将文本切分成带有重叠的段落。
+
+        参数:
+        text (str): 要切分的文本。
+        source (str): 来源文件名，写入每个段落的元数据。
+        section (str): 章节名，写入每个段落的元数据。
+
+        返回:
+        List[Dict]: 段落列表，每项包含 text、source、section、start、end，
+        其中 start/end 为段落在原文中的字符偏移。
+        """
+        if not text:
+            return []
+        spans = []
+        start = 0
+        while start < len(text):
+            end = self._find_end(text, start)
+            spans.append((start, end))
+            if end >= len(text):
+                break
+            start = max(end - self.overlap, start + 1)
+        # 末尾过短的段落并入前一个段落
+        if len(spans) > 1 and spans[-1][1] - spans[-1][0] < self.min_chunk_size:
+            last_end = spans.pop()[1]
+            spans[-1] = (spans[-1][0], last_end)
+        return [
+            {'text': text[s:e], 'source': source, 'section': section, 'start': s, 'end': e}
+            for s, e in spans if text[s:e].strip()
+        ]
+
+    def split_sections(self, sections: Dict[str, str], source: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        对 PDFProcessor.split_pdf 返回的各章节分别切分。
+
+        参数:
+        sections (Dict[str, str]): 章节名到章节内容的映射。
+        source (str): 来源文件名。
+
+        返回:
+        Dict[str, List[Dict]]: 章节名到段落列表的映射。
+        """
+        return {name: self.split(content, source, name) for name, content in sections.items() if content}
+
+
+def merge_passages(passages: List[Dict]) -> List[Dict]:
+    """
+    按来源专利合并检索到的段落。
+
+    同一知识库、同一来源、同一章节的段落按偏移排序后拼接，重叠部分只保留一次，不相邻的段落之间以省略号分隔；
+    不同知识库中同名的专利文件分别合并。合并结果按各来源中最好的得分（距离最小）排序。
+
+    参数:
+    passages (List[Dict]): 检索结果，每项包含 text、source、section、start、end、distance，
+    跨知识库检索时另有 library。
+
+    返回:
+    List[Dict]: 合并后的结果，每项包含 text、library（单个数据库的检索结果为 None）、source、section、
+    distance 和 passages（合并的段落数）。
+    """
+    groups: Dict[tuple, List[Dict]] = {}
+    for passage in passages:
+        key = (passage.get('library'), passage.get('source'), passage.get('section'))
+        groups.setdefault(key, []).append(passage)
+    merged = []
+    for (library, source, section), items in groups.items():
+        items = sorted(items, key=lambda p: p.get('start') or 0)
+        text = items[0]['text']
+        end = items[0].get('end') or 0
+        for item in items[1:]:
+            start = item.get('start') or 0
+            if start < end:
+                text += item['text'][end - start:]
+            else:
+                text += '……\n' + item['text']
+            end = max(end, item.get('end') or 0)
+        merged.append({
+            'text': text,
+            'library': library,
+            'source': source,
+            'section': section,
+            'distance': min(p.get('distance', 0.0) for p in items),
+            'passages': len(items),
+        })
+    merged.sort(key=lambda m: m['distance'])
+    return merged
@@ -0,0 +1,254 @@
+import os
+import json
+import mmap
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+METADATA_KEYS = ('source', 'section', 'start', 'end')
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('text_start', '<i8'),
+    ('text_end', '<i8'),
+    ('source', '<i4'),
+    ('section', '<i4'),
+    ('start', '<i8'),
+    ('end', '<i8'),
+])
+
+
+class TextStore:
+    """
+    文本与元数据存储。
+
+    新增的条目保存在内存中；从磁盘加载的条目只把紧凑的记录表以内存映射方式打开，
+    正文在 get 时才从 texts.bin 中按偏移读取。除完整保存的主段外，还可以追加入库检查点写出的增量段（见 add_segment），
+    各段的 ID 互不重复。
+    """
+    def __init__(self):
+        """
+        初始化空的文本存储。
+        """
+        self._pending: Dict[int, Tuple[str, Dict]] = {}
+        # 已加载的段，每段包含 records、blob、blob_file、strings
+        self._segments: List[Dict] = []
+        self._deleted: Set[int] = set()
+
+    def add(self, text_id: int, text: str, metadata: Optional[Dict] = None):
+        """
+        添加一条文本。
+
+        参数:
+        text_id (int): 文本 ID，与向量索引中的 ID 一致。
+        text (str): 文本内容。
+        metadata (Dict): 元数据，可包含 source（来源 PDF）、section（章节）、start/end（在来源章节中的字符偏移）。
+        """
+        metadata = {key: value for key, value in (metadata or {}).items() if key in METADATA_KEYS}
+        self._pending[int(text_id)] = (text, metadata)
+        self._deleted.discard(int(text_id))
+
+    def remove(self, text_ids: Iterable[int]):
+        """
+        删除文本。已从磁盘加载的条目只做删除标记，下次 save 时才真正移除。
+
+        参数:
+        text_ids (Iterable[int]): 要删除的文本 ID。
+        """
+        for text_id in text_ids:
+            text_id = int(text_id)
+            self._pending.pop(text_id, None)
+            if self._find(text_id) is not None:
+                self._deleted.add(text_id)
+
+    def ids_for_source(self, source: str) -> List[int]:
+        """
+        查找来自指定来源文件的所有文本 ID。
+
+        参数:
+        source (str): 来源文件名。
+
+        返回:
+        List[int]: 文本 ID 列表（升序）。
+        """
+        ids = [text_id for text_id, (_, metadata) in self._pending.items() if metadata.get('source') == source]
+        for segment in self._segments:
+            if source in segment['strings']:
+                records = segment['records']
+                rows = np.nonzero(records['source'] == segment['strings'].index(source))[0]
+                ids.extend(int(text_id) for text_id in records['id'][rows] if int(text_id) not in self._deleted)
+        return sorted(set(ids))
+
+    def _find(self, text_id: int) -> Optional[Tuple[Dict, int]]:
+        """
+        在已加载的各段记录表中二分查找 ID，返回 (段, 行号)，不存在或已删除时返回 None。
+        """
+        if text_id in self._deleted:
+            return None
+        for segment in self._segments:
+            ids = segment['records']['id']
+            row = int(np.searchsorted(ids, text_id))
+            if row < len(ids) and ids[row] == text_id:
+                return segment, row
+        return None
+
+    def get(self, text_id: int) -> Optional[str]:
+        """
+        读取文本内容。
+
+        参数:
+        text_id (int): 文本 ID。
+
+        返回:
+        Optional[str]: 文本内容，不存在时返回 None。
+        """
+        text_id = int(text_id)
+        if text_id in self._pending:
+            return self._pending[text_id][0]
+        found = self._find(text_id)
+        if found is None:
+            return None
+        segment, row = found
+        record = segment['records'][row]
+        return bytes(segment['blob'][int(record['text_start']):int(record['text_end'])]).decode('utf-8')
+
+    def get_metadata(self, text_id: int) -> Dict:
+        """
+        读取文本的元数据。
+
+        参数:
+        text_id (int): 文本 ID。
+
+        返回:
+        Dict: 包含 id、source、section、start、end 的字典，不存在时为空字典。
+        """
+        text_id = int(text_id)
+        if text_id in self._pending:
+            return {'id': text_id, **self._pending[text_id][1]}
+        found = self._find(text_id)
+        if found is None:
+            return {}
+        segment, row = found
+        record, strings = segment['records'][row], segment['strings']
+        return {
+            'id': text_id,
+            'source': strings[record['source']] if record['source'] >= 0 else None,
+            'section': strings[record['section']] if record['section'] >= 0 else None,
+            'start': int(record['start']),
+            'end': int(record['end']),
+        }
+
+    def ids(self) -> List[int]:
+        """
+        获取所有文本 ID（升序）。
+
+        返回:
+        List[int]: 文本 ID 列表。
+        """
+        loaded = set()
+        for segment in self._segments:
+            loaded.update(segment['records']['id'].tolist())
+        return sorted((loaded - self._deleted) | set(self._pending))
+
+    def __getitem__(self, text_id: int) -> str:
+        text = self.get(text_id)
+        if text is None:
+            raise KeyError(text_id)
+        return text
+
+    def __contains__(self, text_id) -> bool:
+        return int(text_id) in self._pending or self._find(int(text_id)) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def __repr__(self) -> str:
+        return f'TextStore({len(self)} 条文本)'
+
+    def save(self, directory: str, pending_only: bool = False):
+        """
+        将所有文本和元数据写入目录，生成 texts.bin、records.npy 和 strings.json。
+
+        参数:
+        directory (str): 输出目录。
+        pending_only (bool): 是否只写入内存中尚未保存的条目（用于增量段），默认为 False。
+        """
+        os.makedirs(directory, exist_ok=True)
+        strings: Dict[str, int] = {}
+
+        def intern(value) -> int:
+            if value is None:
+                return -1
+            return strings.setdefault(str(value), len(strings))
+
+        ids = sorted(self._pending) if pending_only else self.ids()
+        records = np.zeros(len(ids), dtype=RECORD_DTYPE)
+        offset = 0
+        with open(os.path.join(directory, 'texts.bin'), 'wb') as f:
+            for row, text_id in enumerate(ids):
+                data = (self.get(text_id) or '').encode('utf-8')
+                metadata = self.get_metadata(text_id)
+                f.write(data)
+                records[row] = (text_id, offset, offset + len(data),
+                                intern(metadata.get('source')), intern(metadata.get('section')),
+                                metadata.get('start') or 0, metadata.get('end') or 0)
+                offset += len(data)
+        np.save(os.path.join(directory, 'records.npy'), records)
+        with open(os.path.join(directory, 'strings.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(strings), f, ensure_ascii=False)
+
+    @staticmethod
+    def _open_segment(directory: str) -> Dict:
+        """
+        以内存映射方式打开 save 写出的目录。
+        """
+        records_path = os.path.join(directory, 'records.npy')
+        texts_path = os.path.join(directory, 'texts.bin')
+        with open(os.path.join(directory, 'strings.json'), encoding='utf-8') as f:
+            segment = {'strings': json.load(f), 'blob_file': None}
+        # 空文件无法建立内存映射，退化为普通读取
+        if os.path.getsize(texts_path) > 0:
+            segment['records'] = np.load(records_path, mmap_mode='r')
+            segment['blob_file'] = open(texts_path, 'rb')
+            segment['blob'] = mmap.mmap(segment['blob_file'].fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            segment['records'] = np.load(records_path)
+            segment['blob'] = b''
+        return segment
+
+    @classmethod
+    def load(cls, directory: str) -> 'TextStore':
+        """
+        以内存映射方式打开目录中的文本存储，不会读取正文。
+
+        参数:
+        directory (str): save 写出的目录。
+
+        返回:
+        TextStore: 文本存储。
+        """
+        store = cls()
+        store._segments.append(cls._open_segment(directory))
+        return store
+
+    def add_segment(self, directory: str):
+        """
+        以内存映射方式打开 save(pending_only=True) 写出的增量段，段中的条目不再保存在内存中。
+
+        参数:
+        directory (str): 增量段目录。
+        """
+        segment = self._open_segment(directory)
+        self._segments.append(segment)
+        for text_id in segment['records']['id'].tolist():
+            self._pending.pop(text_id, None)
+
+    def close(self):
+        """
+        关闭内存映射的文件句柄。
+        """
+        for segment in self._segments:
+            if isinstance(segment['blob'], mmap.mmap):
+                segment['blob'].close()
+            if segment['blob_file'] is not None:
+                segment['blob_file'].close()
+        self._segments = []
+        self._deleted = set()
@@ -1,27 +1,143 @@
 import os
+import json
+import shutil
 import faiss
 import requests
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import numpy as np
+from cache import EmbeddingCache
+from http_client import HTTPClient, get_http_client
+from metrics import METRICS
+from text_store import TextStore
+from text_chunker import merge_passages
+from sparse_index import SparseIndex, reciprocal_rank_fusion
+from vector_store import VectorStore
+from index_builder import (INDEX_TYPES, STORAGE_TYPES, choose_index_type, normalize_storage, index_kind,
+                           index_storage, supports_remove, mmap_flags, exact_rerank, build_faiss_index,
+                           set_search_params, benchmark_index_types, benchmark_storage)
+
+EMBEDDING_API_URL = os.getenv('EMBEDDING_API_URL', 'https://api.siliconflow.cn/v1/embeddings')
+EMBEDDING_MODEL = 'BAAI/bge-m3'
+BUNDLE_FORMAT = 'openpatent-index'
+BUNDLE_VERSION = 2
+# 入库检查点追加的增量段所在的子目录，见 VectorDB.save_delta
+SEGMENTS_DIR = 'segments'
+SEARCH_MODES = ('dense', 'sparse', 'hybrid')
+RRF_K = 60
+# 大型知识库的存储选项，可通过环境变量为 Web 界面和命令行统一设置
+INDEX_STORAGE = os.getenv('OPENPATENT_INDEX_STORAGE', 'float32')
+INDEX_RERANK = int(os.getenv('OPENPATENT_INDEX_RERANK', '0'))
+INDEX_MMAP = os.getenv('OPENPATENT_INDEX_MMAP') == '1'
 
 class VectorDB:
     """
     向量数据库类，用于创建、保存、加载和查询向量索引。
     """
-    def __init__(self, db_type: str):
+    def __init__(self, db_type: str, batch_size: int = 32, max_workers: int = 4,
+                 cache: Optional[EmbeddingCache] = None, use_cache: bool = True,
+                 index_type: str = 'auto', nprobe: int = 16, ef_search: int = 64,
+                 http: Optional[HTTPClient] = None, search_mode: str = 'dense',
+                 storage: str = INDEX_STORAGE, rerank: int = INDEX_RERANK, mmap: bool = INDEX_MMAP):
         """
         初始化向量数据库。
 
         参数:
         db_type (str): 数据库类型，如 "摘要", "说明书", "权利要求书"。
+        batch_size (int): 每次嵌入请求发送的文本数量，默认为 32。
+        max_workers (int): 同时在途的嵌入请求数量上限，默认为 4。
+        cache (EmbeddingCache): 嵌入向量缓存，默认使用 cache/embeddings.sqlite。
+        use_cache (bool): 是否启用嵌入向量缓存，默认为 True。
+        index_type (str): 索引类型，"flat"、"ivf"、"hnsw"、"ivfpq" 或 "auto"（按语料规模自动选择），默认为 "auto"。
+        nprobe (int): IVF 类索引查询时探测的聚类数，默认为 16。
+        ef_search (int): HNSW 索引查询时的候选队列长度，默认为 64。
+        http (HTTPClient): 嵌入请求使用的 HTTP 客户端，默认使用进程内共享的连接池（带超时和重试）。
+        search_mode (str): 默认检索方式，"dense"（向量检索）、"sparse"（本地 BM25，无需网络）
+        或 "hybrid"（两者按倒数排名融合），默认为 "dense"。
+        storage (str): 向量存储方式，"float32"、"float16"、"int8" 或 "pq"，默认读取环境变量 OPENPATENT_INDEX_STORAGE（float32）。
+        rerank (int): 大于 0 时额外保存原始向量，压缩索引检索 k * rerank 个候选后用原始向量精排，
+        默认读取环境变量 OPENPATENT_INDEX_RERANK（0，不精排）。
+        mmap (bool): 是否以只读内存映射方式加载索引包，多个进程共享同一份物理内存，首次写入前自动改为可写加载；
+        默认读取环境变量 OPENPATENT_INDEX_MMAP。
         """
+        if index_type != 'auto' and index_type not in INDEX_TYPES:
+            raise ValueError(f'未知的索引类型: {index_type}，可选 {INDEX_TYPES} 或 auto')
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f'未知的检索方式: {search_mode}，可选 {SEARCH_MODES}')
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f'未知的存储方式: {storage}，可选 {STORAGE_TYPES}')
         self.api_key = os.getenv('SILICONFLOW_API_KEY')
+        self.api_url = EMBEDDING_API_URL
+        self.model = EMBEDDING_MODEL
         self.db_type = db_type
-        self.index = faiss.IndexFlatL2(1024)  # 假设bge-m3的维度为1024
-        self.texts: Dict[int, str] = {}  # Store texts with their corresponding index
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.cache = (cache or EmbeddingCache()) if use_cache else None
+        self.http = http or get_http_client()
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.storage = storage
+        self.rerank = rerank
+        self.mmap = mmap
+        self.read_only = False  # 以内存映射方式加载后为 True
+        self.path: Optional[str] = None
+        # 假设bge-m3的维度为1024；新建时先用 flat 索引，数据写入后由 optimize 训练目标类型的索引
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(1024))
+        self.texts = TextStore()  # 文本及元数据，键与向量索引中的位置一致
+        self._sparse: Optional[SparseIndex] = None  # 与向量索引同步维护的 BM25 稀疏索引，见 sparse
+        self.vectors = VectorStore(1024) if rerank > 0 else None  # 精排用的原始向量
+        self.search_mode = search_mode
         self.next_index = 0
-        
+        self._reset_delta()
+
+    @property
+    def sparse(self) -> SparseIndex:
+        """
+        与向量索引同步维护的 BM25 稀疏索引。首次使用时才从索引包打开（倒排数组以内存映射方式打开），
+        dense 模式的检索不会用到它；早于稀疏索引的索引包此时根据文本重建。
+        """
+        if self._sparse is None:
+            self._sparse = self._open_sparse()
+        return self._sparse
+
+    @sparse.setter
+    def sparse(self, sparse: SparseIndex):
+        self._sparse = sparse
+
+    def _open_sparse(self) -> SparseIndex:
+        """
+        从当前索引包（含已加载的增量段）打开稀疏索引，没有索引包时返回空索引。
+        """
+        if not self.path or not os.path.isdir(self.path):
+            return SparseIndex()
+        sparse = SparseIndex.load(self.path)
+        if sparse is None:
+            # 早于稀疏索引的索引包，根据文本重建
+            sparse = SparseIndex()
+            ids = self.texts.ids()
+            sparse.add(ids, [self.texts.get(i) for i in ids])
+            return sparse
+        for segment in self._segments:
+            if os.path.isdir(os.path.join(segment, SparseIndex.DIR_NAME)):
+                sparse.add_segment(segment)
+        sparse.remove(self._segment_deleted.tolist())
+        return sparse
+
+    def _reset_delta(self, segments: Optional[List[str]] = None, deleted: Optional[np.ndarray] = None):
+        """
+        清空上次保存之后的增删记录。
+
+        参数:
+        segments (List[str]): 当前索引包中已加载的增量段目录。
+        deleted (np.ndarray): 这些增量段记录的删除 ID。
+        """
+        self._delta = VectorStore(self.index.d)  # 上次保存之后新增的向量，写入下一个增量段
+        self._delta_removed: Set[int] = set()  # 上次保存之后删除的、已保存过的 ID
+        self._segments = segments or []
+        self._segment_deleted = deleted if deleted is not None else np.empty(0, dtype='int64')
+
     def _get_embedding(self, text: str) -> np.ndarray:
         """
         获取文本的嵌入向量。
@@ -32,101 +148,620 @@ class VectorDB:
         返回:
         np.ndarray: 文本的嵌入向量。
         """
+        return self.embed_texts([text])
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        通过一次请求获取一批文本的嵌入向量。
+
+        参数:
+        texts (List[str]): 要获取嵌入向量的文本列表。
+
+        返回:
+        np.ndarray: 形状为 [len(texts), 维度] 的嵌入向量，顺序与输入一致。
+        """
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
-        
+
         try:
-            response = requests.request(
-                "POST",
-                "https://api.siliconflow.cn/v1/embeddings",
-                headers=headers,
-                json={
-                    "model": 'BAAI/bge-m3',
-                    "input": text,
-                    "encoding_format": "float"
-                }
-            )
-            response.raise_for_status()
-            return np.array([response.json()['data'][0]['embedding']]).astype('float32')
+            # 共享连接池发送请求，429/5xx 和连接错误按指数退避重试
+            with METRICS.timer('openpatent_embedding_request_seconds'):
+                result = self.http.post_json(
+                    self.api_url,
+                    {
+                        "model": self.model,
+                        "input": list(texts),
+                        "encoding_format": "float"
+                    },
+                    headers=headers,
+                )
+            # 接口返回的 data 带有 index 字段，按其排序以保证与输入顺序一致
+            data = sorted(result['data'], key=lambda item: item.get('index', 0))
+            return np.array([item['embedding'] for item in data]).astype('float32')
         except requests.exceptions.RequestException as e:
+            METRICS.inc('openpatent_embedding_errors_total')
             logging.error(f'Embedding生成失败: {str(e)}')
-            if response is not None:
-                logging.error(f'Response content: {response.text}')
             raise
 
-    def create_index(self, texts: List[str]):
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        分批并发获取文本的嵌入向量。
+
+        先查询嵌入缓存，仅对未命中的文本发起远程请求。未命中的文本按 batch_size
+        切分成多个批次，最多 max_workers 个批次同时请求，结果按输入顺序拼接。
+
+        参数:
+        texts (List[str]): 要获取嵌入向量的文本列表。
+
+        返回:
+        np.ndarray: 形状为 [len(texts), 维度] 的嵌入向量。
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.index.d), dtype='float32')
+        if self.cache is not None:
+            cached = self.cache.get_embeddings(self.model, texts)
+        else:
+            cached = [None] * len(texts)
+        # 去重后只请求缓存未命中的文本
+        missing = list(dict.fromkeys(text for text, vec in zip(texts, cached) if vec is None))
+        METRICS.inc('openpatent_embedding_texts_total', len(texts) - len(missing), cache='hit')
+        METRICS.inc('openpatent_embedding_texts_total', len(missing), cache='miss')
+        fetched: Dict[str, np.ndarray] = {}
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            if len(batches) == 1 or self.max_workers <= 1:
+                results = [self._get_embeddings(batch) for batch in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    # map 按提交顺序返回结果，在途批次数受线程数限制
+                    results = list(executor.map(self._get_embeddings, batches))
+            embeddings = np.concatenate(results, axis=0).astype('float32')
+            if self.cache is not None:
+                self.cache.put_embeddings(self.model, missing, embeddings)
+            fetched = dict(zip(missing, embeddings))
+        return np.stack([vec if vec is not None else fetched[text]
+                         for text, vec in zip(texts, cached)]).astype('float32')
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        获取嵌入缓存的统计信息。
+
+        返回:
+        Dict[str, int]: 包含 hits、misses、entries 和 bytes 的字典，未启用缓存时为空。
+        """
+        return self.cache.stats() if self.cache is not None else {}
+
+    def add(self, texts: List[str], metadatas: Optional[List[Dict]] = None,
+            embeddings: Optional[np.ndarray] = None) -> List[int]:
+        """
+        向索引中追加文本。
+
+        参数:
+        texts (List[str]): 要添加的文本列表。
+        metadatas (List[Dict]): 与 texts 一一对应的元数据，可包含 source、section、start、end。
+        embeddings (np.ndarray): 已由 embed_texts 计算好的嵌入向量，提供时不再发起嵌入请求。
+
+        返回:
+        List[int]: 分配给各文本的 ID。
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(texts)
+        if embeddings is None:
+            embeddings = self.embed_texts(texts)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        self._ensure_writable()
+        ids = np.arange(self.next_index, self.next_index + len(texts), dtype='int64')
+        self.index.add_with_ids(embeddings, ids) #必须add numpy array
+        self._delta.add(ids, embeddings)
+        if self.vectors is not None:
+            self.vectors.add(ids, embeddings)
+        for text_id, text, metadata in zip(ids, texts, metadatas):
+            self.texts.add(text_id, text, metadata)
+        self.sparse.add(ids.tolist(), texts)
+        self.next_index += len(texts)
+        return ids.tolist()
+
+    def remove(self, ids: List[int]) -> int:
+        """
+        按 ID 删除向量及其文本。
+
+        参数:
+        ids (List[int]): 要删除的文本 ID。
+
+        返回:
+        int: 实际删除的向量数量。
+        """
+        ids = np.asarray(list(ids), dtype='int64')
+        if len(ids) == 0:
+            return 0
+        self._ensure_writable()
+        removed = self._remove_from_index(ids)
+        self.texts.remove(ids.tolist())
+        self.sparse.remove(ids.tolist())
+        if self.vectors is not None:
+            self.vectors.remove(ids.tolist())
+        # 本次保存前新增的条目直接丢弃，已保存过的记入下一个增量段
+        self._delta_removed.update(text_id for text_id in ids.tolist() if text_id not in self._delta)
+        self._delta.remove(ids.tolist())
+        return int(removed)
+
+    def _remove_from_index(self, ids: np.ndarray) -> int:
+        """
+        从 FAISS 索引中删除向量，HNSW 不支持删除，用剩余向量重建。
+
+        返回:
+        int: 实际删除的向量数量。
+        """
+        if supports_remove(self.index):
+            return int(self.index.remove_ids(ids))
+        all_ids, vectors = self._export_vectors()
+        keep = ~np.isin(all_ids, ids)
+        self.index = build_faiss_index(index_kind(self.index), vectors[keep], all_ids[keep],
+                                       index_storage(self.index))
+        return int((~keep).sum())
+
+    def remove_source(self, source: str) -> int:
+        """
+        删除来自指定来源文件的所有向量及其文本。
+
+        参数:
+        source (str): 来源文件名。
+
+        返回:
+        int: 实际删除的向量数量。
+        """
+        return self.remove(self.texts.ids_for_source(source))
+
+    def create_index(self, texts: List[str], metadatas: Optional[List[Dict]] = None):
         """
         创建向量索引。
 
         参数:
         texts (List[str]): 要创建索引的文本列表。
+        metadatas (List[Dict]): 与 texts 一一对应的元数据，可包含 source、section、start、end。
+        """
+        self.add(texts, metadatas)
+        self.optimize()
+        logging.debug('%s 索引已创建: %s', self.db_type, self.texts)
+
+    def _export_vectors(self):
+        """
+        导出索引中的全部 ID 和向量，用于重建索引。
+
+        保存了原始向量时直接读取；否则 float32 存储的 flat、hnsw、ivf 从索引中精确还原，
+        量化存储为有损压缩，改为根据文本重新获取嵌入（通常命中缓存）。
+
+        返回:
+        Tuple[np.ndarray, np.ndarray]: int64 ID 数组和形状为 [n, d] 的向量。
+        """
+        if self.vectors is not None:
+            ids, vectors = self.vectors.get(self.texts.ids())
+            if len(ids) == self.index.ntotal:
+                return ids, vectors
+            logging.warning(f'{self.db_type} 原始向量与索引不一致，改为从索引导出')
+        if index_storage(self.index) != 'float32':
+            ids = np.asarray(self.texts.ids(), dtype='int64')
+            vectors = self.embed_texts([self.texts[i] for i in ids])
+        elif isinstance(self.index, faiss.IndexIDMap):
+            ids = faiss.vector_to_array(self.index.id_map).astype('int64')
+            vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        else:
+            ids = np.asarray(self.texts.ids(), dtype='int64')
+            vectors = self.index.reconstruct_batch(ids)
+        return ids, np.asarray(vectors, dtype='float32').reshape(len(ids), self.index.d)
+
+    def rebuild_index(self, index_type: Optional[str] = None, storage: Optional[str] = None):
+        """
+        按指定类型和存储方式重建索引，需要训练的类型和量化器会在此时完成训练。
+
+        参数:
+        index_type (str): 索引类型，默认为构造时指定的类型（auto 时按当前规模自动选择）。
+        storage (str): 存储方式，默认为构造时指定的存储方式。
         """
-        embeddings = []
-        for text in texts:
-            embedding = self._get_embedding(text)
-            embeddings.append(embedding)
-            self.texts[self.next_index] = text
-            self.next_index += 1
-        print(f"data created:{self.texts}")
-        embeddings = np.concatenate(embeddings, axis=0).astype('float32')
-        self.index.add(embeddings) #必须add numpy array
+        index_type = index_type or self.index_type
+        if index_type == 'auto':
+            index_type = choose_index_type(self.index.ntotal)
+        self._ensure_writable()
+        ids, vectors = self._export_vectors()
+        self.index = build_faiss_index(index_type, vectors, ids, storage or self.storage)
+        if self.rerank > 0 and self.vectors is None:
+            self.vectors = VectorStore(self.index.d)
+            self.vectors.add(ids, vectors)
+        logging.info(f'{self.db_type} 索引已重建为 {index_kind(self.index)}（{index_storage(self.index)} 存储），'
+                     f'共 {self.index.ntotal} 条向量')
+
+    def optimize(self):
+        """
+        当前索引类型或存储方式与目标不一致时重建索引。目标为构造时指定的类型和存储方式，auto 时按当前规模自动选择类型。
+        """
+        target = self.index_type if self.index_type != 'auto' else choose_index_type(self.index.ntotal)
+        target = normalize_storage(target, self.storage)
+        if target != (index_kind(self.index), index_storage(self.index)):
+            self.rebuild_index(*target)
 
     def save_index(self, path: str):
         """
         保存向量索引到指定路径。
 
+        path 为一个目录（索引包），其中包含:
+        manifest.json: 格式名称、版本号、数据库类型、嵌入模型、维度和条目数；
+        index.faiss: FAISS 索引；
+        texts.bin / records.npy / strings.json: 文本存储，见 TextStore；
+        sparse/: BM25 稀疏索引的 CSR 数组，见 SparseIndex；
+        vectors.npy / vector_ids.npy: 精排用的原始向量（启用 rerank 时），见 VectorStore。
+        完整保存会合并此前 save_delta 追加的增量段。
+
         参数:
         path (str): 保存索引的路径。
         """
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        faiss.write_index(self.index, path)
+        tmp_path = f'{path}.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        faiss.write_index(self.index, os.path.join(tmp_path, 'index.faiss'))
+        self.texts.save(tmp_path)
+        self.sparse.save(tmp_path)
+        if self.vectors is not None:
+            self.vectors.save(tmp_path)
+        manifest = {
+            'format': BUNDLE_FORMAT,
+            'version': BUNDLE_VERSION,
+            'db_type': self.db_type,
+            'model': self.model,
+            'dim': self.index.d,
+            'count': self.index.ntotal,
+            'index_type': index_kind(self.index),
+            'storage': index_storage(self.index),
+            'next_index': self.next_index,
+        }
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        # 先写临时目录再替换，避免中途失败留下不完整的索引包；
+        # 替换前关闭当前的内存映射（Windows 下无法删除仍被映射的文件），替换后从新索引包重新打开
+        self._close_mapped()
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        os.replace(tmp_path, path)
+        self.texts = TextStore.load(path)
+        if self.vectors is not None:
+            self.vectors = VectorStore.load(path, self.index.d)
+        self.path = path
+        self._reset_delta()
+        # 倒排表已写入索引包，释放内存中的副本，下次使用时以内存映射方式打开
+        self._sparse = self._open_sparse() if self.search_mode != 'dense' else None
+
+    def _close_mapped(self):
+        """
+        关闭文本存储、原始向量和稀疏索引对当前索引包（含增量段）的内存映射，删除或替换这些文件前调用。
+        """
+        self.texts.close()
+        if self.vectors is not None:
+            self.vectors.close()
+        if self._sparse is not None:
+            self._sparse.close()
 
-    def load_index(self, path: str):
+    def save_delta(self, path: str):
+        """
+        把上次保存之后的新增和删除作为增量段追加到索引包，写入量只与这批数据成正比，入库检查点使用。
+
+        增量段位于 <索引包>/segments/<序号>/，包含新增条目的原始向量（vectors.npy / vector_ids.npy）、
+        文本存储、稀疏索引和删除的 ID（deleted.npy）。段写完后才登记到 manifest.json，中途失败留下的段在加载时被忽略。
+        加载时在主段的 FAISS 索引上依次追加各段的向量，save_index 把所有段合并为完整的索引包。
+        path 不是当前索引加载或保存的位置时改为完整保存。
+
+        参数:
+        path (str): 索引包路径。
+        """
+        if self.path != path or not os.path.isdir(path):
+            self.save_index(path)
+            return
+        if not len(self._delta) and not self._delta_removed:
+            return
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        names = manifest.get('segments', [])
+        name = f'{len(names) + 1:06d}'
+        segment = os.path.join(path, SEGMENTS_DIR, name)
+        tmp_path = f'{segment}.tmp'
+        for stale in (segment, tmp_path):
+            # 上次中途失败留下的、未登记的段
+            if os.path.exists(stale):
+                shutil.rmtree(stale)
+        self._delta.save(tmp_path)
+        self.texts.save(tmp_path, pending_only=True)
+        if self._sparse is not None:
+            self._sparse.save(tmp_path, pending_only=True)
+        deleted = np.asarray(sorted(self._delta_removed), dtype='int64')
+        np.save(os.path.join(tmp_path, 'deleted.npy'), deleted)
+        os.replace(tmp_path, segment)
+        manifest.update(version=BUNDLE_VERSION, segments=names + [name], count=self.index.ntotal,
+                        next_index=self.next_index)
+        with open(os.path.join(path, 'manifest.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(os.path.join(path, 'manifest.json.tmp'), os.path.join(path, 'manifest.json'))
+        # 已写入的条目改为从增量段以内存映射方式读取，不再占用内存
+        self.texts.add_segment(segment)
+        if self._sparse is not None:
+            self._sparse.add_segment(segment)
+        if self.vectors is not None:
+            self.vectors.add_segment(segment)
+        self._reset_delta(self._segments + [segment], np.concatenate([self._segment_deleted, deleted]))
+
+    def load_index(self, path: str, mmap: Optional[bool] = None):
         """
         从指定路径加载向量索引。
 
+        对于索引包，文本存储以内存映射方式打开，正文只在检索命中时读取，未合并的增量段依次追加到索引中；
+        对于旧版本仅包含 FAISS 索引的单个文件，只能恢复索引本身。
+
         参数:
         path (str): 加载索引的路径。
+        mmap (bool): 是否以只读内存映射方式加载 FAISS 索引，默认为构造时的 mmap。
+        映射加载的索引不占用进程私有内存，可以检索，首次写入前会自动以可写方式重新加载。
+        """
+        mmap = self.mmap if mmap is None else mmap
+        self.path = path
+        self.read_only = False
+        self._reset_delta()
+        if not os.path.isdir(path):
+            logging.warning(f'{path} 是旧格式索引，不包含文本，请重新处理参考专利')
+            self.index = self._to_id_map(faiss.read_index(path))
+            self.next_index = self.index.ntotal
+            self._sparse = SparseIndex()
+            return
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != BUNDLE_FORMAT or manifest.get('version', 0) > BUNDLE_VERSION:
+            raise ValueError(f'不支持的索引格式: {manifest.get("format")} v{manifest.get("version")}')
+        if manifest.get('model') != self.model:
+            logging.warning(f'索引使用的嵌入模型 {manifest.get("model")} 与当前模型 {self.model} 不一致')
+        index_path = os.path.join(path, 'index.faiss')
+        segments = [os.path.join(path, SEGMENTS_DIR, name) for name in manifest.get('segments', [])]
+        if mmap and segments:
+            # 增量段的向量需要追加到索引中，映射加载的索引是只读的
+            logging.info(f'{path} 含 {len(segments)} 个未合并的增量段，以可写方式加载')
+            mmap = False
+        if mmap:
+            self.index = faiss.read_index(index_path, mmap_flags(manifest.get('index_type', 'flat')))
+            self.read_only = True
+        else:
+            self.index = self._to_id_map(faiss.read_index(index_path))
+        self._close_mapped()
+        self.texts = TextStore.load(path)
+        self.vectors = VectorStore.load(path, self.index.d)
+        if self.vectors is None and self.rerank > 0 and index_storage(self.index) != 'float32':
+            logging.warning(f'{path} 不包含原始向量，无法精排，重建索引后生效')
+        self.next_index = manifest.get('next_index', self.index.ntotal)
+        deleted = []
+        for segment in segments:
+            delta = VectorStore.load(segment, self.index.d)
+            ids, vectors = delta.get(delta.ids())
+            if len(ids):
+                self.index.add_with_ids(vectors, ids)
+            self.texts.add_segment(segment)
+            if self.vectors is not None:
+                self.vectors.add_segment(segment)
+            deleted.append(np.load(os.path.join(segment, 'deleted.npy')))
+        deleted = np.concatenate(deleted) if deleted else np.empty(0, dtype='int64')
+        if len(deleted):
+            self._remove_from_index(deleted)
+            self.texts.remove(deleted.tolist())
+            if self.vectors is not None:
+                self.vectors.remove(deleted.tolist())
+        self._reset_delta(segments, deleted)
+        # 稀疏索引只在 sparse/hybrid 模式下立即打开，dense 模式下首次使用时再打开
+        self._sparse = self._open_sparse() if self.search_mode != 'dense' else None
+
+    def _ensure_writable(self):
+        """
+        以内存映射方式加载的索引是只读的，写入前从索引包以可写方式重新加载。
+        """
+        if self.read_only:
+            logging.info(f'{self.db_type} 索引以只读方式映射，写入前重新加载为可写索引')
+            self.load_index(self.path, mmap=False)
+
+    @staticmethod
+    def _to_id_map(index):
+        """
+        将不带 ID 映射的旧版 flat 索引转换为 IndexIDMap2，ID 取向量在原索引中的位置。
+        IVF 类索引本身支持自定义 ID，原样返回。
+
+        参数:
+        index: FAISS 索引。
+
+        返回:
+        带 ID 映射的 FAISS 索引。
+        """
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+            return index
+        id_map = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+        if index.ntotal:
+            id_map.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype='int64'))
+        return id_map
+
+    def search_passages(self, query: str, k: int = 2, merge_by_source: bool = False,
+                        mode: Optional[str] = None, embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        根据查询文本检索最相关的段落，并附带来源信息和距离。
+
+        参数:
+        query (str): 查询文本。
+        k (int): 返回的段落数量，默认为 2。
+        merge_by_source (bool): 是否把同一来源专利的段落合并为一条结果，默认为 False。
+        mode (str): 检索方式，"dense"、"sparse" 或 "hybrid"，默认为 search_mode。
+        embedding (np.ndarray): 已计算好的查询向量，提供时 dense/hybrid 模式不再发起嵌入请求。
+
+        返回:
+        List[Dict]: 检索结果，每项包含 id、text、source、section、start、end、distance；
+        合并时每项包含 text、library（为 None）、source、section、distance、passages。
+        sparse/hybrid 模式下 distance 为负的 BM25/融合分数，同样越小越相关。
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'未知的检索方式: {mode}，可选 {SEARCH_MODES}')
+        if mode == 'dense':
+            logging.debug('%s 查询: %s', self.db_type, query)
+            if embedding is None:
+                embedding = self._get_embedding(query)
+            return self.search_by_vector(embedding, k, merge_by_source)
+        if mode == 'hybrid' and embedding is None:
+            embedding = self._get_embedding(query)
+        with METRICS.timer('openpatent_search_seconds', db=self.db_type, mode=mode):
+            if mode == 'sparse':
+                hits = self.sparse.search(query, k)
+            else:
+                # 两路各取更多候选再融合，避免只在一路排名靠前的结果被截断
+                depth = max(k * 4, 20)
+                dense = [doc_id for doc_id, _ in self._dense_search(embedding, depth)]
+                sparse = [doc_id for doc_id, _ in self.sparse.search(query, depth)]
+                hits = reciprocal_rank_fusion([dense, sparse], RRF_K)[:k]
+            return self._build_results([(doc_id, -score) for doc_id, score in hits], merge_by_source)
+
+    def search_by_vector(self, embedding: np.ndarray, k: int = 2, merge_by_source: bool = False) -> List[Dict]:
         """
-        self.index = faiss.read_index(path)
+        根据已计算好的查询向量检索最相关的段落，不再发起嵌入请求。
 
-    def search(self, query: str, k=2) -> List[str]:
+        同一个查询向量可以用于检索多个知识库（前提是它们使用同一个嵌入模型）。
+
+        参数:
+        embedding (np.ndarray): 形状为 [维度] 或 [1, 维度] 的查询向量。
+        k (int): 返回的段落数量，默认为 2。
+        merge_by_source (bool): 是否把同一来源专利的段落合并为一条结果，默认为 False。
+
+        返回:
+        List[Dict]: 检索结果，格式同 search_passages。
+        """
+        with METRICS.timer('openpatent_search_seconds', db=self.db_type, mode='dense'):
+            return self._build_results(self._dense_search(embedding, k), merge_by_source)
+
+    def _dense_search(self, embedding: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """
+        在向量索引中检索，返回按距离升序排列的 (文本 ID, 距离)。
+        """
+        embedding = np.ascontiguousarray(embedding, dtype='float32').reshape(1, -1)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+        # 量化存储的距离有误差，保存了原始向量时多取候选再精排
+        rerank = self.rerank > 0 and self.vectors is not None and index_storage(self.index) != 'float32'
+        depth = k * self.rerank if rerank else k
+        with METRICS.timer('openpatent_faiss_search_seconds', db=self.db_type, index=index_kind(self.index)):
+            D, I = self.index.search(embedding, depth) #返回的是 [batchsize,index]形状的数组
+        I = I[0]
+        D = D[0]
+        logging.debug('%s FAISS 返回 ID: %s 距离: %s', self.db_type, I, D)
+        if rerank:
+            with METRICS.timer('openpatent_rerank_seconds', db=self.db_type):
+                I, D = exact_rerank(embedding[0], *self.vectors.get(I[I >= 0]), k)
+        # 结果不足 k 条时 FAISS 以 -1 填充
+        return [(int(i), float(distance)) for i, distance in zip(I, D) if i >= 0]
+
+    def _build_results(self, hits: List[Tuple[int, float]], merge_by_source: bool) -> List[Dict]:
+        """
+        根据 (文本 ID, 距离) 读取文本和元数据，组装检索结果。
+        """
+        results = []
+        for i, distance in hits:
+            text = self.texts.get(i)
+            if text is None:
+                logging.error(f"Index error in search results: {i}")
+                continue
+            results.append({**self.texts.get_metadata(i), 'text': text, 'distance': float(distance)})
+        if merge_by_source:
+            return merge_passages(results)
+        return results
+
+    def search(self, query: str, k=2, mode: Optional[str] = None) -> List[str]:
         """
         根据查询文本搜索相关文本。
 
         参数:
         query (str): 查询文本。
         k (int): 返回的相关文本数量，默认为 2。
+        mode (str): 检索方式，"dense"、"sparse" 或 "hybrid"，默认为 search_mode。
 
         返回:
         List[str]: 相关文本列表。
         """
-        print(f"查询： \n {query}")
-        embedding = self._get_embedding(query)
-        embedding = embedding.astype('float32')
-        D, I = self.index.search(embedding, k) #返回的是 [batchsize,index]形状的数组
-        I = np.squeeze(I)
-        D = np.squeeze(D)
-        print(f"I:{I} type:{type(I)}")
-        print(self.texts)
-        try:
-            results = [self.texts[i] for i in I]
-            return results
-        except KeyError as e:
-            logging.error(f"Index error in search results: {e}")
-            return []
+        return [result['text'] for result in self.search_passages(query, k, mode=mode)]
 
-    def query(self, query: str, top_k=2) -> List[str]:
+    def query(self, query: str, top_k=2, merge_by_source: bool = False, mode: Optional[str] = None) -> List[str]:
         """
         根据查询文本查询相关文本。
 
         参数:
         query (str): 查询文本。
-        top_k (int): 返回的相关文本数量，默认为 2。
+        top_k (int): 检索的段落数量，默认为 2。
+        merge_by_source (bool): 是否把同一来源专利的段落合并，默认为 False。
+        mode (str): 检索方式，"dense"、"sparse" 或 "hybrid"，默认为 search_mode。
+
+        返回:
+        List[str]: 相关文本列表。
+        """
+        return [result['text'] for result in self.search_passages(query, top_k, merge_by_source, mode)]
+
+    def query_vector(self, embedding: np.ndarray, top_k=2, merge_by_source: bool = False) -> List[str]:
+        """
+        根据已计算好的查询向量查询相关文本。
+
+        参数:
+        embedding (np.ndarray): 查询向量。
+        top_k (int): 检索的段落数量，默认为 2。
+        merge_by_source (bool): 是否把同一来源专利的段落合并，默认为 False。
 
         返回:
         List[str]: 相关文本列表。
         """
-        return self.search(query, k=top_k)
+        return [result['text'] for result in self.search_by_vector(embedding, top_k, merge_by_source)]
+
+    def benchmark(self, queries: Optional[np.ndarray] = None, k: int = 10, n_queries: int = 100,
+                  index_types=INDEX_TYPES) -> List[Dict]:
+        """
+        用当前库中的向量对比各索引类型相对 flat 的 recall@k 以及 p50/p99 查询延迟。
+
+        参数:
+        queries (np.ndarray): 查询向量，默认从库中抽样并加入少量噪声。
+        k (int): 每次检索返回的数量，默认为 10。
+        n_queries (int): 未提供 queries 时抽样的查询数，默认为 100。
+        index_types: 要测试的索引类型，默认为全部类型。
+
+        返回:
+        List[Dict]: 每种索引类型一项，包含 index_type、build_seconds、k、recall_at_k、p50_ms、p99_ms。
+        """
+        _, vectors = self._export_vectors()
+        if queries is None:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+            queries = sample + rng.normal(0, 0.01, sample.shape).astype('float32')
+        return benchmark_index_types(vectors, queries, k, index_types, self.nprobe, self.ef_search)
+
+    def benchmark_storage(self, queries: Optional[np.ndarray] = None, k: int = 10, n_queries: int = 100,
+                          storages=STORAGE_TYPES, rerank: Optional[int] = None) -> List[Dict]:
+        """
+        用当前库中的向量对比各存储方式的每向量字节数、recall@k 损失以及精排后的 recall@k。
+
+        参数:
+        queries (np.ndarray): 查询向量，默认从库中抽样并加入少量噪声。
+        k (int): 每次检索返回的数量，默认为 10。
+        n_queries (int): 未提供 queries 时抽样的查询数，默认为 100。
+        storages: 要测试的存储方式，默认为全部方式。
+        rerank (int): 精排候选倍数，默认为构造时的 rerank，为 0 时取 4。
+
+        返回:
+        List[Dict]: 每种存储方式一项，格式见 index_builder.benchmark_storage。
+        """
+        _, vectors = self._export_vectors()
+        if queries is None:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+            queries = sample + rng.normal(0, 0.01, sample.shape).astype('float32')
+        index_type = self.index_type if self.index_type != 'auto' else choose_index_type(len(vectors))
+        if index_type == 'ivfpq':
+            index_type = 'ivf'
+        return benchmark_storage(vectors, queries, k, index_type, storages, rerank or self.rerank or 4,
+                                 self.nprobe, self.ef_search)
@@ -0,0 +1,157 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+
+class VectorStore:
+    """
+    原始 float32 向量存储，供压缩索引（float16/int8/pq）检索后精排，以及重建索引时无损导出向量。
+
+    新增的向量保存在内存中；从磁盘加载的向量以内存映射方式打开，精排时只读取候选所在的页，
+    多个进程加载同一个索引包时共享页缓存。入库检查点写出的增量段可以用 add_segment 追加，各段的 ID 互不重复。
+    """
+    def __init__(self, d: int):
+        """
+        初始化空的向量存储。
+
+        参数:
+        d (int): 向量维度。
+        """
+        self.d = d
+        self._pending: Dict[int, np.ndarray] = {}
+        # 已加载的段：(升序 ID, 向量)
+        self._segments: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._deleted: Set[int] = set()
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        """
+        添加向量。
+
+        参数:
+        ids (Iterable[int]): 向量 ID，与向量索引中的 ID 一致。
+        vectors (np.ndarray): 形状为 [n, d] 的向量。
+        """
+        vectors = np.asarray(vectors, dtype='float32').reshape(-1, self.d)
+        for text_id, vector in zip(ids, vectors):
+            self._pending[int(text_id)] = vector.copy()
+            self._deleted.discard(int(text_id))
+
+    def remove(self, ids: Iterable[int]):
+        """
+        删除向量。已从磁盘加载的向量只做删除标记，下次 save 时才真正移除。
+
+        参数:
+        ids (Iterable[int]): 要删除的向量 ID。
+        """
+        for text_id in ids:
+            text_id = int(text_id)
+            self._pending.pop(text_id, None)
+            if self._find(text_id) is not None:
+                self._deleted.add(text_id)
+
+    def _find(self, text_id: int) -> Optional[np.ndarray]:
+        """
+        在已加载的各段中二分查找 ID 对应的向量，不存在或已删除时返回 None。
+        """
+        if text_id in self._deleted:
+            return None
+        for ids, vectors in self._segments:
+            row = int(np.searchsorted(ids, text_id))
+            if row < len(ids) and ids[row] == text_id:
+                return vectors[row]
+        return None
+
+    def get(self, ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        读取一组向量，不存在的 ID 被跳过。
+
+        参数:
+        ids (Iterable[int]): 向量 ID。
+
+        返回:
+        Tuple[np.ndarray, np.ndarray]: 找到的 int64 ID 和形状为 [m, d] 的向量。
+        """
+        found: List[int] = []
+        vectors: List[np.ndarray] = []
+        for text_id in ids:
+            text_id = int(text_id)
+            vector = self._pending.get(text_id)
+            if vector is None:
+                vector = self._find(text_id)
+                if vector is None:
+                    continue
+            found.append(text_id)
+            vectors.append(vector)
+        if not found:
+            return np.empty(0, dtype='int64'), np.empty((0, self.d), dtype='float32')
+        return np.asarray(found, dtype='int64'), np.asarray(vectors, dtype='float32')
+
+    def ids(self) -> List[int]:
+        """
+        获取所有向量 ID（升序）。
+        """
+        loaded = set()
+        for ids, _ in self._segments:
+            loaded.update(ids.tolist())
+        return sorted((loaded - self._deleted) | set(self._pending))
+
+    def __contains__(self, text_id) -> bool:
+        return int(text_id) in self._pending or self._find(int(text_id)) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def __repr__(self) -> str:
+        return f'VectorStore({len(self)} 条向量, {self.d} 维)'
+
+    def save(self, directory: str, pending_only: bool = False):
+        """
+        将所有向量按 ID 升序写入目录，生成 vectors.npy 和 vector_ids.npy。
+
+        参数:
+        directory (str): 输出目录。
+        pending_only (bool): 是否只写入内存中尚未保存的向量（用于增量段），默认为 False。
+        """
+        os.makedirs(directory, exist_ok=True)
+        ids, vectors = self.get(sorted(self._pending) if pending_only else self.ids())
+        np.save(os.path.join(directory, 'vector_ids.npy'), ids)
+        np.save(os.path.join(directory, 'vectors.npy'), vectors.reshape(-1, self.d))
+
+    @classmethod
+    def load(cls, directory: str, d: int) -> Optional['VectorStore']:
+        """
+        以内存映射方式打开目录中的向量存储。
+
+        参数:
+        directory (str): save 写出的目录。
+        d (int): 向量维度。
+
+        返回:
+        Optional[VectorStore]: 向量存储，目录中没有向量文件时返回 None。
+        """
+        if not os.path.exists(os.path.join(directory, 'vectors.npy')):
+            return None
+        store = cls(d)
+        store.add_segment(directory)
+        return store
+
+    def add_segment(self, directory: str):
+        """
+        以内存映射方式打开 save 写出的目录（如增量段），其中的向量不再保存在内存中。
+
+        参数:
+        directory (str): 向量文件所在目录。
+        """
+        ids = np.load(os.path.join(directory, 'vector_ids.npy'))
+        # 空数组无法建立内存映射，退化为普通读取
+        vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r' if len(ids) else None)
+        self._segments.append((ids, vectors.reshape(-1, self.d)))
+        for text_id in ids.tolist():
+            self._pending.pop(text_id, None)
+
+    def close(self):
+        """
+        释放内存映射。
+        """
+        self._segments = []
+        self._deleted = set()
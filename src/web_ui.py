@@ -1,34 +1,77 @@
 import gradio as gr
 from httpx import AsyncClient
-from docx import Document
-import numpy as np
 # 在WebUI类初始化前配置HTTP客户端
 gr.routes.client = AsyncClient(verify=False)
 import time
-from pdf_processor import PDFProcessor
-from vector_db import VectorDB
+import queue
+import logging
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from reference_library import ReferenceLibrary, DEFAULT_LIBRARY
+from ingest_jobs import IngestJobManager
 from llm_integration import PatentGenerator
+from tech_doc import TechDocument, TechDocumentCache
+from cache import ResponseCache
+from docx_export import save_draft_docx
+from metrics import start_metrics_server
 import os
-os.environ["SSL_CERT_FILE"] = r"H:\anadonda\envs\OpenPatent\Library\ssl\cacert.pem"
-from docx.oxml.ns import qn
+CERT_FILE = r"H:\anadonda\envs\OpenPatent\Library\ssl\cacert.pem"
+if os.path.exists(CERT_FILE):  # 仅在本地 conda 环境中存在，其他环境使用默认证书
+    os.environ["SSL_CERT_FILE"] = CERT_FILE
+
+class SessionState:
+    """
+    单个浏览器会话的状态：专利生成器（含当前草稿及其检索内容）和当前文档类型。
+    """
+    def __init__(self, patent_generator: PatentGenerator):
+        """
+        初始化会话状态。
+
+        参数:
+        patent_generator (PatentGenerator): 本会话专用的专利生成器。
+        """
+        self.patent_generator = patent_generator
+        self.current_stage = None
+        self.current_doc_type = None
+
 
 class WebUI:
     """
     网页用户界面类，用于创建和管理专利生成系统的用户界面。
+
+    向量索引、技术文档缓存和响应缓存在所有会话间共享；草稿等生成状态保存在每个会话的 SessionState 中。
+    参考专利可以分别存入多个知识库（如按技术领域或客户划分），生成时选择检索其中部分或全部知识库。
     """
-    def __init__(self):
+    # (数据库类型, 文档类型)，一键生成时按此顺序排列各面板
+    DOC_TYPES = [("说 明 书", "说明书"), ("摘要", "摘要"), ("权 利 要 求 书", "权利要求书")]
+
+    def __init__(self, root: str = 'dbs'):
         """
         初始化网页用户界面。
+
+        参数:
+        root (str): 知识库根目录，默认为 dbs；入库任务记录位于其中的 jobs/，启动时从这里恢复未完成的任务。
         """
-        self.patent_generator = PatentGenerator()
-        self.current_stage = None
-        self.current_doc_type = None
-        self.db_paths = {
-            '摘要': r'dbs\abstract',
-            '说 明 书': r'dbs\specification',
-            '权 利 要 求 书': r'dbs\claims'
-        }
+        # 设置 OPENPATENT_RESPONSE_CACHE=1 时缓存 LLM 响应，相同请求直接返回，便于调参和演示
+        self.response_cache = ResponseCache() if os.getenv('OPENPATENT_RESPONSE_CACHE') == '1' else None
+        # 同时运行的 LLM 生成/修订请求数，超出的请求在 Gradio 队列中排队
+        self.llm_concurrency = int(os.getenv('OPENPATENT_LLM_CONCURRENCY', '4'))
+        # 默认知识库位于 root 下，其他知识库位于 <root>/libraries/<名称>/
+        self.library = ReferenceLibrary(root)
+        self.retrieval_top_k = 6
+        self.generate_workers = 3  # 一键生成时并发的文档数
+        # 检索方式：dense（向量）、sparse（本地 BM25，检索时无需网络）或 hybrid（两者融合）
+        self.search_mode = os.getenv('OPENPATENT_SEARCH_MODE', 'dense')
+        # 各知识库使用同一个嵌入模型，技术文档只需嵌入一次；sparse 模式下不需要查询向量
+        embed = None if self.search_mode == 'sparse' else self.library.embed_texts
+        self.tech_docs = TechDocumentCache(embed)
         self.use_existing_db = False
+        # 入库会修改共享索引：检索持有共享锁，可以同时进行，加载知识库和入库写入索引时持有独占锁
+        self.db_lock = self.library.lock
+        # 入库在后台线程中执行并定期保存检查点，启动时继续上次未完成的任务
+        self.ingest_jobs = IngestJobManager(self.library, self.db_lock)
+        if self.ingest_jobs.resume():
+            self.use_existing_db = True
 
     def init_interface(self):
         """
@@ -39,9 +82,12 @@ class WebUI:
         """
         with gr.Blocks(title="OpenPatent 专利生成系统") as demo:
             gr.Markdown("## OpenPatent 专利文档生成系统")
+            session = gr.State()
             
             with gr.Tab("1. 选择参考专利"):
                 ref_patents = gr.Files(label="上传参考专利文件(PDF)")
+                library_name = gr.Dropdown(choices=self.library.names() or [DEFAULT_LIBRARY], value=DEFAULT_LIBRARY,
+                                           allow_custom_value=True, label="存入的知识库（可输入新名称）")
                 process_btn = gr.Button("处理专利文件")
                 process_btn2 = gr.Button("已有本地知识库，点击这里")
                 process_output = gr.Markdown()
@@ -50,239 +96,384 @@ class WebUI:
                 tech_doc = gr.File(label="技术文档(.docx)")
                 
             with gr.Tab("3. 生成专利文档"):
+                libraries = gr.Dropdown(choices=self.library.names(), multiselect=True,
+                                        label="检索的知识库（留空时检索全部）")
                 with gr.Row():
                     gen_spec_btn = gr.Button("生成说明书")
                     gen_abstract_btn = gr.Button("生成摘要")
                     gen_claims_btn = gr.Button("生成权利要求书")
+                    gen_all_btn = gr.Button("一键生成全部", variant="primary")
                 
                 with gr.Column():
                     output_preview = gr.Chatbot(label="专利生成过程", height=500, elem_id="centered-chat")
+
+                with gr.Row():
+                    all_panels = [gr.Chatbot(label=doc_type, height=400) for _, doc_type in self.DOC_TYPES]
                 
                 with gr.Row():
-                    user_feedback = gr.Textbox(label="修改意见", lines=3)
-                    submit_feedback = gr.Button("提交反馈", variant="primary")
+                    user_feedback = gr.Textbox(label="修改意见", lines=3,
+                                               info="可用草稿中每块开头的编号（段落 P1、P2…，标题 H1、H2…）、"
+                                                    "“第3段”、“权利要求2”或标题原文指定修改位置，未指定时整篇修订")
+                    with gr.Column(scale=0, min_width=200):
+                        locate_feedback = gr.Checkbox(label="自动定位修改段落（多一次模型调用）", value=False)
+                        submit_feedback = gr.Button("提交反馈", variant="primary")
             
             # 绑定事件
-            process_btn.click(self.process_patents, inputs=ref_patents, outputs=process_output)
-            process_btn2.click(self.load_existing_db, outputs=process_output)
-            gen_spec_btn.click(self.generate_specification, inputs=tech_doc, outputs=output_preview)
-            gen_abstract_btn.click(self.generate_abstract, inputs=tech_doc, outputs=output_preview)
-            gen_claims_btn.click(self.generate_claims, inputs=tech_doc, outputs=output_preview)
-            submit_feedback.click(self.submit_feedback, inputs=user_feedback, outputs=output_preview)
-            
+            demo.load(self.new_session, outputs=session)
+            demo.load(self.ingest_status, outputs=process_output)
+            # 入库任务在后台线程中依次执行，这里只提交任务并推送进度，不占用生成请求的并发名额
+            process_btn.click(self.process_patents, inputs=[ref_patents, library_name],
+                              outputs=[process_output, library_name, libraries],
+                              concurrency_limit=4, concurrency_id="ingest")
+            process_btn2.click(self.load_existing_db, outputs=[process_output, library_name, libraries],
+                               concurrency_limit=4, concurrency_id="ingest")
+            # 生成和修订共用一个并发上限
+            llm_options = dict(concurrency_limit=self.llm_concurrency, concurrency_id="llm")
+            gen_inputs = [tech_doc, session, libraries]
+            gen_spec_btn.click(self.generate_specification, inputs=gen_inputs, outputs=output_preview, **llm_options)
+            gen_abstract_btn.click(self.generate_abstract, inputs=gen_inputs, outputs=output_preview, **llm_options)
+            gen_claims_btn.click(self.generate_claims, inputs=gen_inputs, outputs=output_preview, **llm_options)
+            gen_all_btn.click(self.generate_all, inputs=gen_inputs, outputs=all_panels, **llm_options)
+            submit_feedback.click(self.submit_feedback, inputs=[user_feedback, session, locate_feedback],
+                                  outputs=output_preview, **llm_options)
+
+        demo.queue(default_concurrency_limit=self.llm_concurrency)
         return demo
 
-    def process_patents(self, files):
+    def new_session(self) -> SessionState:
+        """
+        为新打开的页面创建会话状态。
+
+        返回:
+        SessionState: 会话状态。
+        """
+        return SessionState(PatentGenerator(use_response_cache=self.response_cache is not None,
+                                            response_cache=self.response_cache))
+
+    def _library_choices(self):
+        """
+        刷新入库和检索两个知识库下拉框的选项。
         """
-        处理上传的参考专利文件，创建向量数据库并保存索引。
+        names = self.library.names()
+        return gr.update(choices=names or [DEFAULT_LIBRARY]), gr.update(choices=names)
+
+    def process_patents(self, files, library_name: str = DEFAULT_LIBRARY):
+        """
+        把上传的参考专利文件提交为后台入库任务，并持续推送进度（文件数、页数、向量/秒、预计剩余时间）。
+
+        已处理过且内容未变化的 PDF 会被跳过，同名但内容变化的 PDF 会替换旧的向量。
+        任务定期保存检查点，关闭页面或服务重启都不会丢失已提交的进度；已写入的内容在入库过程中即可检索。
 
         参数:
         files (list): 上传的参考专利文件列表。
+        library_name (str): 存入的知识库名称，不存在时新建，默认为 default。
 
         返回:
-        str: 处理结果信息。
+        Generator: 逐步更新的任务状态信息，以及刷新后的两个知识库下拉框。
         """
         if not files:
-            return "请上传参考专利文件"
-        processor = PDFProcessor()
-        
-        section_array = []
-        for file in files:
-            sections = processor.split_pdf(file.name)
-            for db_type in self.db_paths:
-                section_content = sections.get(db_type)
-                section_array.append(section_content)
-                if section_content:
-                    print(f"dbtype:{db_type}")
-                    print(section_content)
-                else:
-                    print(f"Section {db_type} not found in PDF")
-        section_array = np.array(section_array)
-        section_array = section_array.reshape((-1,3))
-        print(f"翻转前：{section_array}")
-        section_array = section_array.T
-        print(f"翻转后：{section_array}")
-        self.db_list = [0 for i in range(3)]
-        for i,db_type in enumerate(self.db_paths):
-            self.db_list[i] = VectorDB(db_type)
-            self.db_list[i].create_index(section_array[i])
-            self.db_list[i].save_index(self.db_paths[db_type])
+            yield ("请上传参考专利文件",) + self._library_choices()
+            return
+        library_name = (library_name or DEFAULT_LIBRARY).strip()
+        try:
+            job = self.ingest_jobs.submit(library_name, [file.name for file in files])
+        except ValueError as e:
+            yield (str(e),) + self._library_choices()
+            return
         self.use_existing_db = True
-        return "参考专利处理完成，已建立三个知识库！"
+        while not self.ingest_jobs.wait(job, timeout=1.0):
+            yield (job.describe(),) + self._library_choices()
+        yield (job.describe(),) + self._library_choices()
+
+    def ingest_status(self) -> str:
+        """
+        获取排队中和运行中的入库任务的状态，页面打开时显示（如服务重启后恢复的任务）。
+
+        返回:
+        str: 每个任务一行，没有任务时为空字符串。
+        """
+        return '\n\n'.join(job.describe() for job in self.ingest_jobs.active())
 
     def load_existing_db(self):
         """
-        加载已有的本地知识库。
+        加载全部已有的本地知识库。
 
         返回:
-        str: 加载结果信息。
+        Tuple: 加载结果信息，以及刷新后的两个知识库下拉框。
         """
-        self.use_existing_db = True
-        self.db_list = [0 for i in range(3)]
-        for i, db_type in enumerate(self.db_paths):
-            self.db_list[i] = VectorDB(db_type)
-            self.db_list[i].load_index(self.db_paths[db_type])
-        return "已加载本地知识库"
+        with self.db_lock:
+            names = list(self.library.load())
+            self.use_existing_db = True
+        message = f"已加载本地知识库：{'、'.join(names) or '无'}"
+        if self.ingest_jobs.active():
+            message += '\n\n' + self.ingest_status()
+        return (message,) + self._library_choices()
 
-    def generate_specification(self, tech_doc):
+    def generate_specification(self, tech_doc, session: SessionState, libraries: Optional[List[str]] = None):
         """
         生成专利说明书。
 
         参数:
         tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
 
         返回:
-        list: 包含系统消息和生成内容的列表。
+        Generator: 逐步更新的系统消息和生成内容列表。
         """
-        self.current_stage = "specification"
-        return self._generate_draft(tech_doc, "说 明 书", "说明书")
+        session.current_stage = "specification"
+        yield from self._generate_draft(tech_doc, session, "说 明 书", "说明书", libraries)
 
-    def generate_abstract(self, tech_doc):
+    def generate_abstract(self, tech_doc, session: SessionState, libraries: Optional[List[str]] = None):
         """
         生成专利摘要。
 
         参数:
         tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
 
         返回:
-        list: 包含系统消息和生成内容的列表。
+        Generator: 逐步更新的系统消息和生成内容列表。
         """
-        return self._generate_draft(tech_doc, "摘要", "摘要")
+        yield from self._generate_draft(tech_doc, session, "摘要", "摘要", libraries)
 
-    def generate_claims(self, tech_doc):
+    def generate_claims(self, tech_doc, session: SessionState, libraries: Optional[List[str]] = None):
         """
         生成专利权利要求书。
 
         参数:
         tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
 
         返回:
-        list: 包含系统消息和生成内容的列表。
+        Generator: 逐步更新的系统消息和生成内容列表。
         """
-        return self._generate_draft(tech_doc, "权 利 要 求 书", "权利要求书")
+        yield from self._generate_draft(tech_doc, session, "权 利 要 求 书", "权利要求书", libraries)
 
-    def _generate_draft(self, tech_doc, db_type: str, doc_type: str):
+    def _generate_draft(self, tech_doc, session: SessionState, db_type: str, doc_type: str,
+                        libraries: Optional[List[str]] = None):
         """
-        生成专利文档初稿。
+        生成专利文档初稿，以流式方式逐步输出生成内容。
 
         参数:
         tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
         db_type (str): 数据库类型，如 "摘要", "说明书", "权利要求书"。
         doc_type (str): 文档类型，如 "说明书", "摘要", "权利要求书"。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
 
         返回:
-        list: 包含系统消息和生成内容的列表。
+        Generator: 逐步更新的系统消息和生成内容列表。
         """
-        if not self.use_existing_db:
-            return [("系统", "请先处理参考专利或选择已有知识库")]
-        if tech_doc is None:
-            return [("系统", "请先上传技术文档")]
-
-        # 读取技术文档内容
-        doc = Document(tech_doc.name)
-        query = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
-
-        # 加载向量数据库
-        db_map = {"摘要":0,"说 明 书":1,"权 利 要 求 书":2}
-        vector_db = self.db_list[db_map[db_type]]
-        # 检索相关内容
-        related_patents = vector_db.query(query, top_k=2)
-        print(related_patents)
-        context = "\n".join(related_patents) if related_patents else "无相关专利内容"
+        error = self._check_ready(tech_doc, session)
+        if error:
+            yield [("系统", error)]
+            return
+
+        doc = self.tech_docs.load(tech_doc.name)
+        query = doc.text
+        try:
+            context = self._retrieve_context(doc, db_type, libraries)
+        except ValueError as e:
+            yield [("系统", str(e))]
+            return
         
         # 生成专利文档
+        content = ""
+        yield [("系统", "开始生成专利文档..."), ("助手", content)]
         try:
-            content = self.patent_generator.generate_draft(query, context, doc_type)
-            self.current_doc_type = doc_type
-            return [
-                ("系统", "开始生成专利文档..."),
-                ("助手", content)
-            ]
+            for delta in session.patent_generator.generate_draft_stream(query, context, doc_type):
+                content += delta
+                yield [("系统", "开始生成专利文档..."), ("助手", content)]
+            session.current_doc_type = doc_type
+            yield [("系统", "生成完成，每块开头为段落编号，修改意见中可以直接引用"),
+                   ("助手", self._annotated(session, doc_type))]
         except Exception as e:
-            return [
+            yield [
                 ("系统", "开始生成专利文档..."),
                 ("助手", f"生成失败: {str(e)}")
             ]
 
-    def submit_feedback(self, feedback):
+    def generate_all(self, tech_doc, session: SessionState, libraries: Optional[List[str]] = None):
+        """
+        一键并发生成说明书、摘要和权利要求书。
+
+        三个文档的检索和 LLM 调用在线程池中并发执行，各自的内容流式输出到对应面板，
+        总耗时接近最慢的单个文档。生成完成后三个初稿都保存在 current_draft 中，
+        说明书生成成功时修改意见默认作用于说明书，否则会话保持原来的状态。
+
+        参数:
+        tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
+
+        返回:
+        Generator: 逐步更新的各面板消息列表，顺序同 DOC_TYPES。
+        """
+        error = self._check_ready(tech_doc, session)
+        if error:
+            yield [[("系统", error)] for _ in self.DOC_TYPES]
+            return
+
+        # 技术文档只解析和嵌入一次，三个知识库使用同一个查询向量检索
+        doc = self.tech_docs.load(tech_doc.name)
+        query = doc.text
+        contents = {doc_type: "" for _, doc_type in self.DOC_TYPES}
+        status = {doc_type: "开始生成专利文档..." for _, doc_type in self.DOC_TYPES}
+        updates = queue.Queue()
+        failed = set()
+
+        def worker(db_type: str, doc_type: str):
+            try:
+                context = self._retrieve_context(doc, db_type, libraries)
+                for delta in session.patent_generator.generate_draft_stream(query, context, doc_type):
+                    updates.put((doc_type, delta))
+            except Exception as e:
+                failed.add(doc_type)
+                updates.put((doc_type, f"生成失败: {str(e)}"))
+            finally:
+                updates.put((doc_type, None))
+
+        def panels():
+            return [[("系统", status[doc_type]), ("助手", contents[doc_type])] for _, doc_type in self.DOC_TYPES]
+
+        start = time.perf_counter()
+        yield panels()
+        with ThreadPoolExecutor(max_workers=self.generate_workers) as executor:
+            for db_type, doc_type in self.DOC_TYPES:
+                executor.submit(worker, db_type, doc_type)
+            running = len(self.DOC_TYPES)
+            while running:
+                # 阻塞等待第一条更新，再取走队列中已到达的其余更新，合并成一次界面刷新
+                pending = [updates.get()]
+                while True:
+                    try:
+                        pending.append(updates.get_nowait())
+                    except queue.Empty:
+                        break
+                for doc_type, delta in pending:
+                    if delta is None:
+                        running -= 1
+                        outcome = "生成失败" if doc_type in failed else "生成完成"
+                        status[doc_type] = f"{outcome}，用时 {time.perf_counter() - start:.1f} 秒"
+                    else:
+                        contents[doc_type] += delta
+                yield panels()
+        for _, doc_type in self.DOC_TYPES:
+            if doc_type not in failed and doc_type in session.patent_generator.current_draft:
+                contents[doc_type] = self._annotated(session, doc_type)
+        yield panels()
+        # 说明书生成失败时保留会话原来的阶段，修改意见不会作用于不存在的初稿
+        if "说明书" not in failed and "说明书" in session.patent_generator.current_draft:
+            session.current_stage = "specification"
+            session.current_doc_type = "说明书"
+
+    @staticmethod
+    def _annotated(session: SessionState, doc_type: str) -> str:
+        """
+        获取在每个块前标出 ID（如 [P3]）的当前草稿，生成和修订结束后显示，用户据此在修改意见中指定段落。
+
+        参数:
+        session (SessionState): 当前会话状态。
+        doc_type (str): 文档类型。
+
+        返回:
+        str: 带块 ID 的草稿文本。
+        """
+        return session.patent_generator.draft_model(doc_type).annotate()
+
+    def _check_ready(self, tech_doc, session: SessionState) -> str:
+        """
+        检查会话是否已初始化、是否已加载知识库并上传技术文档。
+
+        参数:
+        tech_doc: 上传的技术文档。
+        session (SessionState): 当前会话状态。
+
+        返回:
+        str: 提示信息，已就绪时为空字符串。
+        """
+        if session is None:
+            return "会话尚未初始化，请刷新页面"
+        if not self.use_existing_db:
+            return "请先处理参考专利或选择已有知识库"
+        if tech_doc is None:
+            return "请先上传技术文档"
+        return ""
+
+    def _retrieve_context(self, doc: TechDocument, db_type: str, libraries: Optional[List[str]] = None) -> List[Dict]:
+        """
+        按 search_mode 从选中知识库的对应章节中并行检索相关专利内容，向量检索使用技术文档已缓存的查询向量。
+
+        参数:
+        doc (TechDocument): 已解析的技术文档。
+        db_type (str): 数据库类型，如 "摘要", "说 明 书", "权 利 要 求 书"。
+        libraries (List[str]): 检索的知识库，为空时检索全部。
+
+        返回:
+        List[Dict]: 按来源专利合并的检索结果（含 text 和 distance），生成时按相关度在 token 预算内选择。
+        """
+        # library.search 自行持有共享锁，不同会话和一键生成的各个文档可以同时检索
+        related_patents = self.library.search(db_type, doc.text, self.retrieval_top_k, libraries,
+                                              merge_by_source=True, mode=self.search_mode,
+                                              embedding=doc.embedding)
+        logging.debug('%s 检索结果: %s', db_type, related_patents)
+        return related_patents
+
+    def submit_feedback(self, feedback, session: SessionState, locate: bool = False):
         """
         提交用户反馈，根据反馈内容进行文档保存或修订。
 
         参数:
         feedback (str): 用户的反馈意见。
+        session (SessionState): 当前会话状态。
+        locate (bool): 意见没有写明段落时是否先让模型定位修改位置，默认为 False（整篇修订）。
 
         返回:
-        list: 包含系统消息和处理结果的列表。
+        Generator: 逐步更新的系统消息和处理结果列表。
         """
-        if not self.current_doc_type:
-            return [("系统", "请先生成草案")]
+        if session is None or not session.current_doc_type:
+            yield [("系统", "请先生成草案")]
+            return
         if not feedback.strip():
-            return [("系统", "请输入修改意见")]
+            yield [("系统", "请输入修改意见")]
+            return
 
         try:
             if '满意' in feedback:
-                current_content = self.patent_generator.current_draft.get(self.current_doc_type, "No draft available")
+                current_content = session.patent_generator.current_draft.get(session.current_doc_type, "No draft available")
                 messages = [
                     ("系统", "文档已确认满意，开始保存..."),
                     ("助手", current_content)
                 ]
-                from docx import Document
-                from docx.shared import Pt
-                from docx.enum.text import WD_LINE_SPACING
-
-                # 创建新文档并设置全局样式
-                doc = Document()
-                doc.styles['Normal'].font.name = '宋体'
-                doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-                # 确保 Heading 1 样式的字体为宋体
-                heading_style = doc.styles['Heading 1']
-                heading_style.font.name = '宋体'
-                heading_style._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-                heading_style.font.size = Pt(10.5)  # 宋体五号
-                heading_style.font.bold = True
-                heading_style.paragraph_format.space_before = Pt(6)
-                heading_style.paragraph_format.space_after = Pt(6)
-                heading_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
-
-                # 创建一个新的段落样式用于正文
-                body_style = doc.styles['Normal']
-                body_style.font.name = '宋体'
-                body_style._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-                body_style.font.size = Pt(10.5)  # 宋体五号
-                body_style.paragraph_format.space_before = Pt(0)  # 正文段落前无缩进
-                body_style.paragraph_format.space_after = Pt(0)   # 正文段落后无缩进
-                body_style.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
-                body_style.paragraph_format.first_line_indent = Pt(0)  # 无缩进
-                # 解析XML标签并应用格式
-                paragraphs = current_content.split('\n')
-                for para in paragraphs:
-                    if para.startswith('<标题>'):
-                        title = para[4:-5].strip()  # 提取<标题>内容</标题>
-                        title_para = doc.add_paragraph(title, style='Heading 1')
-                    elif para.startswith('<段落>'):
-                        content = para[4:-5].strip()  # 提取<段落>内容</段落>
-                        p = doc.add_paragraph(content)
-                        # p.paragraph_format.space_before = Pt(3)
-                        # p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
-                        # p.paragraph_format.first_line_indent = Pt(0)  # 无缩进
-
                 # 保存文档
-                filename = f"{self.current_doc_type}.gradio_{int(time.time())}.docx"
-                doc.save(filename)
+                filename = f"{session.current_doc_type}.gradio_{int(time.time())}.docx"
+                save_draft_docx(current_content, filename)
                 messages.append( ("系统", f"文件已保存为：{filename}") )
-                return messages
+                yield messages
             else:
-                revised_content = self.patent_generator.revise_draft(feedback, self.current_doc_type)
-                messages = [
-                    ("系统", "开始修订文档..."),
-                    ("助手", revised_content)
-                ]
-                return messages
+                revised_content = ""
+                yield [("系统", "开始修订文档..."), ("助手", revised_content)]
+                for delta in session.patent_generator.revise_draft_stream(feedback, session.current_doc_type,
+                                                                             locate=bool(locate)):
+                    revised_content += delta
+                    yield [("系统", "开始修订文档..."), ("助手", revised_content)]
+                revised = session.patent_generator.last_revised
+                status = f"已局部修订 {'、'.join(revised)}，其余内容保持不变" if revised else "修订完成"
+                yield [("系统", status), ("助手", self._annotated(session, session.current_doc_type))]
         except Exception as e:
-            return [
+            yield [
                 ("系统", "处理反馈时发生错误"),
                 ("助手", f"错误详情: {str(e)}")
             ]
 
 if __name__ == "__main__":
+    # OPENPATENT_LOG_LEVEL=DEBUG 时输出查询、检索结果等调试内容
+    logging.basicConfig(level=os.getenv('OPENPATENT_LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(message)s')
+    # 设置 OPENPATENT_METRICS_PORT 时在该端口提供 /metrics（Prometheus 文本格式）和 /metrics.json
+    if os.getenv('OPENPATENT_METRICS_PORT'):
+        start_metrics_server(int(os.getenv('OPENPATENT_METRICS_PORT')))
     WebUI().init_interface().launch()